@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+
+def use_temporary_database() -> str:
+    """Points the application at a fresh SQLite file; call before importing the database package"""
+    url = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/planes.db"
+    os.environ['PLANES_DB_URL'] = url
+    return url
@@ -0,0 +1,50 @@
+"""Times the fleet analytics queries on an in-memory snapshot of synthetic planes.
+
+Usage: python -m benchmarks.analytics [SIZE ...]
+"""
+import sys
+import time
+from uuid import uuid4
+import numpy as np
+from database.plane.analytics import FleetSnapshot
+from server.api.plane.schemas import AnalyticsColumn
+
+DEFAULT_SIZES = (100_000, 1_000_000)
+FAMILIES = ('A320', 'A321', 'A330', 'A350', 'B737', 'B747', 'B777', 'B787', 'SSJ100', 'MC21')
+
+
+def synthetic_snapshot(size: int) -> FleetSnapshot:
+    rng = np.random.default_rng(0)
+    max_distance = rng.integers(500, 15000, size)
+    fuel_consumption = rng.integers(1, 10, size)
+    return FleetSnapshot(
+        [uuid4() for _ in range(size)],
+        [f'{FAMILIES[i % len(FAMILIES)]}-{i}' for i in range(size)],
+        rng.integers(10, 850, size), max_distance,
+        rng.integers(0, max_distance * fuel_consumption + 1), fuel_consumption)
+
+
+def measure(name: str, func):
+    start = time.perf_counter()
+    func()
+    print(f"  {name:<30} {(time.perf_counter() - start) * 1000:>9.1f} ms")
+
+
+def main(sizes: list[int]):
+    for size in sizes:
+        print(f'{size} planes')
+        snapshot = None
+
+        def build():
+            nonlocal snapshot
+            snapshot = synthetic_snapshot(size)
+
+        measure('snapshot construction', build)
+        measure('percentiles of fuel range', lambda: snapshot.percentiles(AnalyticsColumn.fuel_range, [50, 90, 99]))
+        measure('histogram of capacity', lambda: snapshot.histogram(AnalyticsColumn.max_capacity, 50))
+        measure('families breakdown', snapshot.families_stats)
+        measure('top 100 by efficiency', lambda: snapshot.top(AnalyticsColumn.efficiency, 100))
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or list(DEFAULT_SIZES))
@@ -0,0 +1,289 @@
+"""Load benchmark for every route of the application.
+
+Seeds the database with a synthetic fleet through /import, then fires requests at each route
+with the given concurrency and reports throughput and p50/p95/p99 latency per route. By default
+the app runs in-process on a temporary database through an ASGI transport; pass --url to load
+a running server over HTTP instead.
+
+Usage: python -m benchmarks.api [--planes N] [--flights N] [--requests N] [--concurrency N]
+                                [--url URL] [--routes REGEX ...] [--output FILE.json]
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+import httpx
+from benchmarks import use_temporary_database
+from benchmarks.report import print_table, save, summarize
+from benchmarks.synthetic import fleet
+
+HEAVY_ROUTE_SHARE = 20
+
+
+@dataclass
+class Context:
+    client: httpx.AsyncClient
+    planes: list[dict]
+    flights: list[dict]
+    page_size: int
+    rng: random.Random = field(default_factory=lambda: random.Random(1))
+    counter: int = 0
+
+    def next_number(self) -> int:
+        self.counter += 1
+        return self.counter
+
+    def plane(self) -> dict:
+        return self.rng.choice(self.planes)
+
+    def flight(self) -> dict:
+        return self.rng.choice(self.flights)
+
+    def new_plane(self) -> dict:
+        return {'model': f'bench-{self.next_number()}', 'max_capacity': 900, 'max_distance': 20000,
+                'current_fuel': 200000, 'fuel_consumption': 10}
+
+    def new_flight(self) -> dict:
+        number = self.next_number()
+        return {'begin_airport': f'BA{number}', 'end_airport': f'BB{number}', 'distance': 500, 'passengers': 100}
+
+    async def create_plane(self) -> str:
+        response = await self.client.post('/planes', json=self.new_plane())
+        return response.json()['id']
+
+    async def create_flight(self) -> str:
+        response = await self.client.post('/flights', json=self.new_flight())
+        return response.json()['id']
+
+
+Request = tuple[str, str, dict]
+Scenario = Callable[[Context], Awaitable[Request]]
+
+
+def plane_fields(plane: dict) -> dict:
+    return {key: value for key, value in plane.items() if key != 'id'}
+
+
+def flight_fields(flight: dict) -> dict:
+    return {key: value for key, value in flight.items() if key not in ('id', 'suitable_planes')}
+
+
+async def get(path: str, **kwargs) -> Request:
+    return 'GET', path, kwargs
+
+
+async def delete_plane_from_flight(ctx: Context) -> Request:
+    flight_id = ctx.flight()['id']
+    plane_id = await ctx.create_plane()
+    await ctx.client.patch(f'/flights/{flight_id}/add', params={'plane_id': plane_id})
+    return 'PATCH', f'/flights/{flight_id}/delete', {'params': {'plane_id': plane_id}}
+
+
+async def add_plane_to_flight(ctx: Context) -> Request:
+    plane_id = await ctx.create_plane()
+    return 'PATCH', f"/flights/{ctx.flight()['id']}/add", {'params': {'plane_id': plane_id}}
+
+
+async def delete_plane(ctx: Context) -> Request:
+    return 'DELETE', f'/planes/{await ctx.create_plane()}', {}
+
+
+async def delete_flight(ctx: Context) -> Request:
+    return 'DELETE', f'/flights/{await ctx.create_flight()}', {}
+
+
+async def import_planes(ctx: Context) -> Request:
+    document = {'planes': [ctx.new_plane() for _ in range(10)], 'flights': []}
+    return 'POST', '/import', {'content': json.dumps(document)}
+
+
+async def edit_plane(ctx: Context) -> Request:
+    plane = ctx.plane()
+    return 'PUT', f"/planes/{plane['id']}", {'json': plane_fields(plane)}
+
+
+async def edit_flight(ctx: Context) -> Request:
+    flight = ctx.flight()
+    return 'PUT', f"/flights/{flight['id']}", {'json': flight_fields(flight)}
+
+
+async def add_plane(ctx: Context) -> Request:
+    return 'POST', '/planes', {'json': ctx.new_plane()}
+
+
+async def add_flight(ctx: Context) -> Request:
+    return 'POST', '/flights', {'json': ctx.new_flight()}
+
+
+async def assign_planes(ctx: Context) -> Request:
+    return 'POST', '/flights/assign', {'json': [ctx.flight()['id']]}
+
+
+async def conduct_flights(ctx: Context) -> Request:
+    return 'POST', '/flights/conduct', {'json': [ctx.flight()['id'] for _ in range(10)]}
+
+
+async def conduct_flight(ctx: Context) -> Request:
+    return 'POST', f"/flights/{ctx.flight()['id']}", {}
+
+
+async def simulate_flights(ctx: Context) -> Request:
+    scenarios = [{'schedule': [ctx.flight()['id'] for _ in range(20)]} for _ in range(3)]
+    return 'POST', '/flights/simulate', {'json': {'scenarios': scenarios}}
+
+
+async def recent_changes(ctx: Context) -> Request:
+    response = await ctx.client.get('/changes/sequence')
+    after = max(0, response.json()['sequence'] - 100)
+    return 'GET', '/changes', {'params': {'after': after, 'follow': False}}
+
+
+async def send_batch(ctx: Context) -> Request:
+    operations = [{'op': 'add_plane', 'plane': ctx.new_plane()} for _ in range(5)]
+    operations += [{'op': 'edit_plane', 'plane_id': plane['id'], 'plane': plane_fields(plane)}
+                   for plane in (ctx.plane() for _ in range(5))]
+    return 'POST', '/batch', {'json': {'operations': operations}}
+
+
+# Read-only routes go first and fuel-consuming ones last, so every route sees the seeded data
+SCENARIOS: dict[str, tuple[Scenario, bool]] = {
+    'GET /planes': (lambda ctx: get('/planes', params={'limit': ctx.page_size}), False),
+    'GET /planes/stream': (lambda ctx: get('/planes/stream'), True),
+    'GET /planes/{plane_id}': (lambda ctx: get(f"/planes/{ctx.plane()['id']}"), False),
+    'GET /planes/search': (lambda ctx: get('/planes/search', params={
+        'model_prefix': ctx.plane()['model'][:5], 'max_capacity_min': 100, 'order_by': 'max_distance',
+        'limit': ctx.page_size}), False),
+    'GET /planes/stats': (lambda ctx: get('/planes/stats'), False),
+    'GET /planes/capacity/average': (lambda ctx: get('/planes/capacity/average'), False),
+    'GET /planes/distance/average': (lambda ctx: get('/planes/distance/average'), False),
+    'GET /planes/capacity/maximum': (lambda ctx: get('/planes/capacity/maximum'), False),
+    'GET /planes/distance/maximum': (lambda ctx: get('/planes/distance/maximum'), False),
+    'GET /planes/analytics/percentiles': (
+        lambda ctx: get('/planes/analytics/percentiles', params={'column': 'fuel_range'}), False),
+    'GET /planes/analytics/histogram': (
+        lambda ctx: get('/planes/analytics/histogram', params={'column': 'max_distance'}), False),
+    'GET /planes/analytics/families': (lambda ctx: get('/planes/analytics/families'), False),
+    'GET /planes/analytics/top': (lambda ctx: get('/planes/analytics/top', params={'by': 'efficiency'}), False),
+    'GET /flights': (lambda ctx: get('/flights', params={'limit': ctx.page_size}), False),
+    'GET /flights/stream': (lambda ctx: get('/flights/stream'), True),
+    'GET /flights/{flight_id}': (lambda ctx: get(f"/flights/{ctx.flight()['id']}"), False),
+    'GET /flights/search': (lambda ctx: get('/flights/search', params={
+        'begin_airport': ctx.flight()['begin_airport'], 'distance_min': 1000, 'order_by': 'passengers',
+        'limit': ctx.page_size}), False),
+    'GET /flights/itinerary': (lambda ctx: get('/flights/itinerary', params={
+        'origin': ctx.flight()['begin_airport'], 'destination': ctx.flight()['end_airport']}), False),
+    'GET /flights/{flight_id}/capacity': (lambda ctx: get(f"/flights/{ctx.flight()['id']}/capacity"), False),
+    'GET /flights/{flight_id}/distance': (lambda ctx: get(f"/flights/{ctx.flight()['id']}/distance"), False),
+    'GET /flights/{flight_id}/candidates': (
+        lambda ctx: get(f"/flights/{ctx.flight()['id']}/candidates", params={'limit': 10}), False),
+    'POST /flights/simulate': (simulate_flights, False),
+    'GET /export': (lambda ctx: get('/export'), True),
+    'GET /cache/stats': (lambda ctx: get('/cache/stats'), False),
+    'GET /metrics': (lambda ctx: get('/metrics'), False),
+    'GET /changes/sequence': (lambda ctx: get('/changes/sequence'), False),
+    'GET /changes': (recent_changes, False),
+    'POST /planes': (add_plane, False),
+    'PUT /planes/{plane_id}': (edit_plane, False),
+    'DELETE /planes/{plane_id}': (delete_plane, False),
+    'POST /flights': (add_flight, False),
+    'PUT /flights/{flight_id}': (edit_flight, False),
+    'DELETE /flights/{flight_id}': (delete_flight, False),
+    'PATCH /flights/{flight_id}/add': (add_plane_to_flight, False),
+    'PATCH /flights/{flight_id}/delete': (delete_plane_from_flight, False),
+    'POST /import': (import_planes, False),
+    'POST /batch': (send_batch, False),
+    'POST /flights/assign': (assign_planes, False),
+    'POST /flights/conduct': (conduct_flights, False),
+    'POST /flights/{flight_id}': (conduct_flight, False),
+}
+
+
+def uncovered_routes(app) -> list[str]:
+    """Routes of the OpenAPI schema without a scenario; app.routes holds included routers, not their routes"""
+    names = {f'{method.upper()} {path}' for path, methods in app.openapi()['paths'].items() for method in methods}
+    return sorted(names - SCENARIOS.keys())
+
+
+async def run_route(ctx: Context, scenario: Scenario, requests: int, concurrency: int) -> dict[str, float]:
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            method, path, kwargs = await scenario(ctx)
+            start = time.perf_counter()
+            try:
+                response = await ctx.client.request(method, path, **kwargs)
+                await response.aread()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 500:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    # Setup requests of a scenario are excluded from latencies but not from the wall time
+    return summarize(latencies, sum(latencies) / concurrency or time.perf_counter() - start, errors)
+
+
+async def run(arguments: argparse.Namespace) -> dict[str, dict[str, float]]:
+    if arguments.url is None:
+        from database.database import create_tables
+        from server.app import app
+        await create_tables()
+        for name in uncovered_routes(app):
+            print(f'warning: {name} has no benchmark scenario')
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None)
+    else:
+        client = httpx.AsyncClient(base_url=arguments.url, timeout=None)
+    async with client:
+        document = fleet(arguments.planes, arguments.flights, arguments.airports, seed=arguments.seed)
+        response = await client.post('/import', content=json.dumps(document))
+        response.raise_for_status()
+        print(f"seeded {response.json()['planes']} planes and {response.json()['flights']} flights")
+        ctx = Context(client, document['planes'], document['flights'], arguments.page_size)
+        results = {}
+        for name, (scenario, heavy) in SCENARIOS.items():
+            if arguments.routes and not any(re.search(x, name) for x in arguments.routes):
+                continue
+            requests = max(1, arguments.requests // HEAVY_ROUTE_SHARE) if heavy else arguments.requests
+            results[name] = await run_route(ctx, scenario, requests, arguments.concurrency)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--planes', type=int, default=10_000)
+    parser.add_argument('--flights', type=int, default=5_000)
+    parser.add_argument('--airports', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url', help='base URL of a running server; the app runs in-process when omitted')
+    parser.add_argument('--routes', nargs='*', help='only run routes matching one of these regular expressions')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    arguments = parser.parse_args()
+    if arguments.url is None:
+        use_temporary_database()
+    results = asyncio.run(run(arguments))
+    if arguments.url is None:
+        from database.flight.simulation import shutdown_simulation_pool
+        shutdown_simulation_pool()
+    print_table(results)
+    if arguments.output:
+        save(arguments.output, vars(arguments), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""Times the plane-to-flight assignment solver on synthetic fleets.
+
+Usage: python -m benchmarks.assignment [SIZE ...]
+"""
+import random
+import sys
+import time
+from uuid import uuid4
+from database.flight.assignment import solve_assignment
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+
+def main(sizes: list[int]):
+    print(f"{'flights x planes':>18} {'assigned':>9} {'solver, ms':>11}")
+    for size in sizes:
+        flights = [(uuid4(), random.randint(10, 400), random.randint(300, 12000)) for _ in range(size)]
+        planes = [(uuid4(), random.randint(10, 850), random.randint(300, 15000)) for _ in range(size)]
+        start = time.perf_counter()
+        assignment = solve_assignment(flights, planes)
+        elapsed = time.perf_counter() - start
+        print(f"{f'{size} x {size}':>18} {len(assignment):>9} {elapsed * 1000:>11.1f}")
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or list(DEFAULT_SIZES))
@@ -0,0 +1,96 @@
+"""Applying a sync from an upstream system one request at a time versus through POST /batch.
+
+The sync edits planes and moves planes between flights: --operations PUT /planes/{id} and
+PATCH /flights/{id}/add or /delete calls, sent one by one and then as a single batch (and as an
+atomic one). Commits are counted as the change log entries each variant adds. Runs in-process
+through an ASGI transport, so the HTTP cost per request is a lower bound.
+
+Usage: python -m benchmarks.batch [--planes N] [--flights N] [--operations N]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import httpx
+from benchmarks import use_temporary_database
+from benchmarks.synthetic import fleet
+
+
+def sync_operations(document: dict, count: int, round_number: int, rng: random.Random) -> list[dict]:
+    """Plane edits, each followed by detaching one of a flight's planes and attaching it back"""
+    operations = []
+    planes = document['planes']
+    flights = [x for x in document['flights'] if x['suitable_planes']]
+    while len(operations) < count:
+        plane = rng.choice(planes)
+        edited = {key: value for key, value in plane.items() if key != 'id'}
+        edited['model'] = f"{plane['model']}-{round_number}-{len(operations)}"
+        operations.append({'op': 'edit_plane', 'plane_id': plane['id'], 'plane': edited})
+        flight = rng.choice(flights)
+        plane_id = flight['suitable_planes'][0]['id']
+        operations.append({'op': 'delete_plane_from_flight', 'flight_id': flight['id'], 'plane_id': plane_id})
+        operations.append({'op': 'add_plane_to_flight', 'flight_id': flight['id'], 'plane_id': plane_id})
+    return operations[:count]
+
+
+async def send_one_by_one(client: httpx.AsyncClient, operations: list[dict]):
+    for operation in operations:
+        if operation['op'] == 'edit_plane':
+            response = await client.put(f"/planes/{operation['plane_id']}", json=operation['plane'])
+        else:
+            action = 'add' if operation['op'] == 'add_plane_to_flight' else 'delete'
+            response = await client.patch(f"/flights/{operation['flight_id']}/{action}",
+                                          params={'plane_id': operation['plane_id']})
+        response.raise_for_status()
+
+
+async def send_batch(client: httpx.AsyncClient, operations: list[dict], atomic: bool):
+    response = await client.post('/batch', json={'operations': operations, 'atomic': atomic})
+    response.raise_for_status()
+    report = response.json()
+    failed = [x for x in report['results'] if x['status'] != 200]
+    if failed or not report['committed']:
+        raise AssertionError(f'{len(failed)} operations failed: {failed[:3]}')
+
+
+async def run(arguments: argparse.Namespace):
+    from database.database import create_tables
+    from server.app import app
+    await create_tables()
+    rng = random.Random(0)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+        document = fleet(arguments.planes, arguments.flights, arguments.airports)
+        response = await client.post('/import', content=json.dumps(document))
+        response.raise_for_status()
+        print(f'{arguments.operations} operations on {arguments.planes} planes and {arguments.flights} flights')
+        print(f"{'variant':<14} {'seconds':>8} {'ops/s':>8} {'commits':>8}")
+        variants = {
+            'one by one': lambda x: send_one_by_one(client, x),
+            'batch': lambda x: send_batch(client, x, False),
+            'atomic batch': lambda x: send_batch(client, x, True),
+        }
+        for round_number, (name, send) in enumerate(variants.items()):
+            operations = sync_operations(document, arguments.operations, round_number, rng)
+            sequence = (await client.get('/changes/sequence')).json()['sequence']
+            start = time.perf_counter()
+            await send(operations)
+            elapsed = time.perf_counter() - start
+            commits = (await client.get('/changes/sequence')).json()['sequence'] - sequence
+            print(f'{name:<14} {elapsed:>8.2f} {len(operations) / elapsed:>8.0f} {commits:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--planes', type=int, default=2_000)
+    parser.add_argument('--flights', type=int, default=1_000)
+    parser.add_argument('--airports', type=int, default=200)
+    parser.add_argument('--operations', type=int, default=3_000)
+    arguments = parser.parse_args()
+    use_temporary_database()
+    asyncio.run(run(arguments))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Cost of one dashboard sync: polling the full lists versus reading the change feed.
+
+Between two syncs a few planes are edited, which invalidates the cached lists. The polling
+client downloads GET /planes and GET /flights again; the incremental one reads the entries
+past its last sequence number from GET /changes. Runs in-process through an ASGI transport.
+
+Usage: python -m benchmarks.changes [--planes N] [--flights N] [--edits N ...] [--repeats N]
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+from benchmarks import use_temporary_database
+from benchmarks.report import print_table, summarize
+from benchmarks.synthetic import fleet
+
+
+async def edit_planes(client: httpx.AsyncClient, planes: list[dict], count: int, round_number: int):
+    for plane in planes[:count]:
+        changed = {key: value for key, value in plane.items() if key != 'id'}
+        changed['model'] = f"{plane['model']}-{round_number}"
+        response = await client.put(f"/planes/{plane['id']}", json=changed)
+        response.raise_for_status()
+
+
+async def run(arguments: argparse.Namespace) -> dict[str, dict[str, float]]:
+    from database.database import create_tables
+    from server.app import app
+    await create_tables()
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+        document = fleet(arguments.planes, arguments.flights, arguments.airports)
+        response = await client.post('/import', content=json.dumps(document))
+        response.raise_for_status()
+        sequence = (await client.get('/changes/sequence')).json()['sequence']
+        round_number = 0
+        for edits in arguments.edits:
+            polling, feed = [], []
+            polling_bytes = feed_bytes = 0
+            for _ in range(arguments.repeats):
+                round_number += 1
+                await edit_planes(client, document['planes'], edits, round_number)
+                start = time.perf_counter()
+                for path in ('/planes', '/flights'):
+                    polling_bytes += len((await client.get(path)).content)
+                polling.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                response = await client.get('/changes', params={'follow': 'false'},
+                                            headers={'Last-Event-ID': str(sequence)})
+                feed.append(time.perf_counter() - start)
+                feed_bytes += len(response.content)
+                sequence = int(response.text.rsplit('id: ', 1)[1].split('\n', 1)[0])
+            results[f'poll lists, {edits} edits ({polling_bytes // arguments.repeats} B)'] = summarize(
+                polling, sum(polling))
+            results[f'change feed, {edits} edits ({feed_bytes // arguments.repeats} B)'] = summarize(feed, sum(feed))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--planes', type=int, default=10_000)
+    parser.add_argument('--flights', type=int, default=5_000)
+    parser.add_argument('--airports', type=int, default=200)
+    parser.add_argument('--edits', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeats', type=int, default=5)
+    arguments = parser.parse_args()
+    use_temporary_database()
+    print_table(asyncio.run(run(arguments)))
+
+
+if __name__ == '__main__':
+    main()
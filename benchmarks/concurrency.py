@@ -0,0 +1,121 @@
+"""Contention: several processes conduct flights and edit the planes they share.
+
+Every flight is served by every plane, so each conduct burns fuel from all of them while the
+editors run read-modify-write cycles on max_capacity with the version they read, retrying on a
+version mismatch. Reports the throughput, the conducts that ran out of attempts and the edit
+retries. That no update is lost under the same workload is checked by tests/test_concurrency.py.
+
+Usage: python -m benchmarks.concurrency [--processes N] [--tasks N] [--operations N]
+                                        [--planes N] [--flights N]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import time
+from collections import Counter
+from uuid import UUID, uuid4
+from benchmarks import use_temporary_database
+from benchmarks.repository import seed
+
+INITIAL_FUEL = 10 ** 9
+INITIAL_CAPACITY = 500
+FUEL_CONSUMPTION = 1
+
+
+def document(planes: int, flights: int) -> dict[str, list[dict]]:
+    plane_records = [{
+        'id': str(uuid4()), 'model': f'M{i:04d}', 'max_capacity': INITIAL_CAPACITY, 'max_distance': INITIAL_FUEL,
+        'current_fuel': INITIAL_FUEL, 'fuel_consumption': FUEL_CONSUMPTION,
+    } for i in range(planes)]
+    flight_records = [{
+        'id': str(uuid4()), 'begin_airport': f'A{i:03d}', 'end_airport': f'B{i:03d}',
+        'distance': 100 + i, 'passengers': 10, 'suitable_planes': plane_records,
+    } for i in range(flights)]
+    return {'planes': plane_records, 'flights': flight_records}
+
+
+async def work(worker: int, tasks: int, operations: int, plane_ids: list[UUID],
+               flight_ids: list[UUID]) -> tuple[Counter, Counter]:
+    from sqlalchemy.orm.exc import StaleDataError
+    from database.concurrency import VersionMismatch
+    from database.flight.repository import FlightRepository
+    from database.plane.repository import PlaneRepository
+    from server.api.flight.schemas import ConductStatus
+    from server.api.plane.schemas import PlaneDto
+    conducted = Counter()
+    stats = Counter()
+
+    async def conductor(rng: random.Random):
+        for _ in range(operations):
+            try:
+                if rng.random() < 0.5:
+                    flight_id = rng.choice(flight_ids)
+                    await FlightRepository.conduct_flight(flight_id)
+                    conducted[flight_id] += 1
+                else:
+                    batch = rng.sample(flight_ids, min(3, len(flight_ids)))
+                    for result in await FlightRepository.conduct_flights(batch):
+                        if result.status == ConductStatus.conducted:
+                            conducted[result.flight_id] += 1
+                stats['conducts'] += 1
+            except StaleDataError:
+                stats['conducts given up'] += 1
+
+    async def editor(rng: random.Random):
+        for _ in range(operations):
+            plane_id = rng.choice(plane_ids)
+            while True:
+                plane, version = await PlaneRepository.get_plane.__wrapped__(plane_id)
+                change = PlaneDto(**plane.model_dump(exclude={'id'}))
+                change.max_capacity += 1
+                try:
+                    await PlaneRepository.edit_plane(plane_id, change, {version})
+                except (VersionMismatch, StaleDataError):
+                    stats['edit retries'] += 1
+                    continue
+                stats['edits'] += 1
+                break
+
+    rngs = [random.Random(worker * tasks + x) for x in range(tasks)]
+    await asyncio.gather(*(conductor(x) if i % 2 == 0 else editor(x) for i, x in enumerate(rngs)))
+    return conducted, stats
+
+
+def run_worker(args: tuple) -> tuple[Counter, Counter]:
+    return asyncio.run(work(*args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--tasks', type=int, default=4, help='concurrent conductors and editors per process')
+    parser.add_argument('--operations', type=int, default=50, help='operations per task')
+    parser.add_argument('--planes', type=int, default=4)
+    parser.add_argument('--flights', type=int, default=8)
+    arguments = parser.parse_args()
+    use_temporary_database()
+    records = document(arguments.planes, arguments.flights)
+    asyncio.run(seed(records))
+    plane_ids = [UUID(x['id']) for x in records['planes']]
+    flight_ids = [UUID(x['id']) for x in records['flights']]
+
+    start = time.perf_counter()
+    # Fresh interpreters, so no worker inherits the parent's engine or caches
+    with multiprocessing.get_context('spawn').Pool(arguments.processes) as pool:
+        results = pool.map(run_worker, [
+            (x, arguments.tasks, arguments.operations, plane_ids, flight_ids) for x in range(arguments.processes)])
+    elapsed = time.perf_counter() - start
+
+    conducted = sum((x for x, _ in results), Counter())
+    stats = sum((x for _, x in results), Counter())
+    operations = stats['conducts'] + stats['conducts given up'] + stats['edits']
+    print(f"{arguments.processes} processes x {arguments.tasks} tasks x {arguments.operations} operations "
+          f"on {arguments.planes} planes shared by {arguments.flights} flights")
+    print(f"{operations / elapsed:.0f} operations/s; conducts {stats['conducts']} "
+          f"(flights conducted {sum(conducted.values())}, given up {stats['conducts given up']}), "
+          f"edits {stats['edits']} (retries {stats['edit retries']})")
+
+
+if __name__ == '__main__':
+    main()
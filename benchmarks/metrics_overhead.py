@@ -0,0 +1,52 @@
+"""Measures the cost of the request/query instrumentation behind /metrics.
+
+Runs benchmarks.api on the same synthetic data with PLANES_METRICS=0 and =1, alternating
+several rounds and keeping the best run of each route. The read cache is disabled by default
+so that requests hit the database, pass --cached to keep it.
+Usage: python -m benchmarks.metrics_overhead [--rounds N] [--requests N] [--cached]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROUTES = ['GET /planes', 'GET /planes/stats', 'GET /flights', 'GET /flights/{flight_id}/candidates']
+
+
+def run_api_benchmark(metrics: bool, arguments: argparse.Namespace) -> dict[str, dict[str, float]]:
+    env = dict(os.environ, PLANES_METRICS='1' if metrics else '0')
+    if not arguments.cached:
+        env['PLANES_CACHE_SIZE'] = '0'
+    with tempfile.NamedTemporaryFile(suffix='.json') as output:
+        subprocess.run([
+            sys.executable, '-W', 'ignore', '-m', 'benchmarks.api', '--planes', str(arguments.planes),
+            '--flights', str(arguments.flights), '--requests', str(arguments.requests), '--concurrency', '1',
+            '--output', output.name, '--routes', *[f'^{x}$' for x in ROUTES]],
+            env=env, check=True, stdout=subprocess.DEVNULL)
+        with open(output.name) as file:
+            return json.load(file)['results']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--planes', type=int, default=5_000)
+    parser.add_argument('--flights', type=int, default=2_000)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--cached', action='store_true')
+    arguments = parser.parse_args()
+    best: dict[bool, dict[str, float]] = {False: {}, True: {}}
+    for _ in range(arguments.rounds):
+        for metrics in (False, True):
+            for route, row in run_api_benchmark(metrics, arguments).items():
+                best[metrics][route] = max(best[metrics].get(route, 0.0), row['throughput'])
+    print(f"{'name':<40} {'off, req/s':>11} {'on, req/s':>10} {'overhead':>9}")
+    for route, throughput in best[False].items():
+        instrumented = best[True][route]
+        print(f"{route:<40} {throughput:>11.1f} {instrumented:>10.1f} {(1 - instrumented / throughput) * 100:>8.1f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Compares the fleet aggregates computed in Python with the SQL ones.
+
+Usage: python -m benchmarks.plane_stats [SIZE ...]
+"""
+import asyncio
+import random
+import sys
+import time
+from uuid import uuid4
+from benchmarks import use_temporary_database
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+BATCH_SIZE = 50_000
+REPEATS = 5
+
+
+async def seed(count: int):
+    from sqlalchemy import delete, insert
+    from database.database import PlaneSchema, engine
+    async with engine.begin() as conn:
+        await conn.execute(delete(PlaneSchema))
+        for start in range(0, count, BATCH_SIZE):
+            rows = []
+            for i in range(start, min(start + BATCH_SIZE, count)):
+                max_distance = random.randint(500, 15000)
+                fuel_consumption = random.randint(1, 10)
+                rows.append({
+                    'id': uuid4(),
+                    'model': f'model-{i}',
+                    'max_capacity': random.randint(10, 850),
+                    'max_distance': max_distance,
+                    'current_fuel': random.randint(0, max_distance * fuel_consumption),
+                    'fuel_consumption': fuel_consumption,
+                })
+            await conn.execute(insert(PlaneSchema), rows)
+
+
+async def python_side_stats() -> tuple[int, int, int, int]:
+    """The aggregates as they were computed before: one session and one full column transfer each."""
+    from sqlalchemy import select
+    from database.database import PlaneSchema, new_session
+
+    async def load(column):
+        async with new_session() as session:
+            result = await session.execute(select(column))
+            return [int(x) for x in result.scalars().all()]
+
+    capacities = await load(PlaneSchema.max_capacity)
+    distances = await load(PlaneSchema.max_distance)
+    average_capacity = round(sum(capacities) / len(capacities))
+    average_distance = round(sum(distances) / len(distances))
+    capacities = await load(PlaneSchema.max_capacity)
+    distances = await load(PlaneSchema.max_distance)
+    return average_capacity, average_distance, max(capacities), max(distances)
+
+
+async def sql_side_stats() -> tuple[int, int, int, int]:
+    from database.plane.repository import PlaneRepository
+    # Bypass the read-through cache, the query itself is what is measured
+    stats = await PlaneRepository.get_stats.__wrapped__()
+    return stats.average_capacity, stats.average_distance, stats.max_capacity, stats.max_distance
+
+
+async def measure(func) -> tuple[float, tuple]:
+    timings = []
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = await func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+async def main(sizes: list[int]):
+    from database.database import create_tables
+    await create_tables()
+    print(f"{'planes':>10} {'python, ms':>12} {'sql, ms':>10} {'speedup':>8}")
+    for size in sizes:
+        await seed(size)
+        python_time, python_result = await measure(python_side_stats)
+        sql_time, sql_result = await measure(sql_side_stats)
+        assert python_result == sql_result, (python_result, sql_result)
+        print(f"{size:>10} {python_time * 1000:>12.1f} {sql_time * 1000:>10.1f} {python_time / sql_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    use_temporary_database()
+    asyncio.run(main([int(x) for x in sys.argv[1:]] or list(DEFAULT_SIZES)))
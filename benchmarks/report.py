@@ -0,0 +1,59 @@
+"""Latency summaries shared by the benchmarks.
+
+Usage: python -m benchmarks.report BASELINE.json CANDIDATE.json
+"""
+import json
+import statistics
+import sys
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return float('nan')
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[round(fraction * 100) - 1]
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict[str, float]:
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def print_table(results: dict[str, dict[str, float]]):
+    width = max([len(x) for x in results] + [5])
+    print(f"{'name':<{width}} {'req/s':>9} {'p50, ms':>8} {'p95, ms':>8} {'p99, ms':>8} {'errors':>6}")
+    for name, row in results.items():
+        print(f"{name:<{width}} {row['throughput']:>9.1f} {row['p50_ms']:>8.2f} "
+              f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['errors']:>6}")
+
+
+def save(path: str, parameters: dict, results: dict[str, dict[str, float]]):
+    with open(path, 'w') as file:
+        json.dump({'parameters': parameters, 'results': results}, file, indent=2)
+
+
+def compare(baseline_path: str, candidate_path: str):
+    with open(baseline_path) as file:
+        baseline = json.load(file)['results']
+    with open(candidate_path) as file:
+        candidate = json.load(file)['results']
+    width = max([len(x) for x in candidate] + [5])
+    print(f"{'name':<{width}} {'req/s':>18} {'p99, ms':>18}")
+    for name, row in candidate.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]
+        throughput_change = (row['throughput'] / old['throughput'] - 1) * 100 if old['throughput'] else 0.0
+        print(f"{name:<{width}} {row['throughput']:>9.1f} {throughput_change:>+7.1f}% "
+              f"{row['p99_ms']:>9.2f} {old['p99_ms']:>7.2f}")
+
+
+if __name__ == '__main__':
+    compare(sys.argv[1], sys.argv[2])
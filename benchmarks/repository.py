@@ -0,0 +1,100 @@
+"""Micro-benchmarks for the repository methods and the /export pipeline.
+
+Reads bypass the read-through cache so the database work itself is measured.
+Usage: python -m benchmarks.repository [--planes N] [--flights N] [--planes-per-flight N] [--repeats N]
+                                       [--output FILE.json]
+"""
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable
+from uuid import UUID
+from benchmarks import use_temporary_database
+from benchmarks.report import print_table, save, summarize
+from benchmarks.synthetic import fleet
+
+
+async def seed(document: dict[str, list[dict]]):
+    from database.database import create_tables
+    from server.api.data_import.pipeline import Importer
+    await create_tables()
+
+    async def records():
+        for index, plane in enumerate(document['planes']):
+            yield 'plane', index, plane
+        for index, flight in enumerate(document['flights']):
+            yield 'flight', index, flight
+
+    await Importer().run(records())
+
+
+async def consume(chunks) -> int:
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+    return size
+
+
+def benchmarks(document: dict[str, list[dict]]) -> dict[str, Callable[[], Awaitable]]:
+    from database.flight.repository import FlightRepository
+    from database.plane.repository import PlaneRepository
+    from server.api.export.pipeline import gzip_chunks, json_chunks, ndjson_chunks
+    flight_id = UUID(document['flights'][0]['id'])
+    return {
+        'PlaneRepository.get_planes(100)': lambda: PlaneRepository.get_planes.__wrapped__(100),
+        'PlaneRepository.get_planes()': lambda: PlaneRepository.get_planes.__wrapped__(),
+        'PlaneRepository.stream_planes': lambda: consume(PlaneRepository.stream_planes()),
+        'PlaneRepository.get_stats': lambda: PlaneRepository.get_stats.__wrapped__(),
+        'FlightRepository.get_flights(100)': lambda: FlightRepository.get_flights.__wrapped__(100),
+        'FlightRepository.get_flights()': lambda: FlightRepository.get_flights.__wrapped__(),
+        'FlightRepository.get_flights(include_planes)':
+            lambda: FlightRepository.get_flights.__wrapped__(include_planes=True),
+        'FlightRepository.stream_flights': lambda: consume(FlightRepository.stream_flights()),
+        'FlightRepository.stream_flights(include_planes)':
+            lambda: consume(FlightRepository.stream_flights(include_planes=True)),
+        'FlightRepository.get_available_planes_by_capacity':
+            lambda: FlightRepository.get_available_planes_by_capacity.__wrapped__(flight_id),
+        'FlightRepository.get_available_planes_by_distance':
+            lambda: FlightRepository.get_available_planes_by_distance.__wrapped__(flight_id),
+        'FlightRepository.get_candidate_planes':
+            lambda: FlightRepository.get_candidate_planes.__wrapped__(flight_id, limit=10),
+        'export json': lambda: consume(json_chunks()),
+        'export ndjson': lambda: consume(ndjson_chunks()),
+        'export json gzip': lambda: consume(gzip_chunks(json_chunks())),
+    }
+
+
+async def run(arguments: argparse.Namespace) -> dict[str, dict[str, float]]:
+    document = fleet(arguments.planes, arguments.flights, arguments.airports, arguments.planes_per_flight,
+                     seed=arguments.seed)
+    await seed(document)
+    results = {}
+    for name, func in benchmarks(document).items():
+        latencies = []
+        for _ in range(arguments.repeats):
+            start = time.perf_counter()
+            await func()
+            latencies.append(time.perf_counter() - start)
+        results[name] = summarize(latencies, sum(latencies))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--planes', type=int, default=10_000)
+    parser.add_argument('--flights', type=int, default=5_000)
+    parser.add_argument('--airports', type=int, default=200)
+    parser.add_argument('--planes-per-flight', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    arguments = parser.parse_args()
+    use_temporary_database()
+    results = asyncio.run(run(arguments))
+    print_table(results)
+    if arguments.output:
+        save(arguments.output, vars(arguments), results)
+
+
+if __name__ == '__main__':
+    main()
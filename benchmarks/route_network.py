@@ -0,0 +1,58 @@
+"""Times itinerary queries and incremental updates on a synthetic route network.
+
+The network is built in memory, so the numbers cover only the graph search and index
+maintenance that GET /flights/itinerary adds on top of the request itself.
+
+Usage: python -m benchmarks.route_network [--airports N] [--flights N] [--queries N] [--seed N]
+"""
+import argparse
+import random
+import time
+from uuid import uuid4
+from benchmarks.report import print_table, summarize
+from database.flight.network import Leg, RouteNetwork
+
+
+def synthetic_legs(airports: int, flights: int, rng: random.Random) -> list[Leg]:
+    names = [f'A{i:05d}' for i in range(airports)]
+    pairs = set()
+    while len(pairs) < flights:
+        begin, end = rng.sample(names, 2)
+        pairs.add((begin, end))
+    return [Leg(uuid4(), begin, end, rng.randint(300, 12000), rng.randint(10, 400)) for begin, end in pairs]
+
+
+def timed(action, *args) -> float:
+    start = time.perf_counter()
+    action(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--airports', type=int, default=50_000)
+    parser.add_argument('--flights', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    legs = synthetic_legs(args.airports, args.flights, rng)
+    network = RouteNetwork()
+    print(f'network: {args.airports} airports, {args.flights} flights, '
+          f'built in {timed(network.reset, legs) * 1000:.0f} ms')
+    airports = list(network.departures)
+    queries = [rng.sample(airports, 2) for _ in range(args.queries)]
+    results = {
+        'shortest distance': [timed(network.shortest_distance, *x) for x in queries],
+        'fewest legs': [timed(network.fewest_legs, *x) for x in queries],
+        'shortest distance, 300+ passengers': [timed(network.shortest_distance, *x, 300) for x in queries],
+        'fewest legs, 300+ passengers': [timed(network.fewest_legs, *x, 300) for x in queries],
+    }
+    changed = rng.sample(legs, args.queries)
+    results['put'] = [timed(network.put, x._replace(distance=x.distance + 1)) for x in changed]
+    results['remove'] = [timed(network.remove, x.flight_id) for x in changed]
+    print_table({name: summarize(x, sum(x)) for name, x in results.items()})
+
+
+if __name__ == '__main__':
+    main()
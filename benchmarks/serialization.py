@@ -0,0 +1,100 @@
+"""CPU cost of building list responses: ORM objects through pydantic versus rows through orjson.
+
+The model path loads ORM objects, converts them with model_validate and lets a TypeAdapter
+validate and dump the list, as FastAPI does for a `-> list[Model]` route. The record path is
+what the list routes run now: column rows as dicts rendered by OrjsonResponse. Both documents
+are checked to be equal before timing. Flights are seeded at a fifth of the planes; every figure
+is scaled to 10k records of its own kind.
+
+Usage: python -m benchmarks.serialization [--records N] [--planes-per-flight N] [--repeats N]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable
+from benchmarks import use_temporary_database
+from benchmarks.repository import seed
+from benchmarks.synthetic import fleet
+
+RECORDS_UNIT = 10_000
+
+
+def normalized(document: bytes) -> list:
+    records = json.loads(document)
+    for record in records:
+        if 'suitable_planes' in record:
+            record['suitable_planes'].sort(key=lambda x: x['id'])
+    return records
+
+
+def paths() -> dict[str, tuple[Callable[[], Awaitable[bytes]], Callable[[], Awaitable[bytes]]]]:
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from database.database import FlightSchema, PlaneSchema, new_session
+    from database.flight.repository import FlightRepository
+    from database.plane.repository import PlaneRepository
+    from server.api.flight.schemas import Flight
+    from server.api.plane.schemas import Plane
+    from server.api.rendering import OrjsonResponse
+
+    async def model_path(model, query) -> bytes:
+        adapter = TypeAdapter(list[model])
+        async with new_session() as session:
+            result = await session.execute(query)
+            models = [model.model_validate(x) for x in result.scalars().all()]
+        return adapter.dump_json(adapter.validate_python(models))
+
+    async def record_path(records: Awaitable[list[dict]]) -> bytes:
+        return OrjsonResponse(await records).body
+
+    return {
+        'planes': (
+            lambda: model_path(Plane, select(PlaneSchema).order_by(PlaneSchema.id)),
+            lambda: record_path(PlaneRepository.get_planes.__wrapped__())),
+        'flights with planes': (
+            lambda: model_path(Flight, select(FlightSchema).options(
+                selectinload(FlightSchema.suitable_planes)).order_by(FlightSchema.id)),
+            lambda: record_path(FlightRepository.get_flights.__wrapped__(include_planes=True))),
+    }
+
+
+async def measure(func: Callable[[], Awaitable[bytes]], repeats: int) -> tuple[float, float]:
+    cpu = wall = 0.0
+    for _ in range(repeats):
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        await func()
+        cpu += time.process_time() - cpu_start
+        wall += time.perf_counter() - wall_start
+    return cpu / repeats, wall / repeats
+
+
+async def run(arguments: argparse.Namespace):
+    flights = arguments.records // 5
+    await seed(fleet(arguments.records, flights, flights // 10, arguments.planes_per_flight))
+    counts = {'planes': arguments.records, 'flights with planes': flights}
+    print(f"{'records':<20} {'path':<8} {'CPU ms / 10k':>13} {'wall ms / 10k':>14} {'bytes':>10}")
+    for name, (model_path, record_path) in paths().items():
+        expected = await model_path()
+        document = await record_path()
+        if normalized(document) != normalized(expected):
+            raise AssertionError(f'{name}: the record path does not match the model path')
+        scale = RECORDS_UNIT / counts[name]
+        for label, func in (('models', model_path), ('records', record_path)):
+            cpu, wall = await measure(func, arguments.repeats)
+            print(f'{name:<20} {label:<8} {cpu * scale * 1000:>13.1f} {wall * scale * 1000:>14.1f} {len(document):>10}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=RECORDS_UNIT)
+    parser.add_argument('--planes-per-flight', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=5)
+    arguments = parser.parse_args()
+    use_temporary_database()
+    asyncio.run(run(arguments))
+
+
+if __name__ == '__main__':
+    main()
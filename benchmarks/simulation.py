@@ -0,0 +1,129 @@
+"""Speed of the what-if simulation and a check that it agrees with conducting flights for real.
+
+A synthetic snapshot is built in memory and one long schedule (flights with a refuel of a random
+plane every --refuel-every steps) is replayed in-process; then --scenarios copies of a shorter
+schedule are replayed one after another and through the simulation process pool. Finally a
+small fleet is imported into a temporary database, a random schedule is simulated and then
+conducted through FlightRepository.conduct_flight, and the statuses and the final fuel levels
+are compared.
+
+Usage: python -m benchmarks.simulation [--planes N] [--flights N] [--steps N] [--scenarios N]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from uuid import UUID
+import httpx
+import numpy as np
+from benchmarks import use_temporary_database
+from benchmarks.synthetic import fleet
+
+
+def synthetic_snapshot(planes: int, flights: int, planes_per_flight: int, rng: np.random.Generator):
+    from database.flight.simulation import SimulationSnapshot
+    fuel_consumption = rng.integers(1, 11, planes)
+    max_distance = rng.integers(5_000, 15_000, planes)
+    link_start = np.arange(0, (flights + 1) * planes_per_flight, planes_per_flight)
+    return SimulationSnapshot(
+        [UUID(int=x) for x in range(planes)], fuel_consumption * max_distance, fuel_consumption, max_distance,
+        [UUID(int=x) for x in range(flights)], rng.integers(50, 500, flights), link_start,
+        rng.integers(0, planes, flights * planes_per_flight))
+
+
+def synthetic_schedule(snapshot, steps: int, refuel_every: int, rng: np.random.Generator) -> list:
+    from server.api.flight.schemas import RefuelEvent
+    flights = rng.integers(0, len(snapshot.flight_ids), steps).tolist()
+    planes = rng.integers(0, len(snapshot.plane_ids), steps // refuel_every + 1).tolist()
+    schedule = [snapshot.flight_ids[x] for x in flights]
+    for i, plane in enumerate(planes[:-1]):
+        schedule[(i + 1) * refuel_every - 1] = RefuelEvent(plane_id=snapshot.plane_ids[plane])
+    return schedule
+
+
+async def measure(arguments: argparse.Namespace):
+    from database.flight.simulation import replay, shutdown_simulation_pool, simulate
+    rng = np.random.default_rng(0)
+    snapshot = synthetic_snapshot(arguments.planes, arguments.flights, arguments.planes_per_flight, rng)
+    schedule = synthetic_schedule(snapshot, arguments.steps, arguments.refuel_every, rng)
+    start = time.perf_counter()
+    compiled = snapshot.compile(schedule)
+    compile_time = time.perf_counter() - start
+    for trajectories in (False, True):
+        start = time.perf_counter()
+        statuses = replay(*snapshot.arrays(), *compiled, trajectories)[0]
+        elapsed = time.perf_counter() - start
+        print(f'{len(schedule)} steps, trajectories={trajectories}: {elapsed:.2f} s replay '
+              f'({len(schedule) / elapsed / 1e6:.2f} M steps/s), {compile_time:.2f} s compile, '
+              f'{np.bincount(np.frombuffer(statuses, dtype=np.uint8)).tolist()} statuses')
+    scenarios = [(f'scenario {x}', synthetic_schedule(snapshot, arguments.scenario_steps, arguments.refuel_every, rng))
+                 for x in range(arguments.scenarios)]
+    start = time.perf_counter()
+    for _, scenario in scenarios:
+        replay(*snapshot.arrays(), *snapshot.compile(scenario), False)
+    serial = time.perf_counter() - start
+    await simulate(snapshot, scenarios[:1], False)
+    start = time.perf_counter()
+    await simulate(snapshot, scenarios, False)
+    pooled = time.perf_counter() - start
+    shutdown_simulation_pool()
+    print(f'{arguments.scenarios} scenarios x {arguments.scenario_steps} steps: {serial:.2f} s serial, '
+          f'{pooled:.2f} s through the pool of {arguments.processes} processes')
+
+
+async def verify(arguments: argparse.Namespace):
+    """Simulates a schedule, conducts it for real and compares the outcome"""
+    from database.database import create_tables
+    from database.flight.repository import FlightRepository
+    from database.flight.simulation import load_simulation_snapshot, shutdown_simulation_pool, simulate
+    from database.plane.repository import PlaneRepository
+    from server.app import app
+    from server.api.flight.schemas import SimulationStatus
+    await create_tables()
+    document = fleet(200, 100, 30, 4)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+        response = await client.post('/import', content=json.dumps(document))
+        response.raise_for_status()
+    rng = random.Random(1)
+    schedule = [UUID(rng.choice(document['flights'])['id']) for _ in range(arguments.verify_steps)]
+    snapshot = await load_simulation_snapshot(schedule, [])
+    [result] = await simulate(snapshot, [(None, schedule)], False)
+    shutdown_simulation_pool()
+    statuses = []
+    for flight_id in schedule:
+        try:
+            await FlightRepository.conduct_flight(flight_id)
+            statuses.append(SimulationStatus.conducted)
+        except OSError:
+            statuses.append(SimulationStatus.unsuitable_planes_removed)
+        except ValueError:
+            statuses.append(SimulationStatus.no_planes)
+    final_fuel = {str(x): (await PlaneRepository.get_plane(x)).value.current_fuel for x in snapshot.plane_ids}
+    if statuses != result['statuses'] or final_fuel != result['final_fuel']:
+        raise AssertionError('The simulation disagrees with conduct_flight')
+    print(f'{len(schedule)} steps on {len(snapshot.plane_ids)} planes: the simulation matches conduct_flight '
+          f'({statuses.count(SimulationStatus.conducted)} conducted)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--planes', type=int, default=10_000)
+    parser.add_argument('--flights', type=int, default=5_000)
+    parser.add_argument('--planes-per-flight', type=int, default=3)
+    parser.add_argument('--steps', type=int, default=1_000_000)
+    parser.add_argument('--refuel-every', type=int, default=4)
+    parser.add_argument('--scenarios', type=int, default=8)
+    parser.add_argument('--scenario-steps', type=int, default=200_000)
+    parser.add_argument('--verify-steps', type=int, default=500)
+    arguments = parser.parse_args()
+    use_temporary_database()
+    from database.config import SIMULATION_PROCESSES
+    arguments.processes = SIMULATION_PROCESSES
+    asyncio.run(measure(arguments))
+    asyncio.run(verify(arguments))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Size and speed of every /export format and of importing it back.
+
+The fleet is seeded through /import, exported once in each format, and each export is then
+imported into emptied tables. JSON and NDJSON embed every plane into each flight it serves;
+the arrow and msgpack snapshots store planes, flights and links once each. Decoding is also
+timed on its own, since the import as a whole is dominated by storing the rows. Runs in-process
+through an ASGI transport.
+
+Usage: python -m benchmarks.snapshot [--planes N] [--flights N] [--planes-per-flight N]
+"""
+import argparse
+import asyncio
+import json
+import time
+import zlib
+import httpx
+from benchmarks import use_temporary_database
+from benchmarks.synthetic import fleet
+
+FORMATS = ('json', 'ndjson', 'arrow', 'msgpack')
+
+
+async def single_chunk(body: bytes):
+    yield body
+
+
+async def run(arguments: argparse.Namespace):
+    from database.cache import repository_cache
+    from database.database import create_tables, delete_tables
+    from server.app import app
+    from server.api.data_import.resources import RECORDS
+    from server.api.export.formats import check_available
+    from server.api.export.schemas import ExportFormat
+    await create_tables()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=None) as client:
+        document = fleet(arguments.planes, arguments.flights, arguments.airports, arguments.planes_per_flight)
+        response = await client.post('/import', content=json.dumps(document))
+        response.raise_for_status()
+        print(f"{response.json()['planes']} planes, {response.json()['flights']} flights, "
+              f"{arguments.planes_per_flight} planes per flight")
+        exports = {}
+        for name in FORMATS:
+            try:
+                check_available(ExportFormat(name))
+            except ValueError as e:
+                print(f'{name}: skipped, {e.args[0]}')
+                continue
+            start = time.perf_counter()
+            response = await client.get('/export', params={'format': name})
+            response.raise_for_status()
+            exports[name] = (response.content, time.perf_counter() - start)
+        print(f"{'format':<8} {'MB':>8} {'gzip MB':>8} {'export, s':>10} {'decode, s':>10} {'import, s':>10}")
+        for name, (body, export_time) in exports.items():
+            start = time.perf_counter()
+            async for _ in RECORDS[ExportFormat(name)](single_chunk(body)):
+                pass
+            decode_time = time.perf_counter() - start
+            await delete_tables()
+            await create_tables()
+            repository_cache.clear()
+            start = time.perf_counter()
+            response = await client.post('/import', params={'format': name}, content=body)
+            response.raise_for_status()
+            import_time = time.perf_counter() - start
+            if response.json()['errors']:
+                raise AssertionError(f'{name}: the import reported errors')
+            compressed = len(zlib.compress(body, 6))
+            print(f'{name:<8} {len(body) / 1e6:>8.2f} {compressed / 1e6:>8.2f} {export_time:>10.2f} '
+                  f'{decode_time:>10.3f} {import_time:>10.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--planes', type=int, default=5_000)
+    parser.add_argument('--flights', type=int, default=1_000)
+    parser.add_argument('--airports', type=int, default=200)
+    parser.add_argument('--planes-per-flight', type=int, default=10)
+    arguments = parser.parse_args()
+    use_temporary_database()
+    asyncio.run(run(arguments))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Concurrent write load against SQLite with the stock and the tuned connection profile.
+
+Every process stands for one uvicorn worker and runs several writers, each committing
+one plane per transaction. Usage: python -m benchmarks.sqlite_writes [PROCESSES] [WRITES]
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from uuid import uuid4
+from benchmarks.report import percentile
+
+WRITERS_PER_PROCESS = 4
+PROFILES = {
+    'default': {},
+    'tuned': None,
+}
+
+
+async def write_planes(url: str, pragmas: dict, worker: int, writes: int) -> tuple[list[float], int]:
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from database.database import PlaneSchema, make_engine
+    engine = make_engine(url, pragmas)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    latencies = []
+    errors = 0
+
+    async def writer(number: int):
+        nonlocal errors
+        for i in range(writes):
+            start = time.perf_counter()
+            try:
+                async with session_maker() as session:
+                    session.add(PlaneSchema(
+                        id=uuid4(), model=f'{worker}-{number}-{i}', max_capacity=100,
+                        max_distance=1000, current_fuel=1000, fuel_consumption=1))
+                    await session.commit()
+            except OperationalError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(writer(x) for x in range(WRITERS_PER_PROCESS)))
+    await engine.dispose()
+    return latencies, errors
+
+
+def run_worker(args: tuple[str, dict, int, int]) -> tuple[list[float], int]:
+    return asyncio.run(write_planes(*args))
+
+
+async def prepare(url: str, pragmas: dict):
+    from database.database import Base, make_engine
+    engine = make_engine(url, pragmas)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+
+def main(processes: int, writes: int):
+    from database.config import SQLITE_PRAGMAS
+    print(f"{processes} processes x {WRITERS_PER_PROCESS} writers x {writes} commits")
+    print(f"{'profile':>8} {'commits/s':>10} {'p50, ms':>8} {'p99, ms':>8} {'errors':>7}")
+    for name, pragmas in PROFILES.items():
+        pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+        url = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/planes.db"
+        asyncio.run(prepare(url, pragmas))
+        start = time.perf_counter()
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(run_worker, [(url, pragmas, x, writes) for x in range(processes)])
+        elapsed = time.perf_counter() - start
+        latencies = [x for worker_latencies, _ in results for x in worker_latencies]
+        errors = sum(x for _, x in results)
+        print(f"{name:>8} {len(latencies) / elapsed:>10.0f} {percentile(latencies, 0.5) * 1000:>8.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.1f} {errors:>7}")
+
+
+if __name__ == '__main__':
+    arguments = [int(x) for x in sys.argv[1:]]
+    main(arguments[0] if arguments else os.cpu_count() or 4, arguments[1] if len(arguments) > 1 else 200)
@@ -0,0 +1,58 @@
+import random
+import string
+from uuid import UUID
+
+
+def airport_codes(count: int, rng: random.Random) -> list[str]:
+    codes = set()
+    while len(codes) < count:
+        codes.add(''.join(rng.choices(string.ascii_uppercase, k=3 if count <= 10_000 else 4)))
+    return sorted(codes)
+
+
+def random_id(rng: random.Random) -> str:
+    return str(UUID(int=rng.getrandbits(128), version=4))
+
+
+def fleet(planes: int, flights: int, airports: int = 100, planes_per_flight: int = 3,
+          seed: int = 0) -> dict[str, list[dict]]:
+    """A synthetic fleet and flight network in the shape produced by /export"""
+    rng = random.Random(seed)
+    plane_records = []
+    for i in range(planes):
+        max_distance = rng.randint(500, 15000)
+        fuel_consumption = rng.randint(1, 10)
+        plane_records.append({
+            'id': random_id(rng),
+            'model': f'M{i:07d}',
+            'max_capacity': rng.randint(10, 850),
+            'max_distance': max_distance,
+            'current_fuel': rng.randint(max_distance * fuel_consumption // 2, max_distance * fuel_consumption),
+            'fuel_consumption': fuel_consumption,
+        })
+    codes = airport_codes(airports, rng)
+    routes = set()
+    flights = min(flights, airports * (airports - 1))
+    while len(routes) < flights:
+        begin_airport, end_airport = rng.sample(codes, 2)
+        routes.add((begin_airport, end_airport))
+    flight_records = []
+    for begin_airport, end_airport in sorted(routes):
+        distance = rng.randint(200, 8000)
+        passengers = rng.randint(10, 400)
+        suitable = []
+        for plane in rng.sample(plane_records, min(len(plane_records), planes_per_flight * 4)):
+            if (plane['max_capacity'] >= passengers and plane['max_distance'] >= distance
+                    and plane['current_fuel'] >= plane['fuel_consumption'] * distance):
+                suitable.append(plane)
+            if len(suitable) == planes_per_flight:
+                break
+        flight_records.append({
+            'id': random_id(rng),
+            'begin_airport': begin_airport,
+            'end_airport': end_airport,
+            'distance': distance,
+            'passengers': passengers,
+            'suitable_planes': suitable,
+        })
+    return {'planes': plane_records, 'flights': flight_records}
@@ -0,0 +1,143 @@
+"""Read throughput of `python -m server` against the number of worker processes.
+
+For every worker count the launcher is started on a fresh temporary database, seeded through
+/import and loaded for a fixed time by several client processes issuing cached reads: single
+planes and flights, the first page of each list and itineraries. After the load a plane is
+edited and every worker is checked to serve the new version once the change log was polled.
+
+Usage: python -m benchmarks.workers [--workers N ...] [--clients N] [--concurrency N] [--duration S]
+                                    [--planes N] [--flights N]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+from benchmarks.synthetic import fleet
+
+READY_TIMEOUT = 60
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, PLANES_DB_URL=f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/planes.db", PLANES_METRICS='0')
+    return subprocess.Popen(
+        [sys.executable, '-m', 'server', '--workers', str(workers), '--port', str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(url: str):
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f'{url}/planes', params={'limit': 1}).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f'{url} did not start')
+
+
+def read_paths(document: dict[str, list[dict]], count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    airports = sorted({x['begin_airport'] for x in document['flights']})
+    paths = []
+    for _ in range(count):
+        kind = rng.randrange(5)
+        if kind == 0:
+            paths.append(f"/planes/{rng.choice(document['planes'])['id']}")
+        elif kind == 1:
+            paths.append(f"/flights/{rng.choice(document['flights'])['id']}")
+        elif kind == 2:
+            paths.append('/planes?limit=100')
+        elif kind == 3:
+            paths.append('/flights?limit=100')
+        else:
+            origin, destination = rng.sample(airports, 2)
+            paths.append(f'/flights/itinerary?origin={origin}&destination={destination}')
+    return paths
+
+
+async def load(url: str, paths: list[str], concurrency: int, duration: float) -> tuple[int, int]:
+    done = errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset: int):
+        nonlocal done, errors
+        index = offset
+        while time.perf_counter() < deadline:
+            response = await client.get(paths[index % len(paths)])
+            index += concurrency
+            if response.status_code >= 500:
+                errors += 1
+            done += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=None, limits=limits) as client:
+        await asyncio.gather(*(worker(x) for x in range(concurrency)))
+    return done, errors
+
+
+def run_client(args: tuple) -> tuple[int, int]:
+    return asyncio.run(load(*args))
+
+
+def check_coherence(url: str, plane: dict, workers: int) -> bool:
+    """Edits a plane through one worker and checks that no worker keeps serving the old version"""
+    # Fresh connections are spread over the workers by the kernel; enough of them reach every worker
+    samples = [httpx.get(f"{url}/planes/{plane['id']}").json() for _ in range(workers * 8)]
+    changed = dict(samples[0], max_capacity=samples[0]['max_capacity'] + 1)
+    del changed['id']
+    httpx.put(f"{url}/planes/{plane['id']}", json=changed).raise_for_status()
+    time.sleep(1)
+    samples = [httpx.get(f"{url}/planes/{plane['id']}").json() for _ in range(workers * 8)]
+    return all(x['max_capacity'] == changed['max_capacity'] for x in samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=4, help='load generating processes')
+    parser.add_argument('--concurrency', type=int, default=16, help='connections per client process')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--planes', type=int, default=2_000)
+    parser.add_argument('--flights', type=int, default=2_000)
+    parser.add_argument('--airports', type=int, default=200)
+    arguments = parser.parse_args()
+    document = fleet(arguments.planes, arguments.flights, arguments.airports)
+    print(f'{os.cpu_count()} CPUs, {arguments.clients} client processes x {arguments.concurrency} connections')
+    print(f"{'workers':>7} {'requests/s':>11} {'errors':>7} {'coherent':>9}")
+    for workers in arguments.workers:
+        port = free_port()
+        url = f'http://127.0.0.1:{port}'
+        server = start_server(workers, port)
+        try:
+            wait_ready(url)
+            httpx.post(f'{url}/import', content=json.dumps(document), timeout=None).raise_for_status()
+            jobs = [(url, read_paths(document, 10_000, x), arguments.concurrency, arguments.duration)
+                    for x in range(arguments.clients)]
+            with multiprocessing.get_context('spawn').Pool(arguments.clients) as pool:
+                results = pool.map(run_client, jobs)
+            coherent = check_coherence(url, document['planes'][0], workers)
+        finally:
+            server.terminate()
+            server.wait()
+        requests = sum(x for x, _ in results)
+        errors = sum(x for _, x in results)
+        print(f"{workers:>7} {requests / arguments.duration:>11.0f} {errors:>7} {'yes' if coherent else 'NO':>9}")
+
+
+if __name__ == '__main__':
+    main()
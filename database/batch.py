@@ -0,0 +1,43 @@
+"""Runs many repository write steps in one session and, at most, one commit.
+
+Each step runs inside a savepoint: when it raises, only its own changes are rolled back and the
+exception becomes its result. By default the steps that succeeded are committed together; in
+atomic mode the first failure rolls back the whole batch and the remaining steps are not run.
+The transaction takes the SQLite write lock up front, so no other writer gets in between the
+steps.
+"""
+from typing import Awaitable, Callable
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.changes import Transaction
+from database.database import begin_immediate, new_session
+
+Step = Callable[[AsyncSession, Transaction], Awaitable[object]]
+
+
+class NotExecuted(Exception):
+    """An earlier step of an atomic batch failed, so this one was not run"""
+
+
+async def run_batch(steps: list[Step], atomic: bool = False) -> tuple[bool, list[object]]:
+    """Results of the steps, an exception for each failed one, and whether anything was committed"""
+    results: list[object] = []
+    async with new_session() as session:
+        await begin_immediate(session)
+        transaction = Transaction()
+        for step in steps:
+            changes = Transaction()
+            try:
+                async with session.begin_nested():
+                    results.append(await step(session, changes))
+            except Exception as e:
+                results.append(e)
+                if atomic:
+                    await session.rollback()
+                    results += [NotExecuted()] * (len(steps) - len(results))
+                    return False, results
+                continue
+            transaction.merge(changes)
+        if not transaction:
+            return False, results
+        await transaction.commit(session)
+        return True, results
@@ -0,0 +1,224 @@
+import functools
+import inspect
+import itertools
+import sys
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Callable, Hashable, Iterable
+import numpy as np
+from database.config import CACHE_MAX_BYTES, CACHE_SIZE, CACHE_TTL
+
+PLANES = 'planes'
+PLANE = 'plane:{plane_id}'
+PLANE_IDS = 'plane_ids'
+PLANE_SHAPES = 'plane_shapes'
+FLIGHTS = 'flights'
+FLIGHT = 'flight:{flight_id}'
+FLIGHT_IDS = 'flight_ids'
+ASSIGNMENTS = 'assignments'
+ROUTES = 'routes'
+ALL = '*'
+
+MAX_ENTITY_TAGS = 1000
+SIZE_SAMPLE = 64
+MISSING = object()
+
+
+def sample(items: list) -> tuple[list, float]:
+    """Up to SIZE_SAMPLE evenly spaced items and the number of items each of them stands for"""
+    if len(items) <= SIZE_SAMPLE:
+        return items, 1.0
+    step = len(items) / SIZE_SAMPLE
+    return [items[int(i * step)] for i in range(SIZE_SAMPLE)], step
+
+
+def approximate_size(value: object) -> int:
+    """Bytes held by a value: its containers, records, models and arrays and what they hold.
+
+    Arrays count their nbytes. Containers longer than SIZE_SAMPLE are sized from a sample of their
+    items, so the estimate of a page or a snapshot costs about the same whatever its length.
+    """
+    size = 0.0
+    seen = set()
+    stack = [(value, 1.0)]
+    while stack:
+        item, weight = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, np.ndarray):
+            size += item.nbytes * weight
+            continue
+        size += sys.getsizeof(item) * weight
+        if isinstance(item, dict):
+            items = list(item.values())
+        elif isinstance(item, (list, tuple)):
+            items = item
+        elif isinstance(item, (set, frozenset)):
+            items = list(item)
+        elif hasattr(item, '__dict__') and not isinstance(item, (type, Enum)):
+            items = list(vars(item).values())
+        else:
+            continue
+        items, step = sample(items)
+        stack.extend((x, weight * step) for x in items)
+    return int(size)
+
+
+def collapse(tags: Iterable[str]) -> set[str]:
+    """The tags of a write, with ALL in place of its per-entity tags when there are too many to drop one by one"""
+    tags = set(tags)
+    entity_tags = {x for x in tags if ':' in x}
+    if len(entity_tags) > MAX_ENTITY_TAGS:
+        return tags - entity_tags | {ALL}
+    return tags
+
+
+class LRUCache:
+    """LRU cache bounded by entry count and approximate bytes; invalidating a tag drops every entry that has it.
+
+    Pinned entries are held apart from the LRU order and outside both bounds until a tag of theirs
+    is invalidated or they expire. They are meant for a few values, such as the fleet snapshot, that
+    are expensive to rebuild and large by design.
+    """
+
+    def __init__(self, maxsize: int, maxbytes: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.entries: OrderedDict[Hashable, tuple[object, float | None, frozenset[str], int]] = OrderedDict()
+        self.pinned: dict[Hashable, tuple[object, float | None, frozenset[str], int]] = {}
+        self.tagged: dict[str, set[Hashable]] = {}
+        self.reads: dict[int, set[str]] = {}
+        self.read_ids = itertools.count()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> object:
+        entry = self.entries.get(key) or self.pinned.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        value, expires_at, _, _ = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            self.remove(key)
+            self.misses += 1
+            return MISSING
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: object, tags: frozenset[str], pinned: bool = False):
+        if key in self.entries or key in self.pinned:
+            self.remove(key)
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        if pinned:
+            self.pinned[key] = (value, expires_at, tags, 0)
+        else:
+            size = approximate_size(value)
+            if size > self.maxbytes:
+                return
+            self.entries[key] = (value, expires_at, tags, size)
+            self.bytes += size
+        for tag in tags:
+            self.tagged.setdefault(tag, set()).add(key)
+        while len(self.entries) > self.maxsize or self.bytes > self.maxbytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, key: Hashable):
+        _, _, tags, size = self.entries.pop(key) if key in self.entries else self.pinned.pop(key)
+        self.bytes -= size
+        for tag in tags:
+            keys = self.tagged[tag]
+            keys.discard(key)
+            if not keys:
+                del self.tagged[tag]
+
+    def start_read(self) -> int:
+        """Starts collecting the tags invalidated while a value is read, to tell whether it is stale once read"""
+        read_id = next(self.read_ids)
+        self.reads[read_id] = set()
+        return read_id
+
+    def finish_read(self, read_id: int) -> frozenset[str]:
+        return frozenset(self.reads.pop(read_id))
+
+    def invalidate(self, *tags: str):
+        for invalidated in self.reads.values():
+            invalidated.update(tags)
+        if ALL in tags:
+            self.invalidations += len(self.entries) + len(self.pinned)
+            self.clear()
+            return
+        for tag in tags:
+            for key in list(self.tagged.get(tag, ())):
+                self.remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.pinned.clear()
+        self.tagged.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'bytes': self.bytes,
+            'maxbytes': self.maxbytes,
+            'pinned': len(self.pinned),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+repository_cache = LRUCache(maxsize=CACHE_SIZE, maxbytes=CACHE_MAX_BYTES, ttl=CACHE_TTL)
+
+
+def cached(*tags: str, value_tags: Callable[[object], Iterable[str]] | None = None,
+           skip: Callable[[dict], bool] | None = None, pinned: bool = False):
+    """Caches a repository read; tags may refer to the call arguments, e.g. FLIGHT.
+
+    value_tags adds the tags of the entities found in the value, such as PLANE for every plane
+    of a page, so that a write drops only the entries that hold what it changed. Calls for
+    which skip(arguments) is true are not cached. pinned values are kept outside the LRU bounds.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            if skip is not None and skip(bound.arguments):
+                return await func(*args, **kwargs)
+            key = (func.__qualname__, *bound.arguments.values())
+            value = repository_cache.get(key)
+            if value is not MISSING:
+                return value
+            read_id = repository_cache.start_read()
+            try:
+                value = await func(*args, **kwargs)
+            finally:
+                invalidated = repository_cache.finish_read(read_id)
+            entry_tags = frozenset(itertools.chain(
+                (tag.format(**bound.arguments) for tag in tags), value_tags(value) if value_tags else ()))
+            # A write that finished while we were reading may have made the value stale
+            if ALL not in invalidated and invalidated.isdisjoint(entry_tags):
+                repository_cache.set(key, value, entry_tags, pinned)
+            return value
+        return wrapper
+    return decorator
+
+
+def invalidate(*tags: str):
+    repository_cache.invalidate(*tags)
@@ -0,0 +1,167 @@
+"""The change_log table: cache invalidation shared by every server process and the change feed.
+
+A write appends one entry to change_log in its own transaction, so the entry commits or rolls
+back together with the data. The entry carries the cache tags the write invalidates and the
+changes it made; its id is the sequence number of the change feed.
+
+Every process polls the log and applies the entries written by the others: the repository cache
+loses the tagged entries and the route network is reloaded on its next use. A process sees
+another one's write at most one poll interval late. The log keeps the latest
+CHANGE_LOG_RETENTION entries.
+
+A change is {"op", "entity", "id"} with "data" holding the new values of the changed fields:
+created, updated and deleted planes and flights, planes attached to and detached from flights.
+A write with more than CHANGE_FEED_LIMIT changes is logged as a single reset, which tells
+clients to reload everything.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, TypeVar
+from uuid import UUID, uuid4
+import orjson
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.cache import ROUTES, collapse, invalidate
+from database.config import CHANGE_FEED_LIMIT, CHANGE_LOG_RETENTION, CHANGE_POLL_INTERVAL
+from database.database import change_log_table, new_session
+from database.flight.network import route_network
+
+ORIGIN = uuid4().hex
+PRUNE_EVERY = 300
+RESET = {'op': 'reset'}
+T = TypeVar('T')
+
+log = logging.getLogger('database.changes')
+
+
+def change(op: str, entity: str, entity_id: UUID, **data) -> dict:
+    entry = {'op': op, 'entity': entity, 'id': entity_id}
+    if data:
+        entry['data'] = data
+    return entry
+
+
+def fields(row: object, names: tuple[str, ...]) -> dict:
+    """The named attributes of an ORM object, or the named keys of a record dict"""
+    if isinstance(row, dict):
+        return {x: row[x] for x in names}
+    return {x: getattr(row, x) for x in names}
+
+
+async def commit(session: AsyncSession, *tags: str, changes: list[dict] | None = None):
+    """Commits the session together with its change log entry and invalidates the tags locally"""
+    tags = collapse(tags)
+    if changes and len(changes) > CHANGE_FEED_LIMIT:
+        changes = [RESET]
+    await session.execute(insert(change_log_table).values(
+        origin=ORIGIN, tags=','.join(sorted(tags)), changes=orjson.dumps(changes).decode() if changes else None))
+    await session.commit()
+    invalidate(*tags)
+
+
+class Transaction:
+    """What the writes made in one session have to publish once it commits.
+
+    Collects the cache tags, change log entries and in-process actions (route network updates)
+    of one or more writes, so that several of them can share the session and its single commit.
+    """
+
+    def __init__(self):
+        self.tags: set[str] = set()
+        self.changes: list[dict] = []
+        self.actions: list[Callable[[], None]] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.tags)
+
+    def record(self, *tags: str, changes: list[dict] | None = None, after: Callable[[], None] | None = None):
+        self.tags.update(tags)
+        self.changes += changes or []
+        if after is not None:
+            self.actions.append(after)
+
+    def merge(self, other: 'Transaction'):
+        self.tags |= other.tags
+        self.changes += other.changes
+        self.actions += other.actions
+
+    async def commit(self, session: AsyncSession):
+        await commit(session, *self.tags, changes=self.changes)
+        for action in self.actions:
+            action()
+
+
+async def run_write(step: Callable[..., Awaitable[T]], *arguments) -> T:
+    """Runs a repository write step, `step(session, transaction, *arguments)`, in a session of its own"""
+    async with new_session() as session:
+        transaction = Transaction()
+        result = await step(session, transaction, *arguments)
+        await transaction.commit(session)
+        return result
+
+
+async def last_sequence() -> int:
+    async with new_session() as session:
+        result = await session.execute(select(func.coalesce(func.max(change_log_table.c.id), 0)))
+        return result.scalar_one()
+
+
+async def read_changes(after: int, limit: int = 1000) -> tuple[list[tuple[int, str]], bool]:
+    """Entries with changes past the given sequence number, oldest first, as (sequence, JSON list) pairs.
+
+    The flag is False when entries past `after` were already pruned, so the reader missed changes.
+    """
+    async with new_session() as session:
+        result = await session.execute(select(func.min(change_log_table.c.id)))
+        oldest = result.scalar_one()
+        query = select(change_log_table.c.id, change_log_table.c.changes).where(
+            change_log_table.c.id > after, change_log_table.c.changes.is_not(None)).order_by(
+            change_log_table.c.id).limit(limit)
+        result = await session.execute(query)
+        return result.all(), oldest is None or oldest <= after + 1
+
+
+async def prune(retention: int = CHANGE_LOG_RETENTION):
+    async with new_session() as session:
+        newest = select(func.max(change_log_table.c.id)).scalar_subquery()
+        await session.execute(delete(change_log_table).where(change_log_table.c.id <= newest - retention))
+        await session.commit()
+
+
+class ChangeListener:
+    def __init__(self, interval: float = CHANGE_POLL_INTERVAL):
+        self.interval = interval
+        self.last_id = 0
+
+    async def start(self):
+        """Skips the history: the caches of a starting process are empty anyway"""
+        self.last_id = await last_sequence()
+
+    async def poll(self) -> int:
+        """Applies the entries written by other processes since the last poll and returns their number"""
+        async with new_session() as session:
+            query = select(change_log_table.c.id, change_log_table.c.origin, change_log_table.c.tags).where(
+                change_log_table.c.id > self.last_id).order_by(change_log_table.c.id)
+            result = await session.execute(query)
+            rows = result.all()
+        if not rows:
+            return 0
+        self.last_id = rows[-1][0]
+        rows = [x for x in rows if x[1] != ORIGIN]
+        tags = {tag for _, _, x in rows for tag in x.split(',')}
+        if ROUTES in tags:
+            route_network.invalidate()
+        invalidate(*tags)
+        return len(rows)
+
+    async def run(self):
+        polls = 0
+        while True:
+            await asyncio.sleep(self.interval)
+            polls += 1
+            try:
+                await self.poll()
+                if polls % PRUNE_EVERY == 0:
+                    await prune()
+            except Exception:
+                log.exception('Could not read the change log')
@@ -0,0 +1,66 @@
+"""Maintained index of the planes that can currently serve each flight.
+
+A plane passes every check of FlightRepository.add_plane (enough capacity, enough range and
+enough fuel for the flight distance) exactly when its capacity covers the passengers and its
+reach, the smaller of its range and of the distance its fuel lasts, covers the distance. The
+ix_planes_reach index keys planes by (reach, max_capacity), and SQLite updates the entry of a
+plane within the same write whenever it is added, edited, deleted or burns fuel. A candidate
+lookup reads the entries from the flight distance up, and writes cost one index entry per plane.
+
+Usage: python -m database.compatibility check|rebuild
+"""
+import asyncio
+import sys
+from uuid import UUID
+import numpy as np
+from sqlalchemy import ColumnElement, and_, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import COMPATIBILITY_INDEX, PLANE_REACH, FlightSchema, PlaneSchema, new_session
+from database.search import unindexed
+
+
+def can_serve(passengers: int, distance: int) -> ColumnElement[bool]:
+    """Condition on planes answered from the index; +max_capacity keeps SQLite from picking ix_planes_max_capacity"""
+    return and_(PLANE_REACH >= distance, unindexed(PlaneSchema.max_capacity) >= passengers)
+
+
+async def rebuild(session: AsyncSession):
+    await session.execute(text(f"REINDEX {COMPATIBILITY_INDEX.name}"))
+
+
+async def check(session: AsyncSession) -> tuple[list[str], list[UUID]]:
+    """Returns the integrity errors of the planes table and its indexes, and the flights for which the
+    index counts a different number of candidates than the checks of add_plane, run over every plane"""
+    result = await session.execute(text("PRAGMA integrity_check(planes)"))
+    errors = [x for x in result.scalars() if x != 'ok']
+    result = await session.execute(select(
+        PlaneSchema.max_capacity, PlaneSchema.max_distance, PlaneSchema.current_fuel, PlaneSchema.fuel_consumption))
+    max_capacity, max_distance, current_fuel, fuel_consumption = np.array(result.all(), dtype=np.int64).reshape(-1, 4).T
+    mismatched = []
+    result = await session.execute(select(FlightSchema.id, FlightSchema.passengers, FlightSchema.distance))
+    for flight_id, passengers, distance in result.all():
+        count = await session.execute(select(func.count()).where(can_serve(passengers, distance)))
+        expected = np.count_nonzero((max_capacity >= passengers) & (max_distance >= distance)
+                                    & (current_fuel >= fuel_consumption * distance))
+        if count.scalar_one() != expected:
+            mismatched.append(flight_id)
+    return errors, mismatched
+
+
+async def main(command: str):
+    async with new_session() as session:
+        if command == 'rebuild':
+            await rebuild(session)
+            await session.commit()
+        errors, mismatched = await check(session)
+    for error in errors:
+        print(error)
+    print(f'integrity errors: {len(errors)}, flights with mismatched candidates: {len(mismatched)}')
+    if errors or mismatched:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] not in ('check', 'rebuild'):
+        sys.exit(__doc__.splitlines()[-1])
+    asyncio.run(main(sys.argv[1]))
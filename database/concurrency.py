@@ -0,0 +1,53 @@
+"""Optimistic concurrency for plane and flight rows.
+
+Both tables carry a version column registered as SQLAlchemy's version_id_col, so every ORM
+UPDATE or DELETE is issued as `... WHERE id = :id AND version = :read_version` and bumps the
+version: a write based on a stale read fails with StaleDataError instead of overwriting a
+concurrent one. A flight's version also covers its suitable planes, so writes that only change
+the links touch the flight. Clients see the version as the ETag of a plane or a flight.
+"""
+import asyncio
+import random
+from typing import Generic, NamedTuple, TypeVar
+from uuid import UUID
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import flag_modified
+from database.database import FlightSchema
+
+MAX_ATTEMPTS = 8
+BACKOFF = 0.005
+CHUNK_SIZE = 5000
+T = TypeVar('T')
+
+
+class VersionMismatch(Exception):
+    """The row has a different version than the one the client made its change against"""
+
+
+class Versioned(NamedTuple, Generic[T]):
+    value: T
+    version: int
+
+
+async def backoff(attempt: int):
+    """Waits a random time of up to BACKOFF * 2 ** attempt seconds, so that writers retrying together spread out"""
+    await asyncio.sleep(random.uniform(0, BACKOFF * 2 ** attempt))
+
+
+def check_version(version: int, expected_versions: set[int] | None):
+    if expected_versions is not None and version not in expected_versions:
+        raise VersionMismatch(version)
+
+
+def touch(flight: FlightSchema):
+    """Makes the next flush bump the flight's version when only its suitable planes changed"""
+    flag_modified(flight, 'distance')
+
+
+async def touch_flights(session: AsyncSession, flight_ids: list[UUID]):
+    """Bumps the versions of flights whose links were changed with Core statements"""
+    flights = FlightSchema.__table__
+    for start in range(0, len(flight_ids), CHUNK_SIZE):
+        ids = flight_ids[start:start + CHUNK_SIZE]
+        await session.execute(update(flights).where(flights.c.id.in_(ids)).values(version=flights.c.version + 1))
@@ -0,0 +1,23 @@
+import os
+
+DATABASE_URL = os.environ.get('PLANES_DB_URL', 'sqlite+aiosqlite:///planes.db')
+POOL_SIZE = int(os.environ.get('PLANES_DB_POOL_SIZE', 5))
+MAX_OVERFLOW = int(os.environ.get('PLANES_DB_MAX_OVERFLOW', 10))
+POOL_TIMEOUT = float(os.environ.get('PLANES_DB_POOL_TIMEOUT', 30))
+
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('PLANES_DB_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('PLANES_DB_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('PLANES_DB_BUSY_TIMEOUT', 5000)),
+    'cache_size': int(os.environ.get('PLANES_DB_CACHE_SIZE', -64000)),
+    'mmap_size': int(os.environ.get('PLANES_DB_MMAP_SIZE', 256 * 1024 * 1024)),
+    'temp_store': 'MEMORY',
+}
+
+CACHE_SIZE = int(os.environ.get('PLANES_CACHE_SIZE', 1024))
+CACHE_MAX_BYTES = int(os.environ.get('PLANES_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+CACHE_TTL = float(os.environ['PLANES_CACHE_TTL']) if os.environ.get('PLANES_CACHE_TTL') else None
+CHANGE_POLL_INTERVAL = float(os.environ.get('PLANES_CHANGE_POLL_INTERVAL', 0.2))
+CHANGE_FEED_LIMIT = int(os.environ.get('PLANES_CHANGE_FEED_LIMIT', 10_000))
+CHANGE_LOG_RETENTION = int(os.environ.get('PLANES_CHANGE_LOG_RETENTION', 100_000))
+SIMULATION_PROCESSES = int(os.environ.get('PLANES_SIMULATION_PROCESSES', os.cpu_count() or 1))
@@ -1,13 +1,52 @@
+from typing import Iterable, Sequence
 from uuid import UUID
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import Column, Table, ForeignKey
+from sqlalchemy import Column, Connection, Index, Integer, String, Table, ForeignKey, event, func, select, text
+from database.config import DATABASE_URL, MAX_OVERFLOW, POOL_SIZE, POOL_TIMEOUT, SQLITE_PRAGMAS
 
 
-engine = create_async_engine("sqlite+aiosqlite:///planes.db")
+def make_engine(url: str = DATABASE_URL, pragmas: dict[str, object] = SQLITE_PRAGMAS) -> AsyncEngine:
+    new_engine = create_async_engine(
+        url, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT)
+    if new_engine.dialect.name == 'sqlite':
+        @event.listens_for(new_engine.sync_engine, 'connect')
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+    return new_engine
+
+
+engine = make_engine()
 new_session = async_sessionmaker(engine, expire_on_commit=False)
 
 
+async def begin_immediate(session: AsyncSession):
+    """Starts the session's transaction right away, holding the SQLite write lock until it ends.
+
+    The sqlite3 driver only begins a transaction before the first INSERT, UPDATE or DELETE, so a
+    SAVEPOINT issued earlier would open a transaction of its own and its RELEASE would commit.
+    """
+    connection = await session.connection()
+    if connection.dialect.name == 'sqlite':
+        await connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def records(keys: Sequence[str], rows: Iterable[tuple]) -> list[dict]:
+    """Column rows as plain dicts; several times cheaper than Row._asdict, which builds a mapping per row"""
+    keys = tuple(keys)
+    return [dict(zip(keys, x)) for x in rows]
+
+
+def columns(keys: Sequence[str], rows: Sequence[tuple]) -> dict[str, list]:
+    """Column rows transposed into one list per column"""
+    if not rows:
+        return {x: [] for x in keys}
+    return dict(zip(keys, map(list, zip(*rows))))
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -15,34 +54,110 @@ class Base(DeclarativeBase):
 association_table = Table(
     "association_table",
     Base.metadata,
-    Column("flight_id", ForeignKey("flights.id")),
-    Column("plane_id", ForeignKey("planes.id")),
+    Column("flight_id", ForeignKey("flights.id"), primary_key=True),
+    Column("plane_id", ForeignKey("planes.id"), primary_key=True),
+    Index("ix_association_table_plane_id", "plane_id"),
+)
+
+change_log_table = Table(
+    "change_log",
+    Base.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("origin", String, nullable=False),
+    Column("tags", String, nullable=False),
+    Column("changes", String),
+    sqlite_autoincrement=True,
 )
 
 
 class PlaneSchema(Base):
     __tablename__ = "planes"
     id: Mapped[UUID] = mapped_column(primary_key=True)
-    model: Mapped[str]
-    max_capacity: Mapped[int]
-    max_distance: Mapped[int]
-    current_fuel: Mapped[int]
-    fuel_consumption: Mapped[int]
+    model: Mapped[str] = mapped_column(index=True, unique=True)
+    max_capacity: Mapped[int] = mapped_column(index=True)
+    max_distance: Mapped[int] = mapped_column(index=True)
+    current_fuel: Mapped[int] = mapped_column(index=True)
+    fuel_consumption: Mapped[int] = mapped_column(index=True)
+    version: Mapped[int] = mapped_column(server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+
+
+# The longest flight a plane can serve right now: its range, or less when its fuel runs out first
+PLANE_REACH = func.min(PlaneSchema.max_distance, PlaneSchema.current_fuel // PlaneSchema.fuel_consumption)
+COMPATIBILITY_INDEX = Index("ix_planes_reach", PLANE_REACH, PlaneSchema.max_capacity)
 
 
 class FlightSchema(Base):
     __tablename__ = "flights"
+    __table_args__ = (
+        Index("ix_flights_airports", "begin_airport", "end_airport", unique=True),
+        Index("ix_flights_end_airport", "end_airport"),
+    )
     id: Mapped[UUID] = mapped_column(primary_key=True)
     begin_airport: Mapped[str]
     end_airport: Mapped[str]
-    distance: Mapped[int]
-    passengers: Mapped[int]
+    distance: Mapped[int] = mapped_column(index=True)
+    passengers: Mapped[int] = mapped_column(index=True)
+    version: Mapped[int] = mapped_column(server_default='1')
     suitable_planes: Mapped[list[PlaneSchema]] = relationship(secondary=association_table)
+    __mapper_args__ = {'version_id_col': version}
+
+
+def migrate_columns(conn: Connection):
+    """Adds the columns introduced after a planes.db file was created"""
+    added_columns = (
+        ("planes", "version", "INTEGER NOT NULL DEFAULT 1"),
+        ("flights", "version", "INTEGER NOT NULL DEFAULT 1"),
+        ("change_log", "changes", "VARCHAR"),
+    )
+    for table, column, definition in added_columns:
+        columns = {x.name for x in conn.execute(text(f"PRAGMA table_info({table})"))}
+        if column not in columns:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+
+
+def find_duplicates(conn: Connection, table: Table, index: Index) -> list[str]:
+    """The rows that break a unique index yet to be created, described as the value and the ids that share it"""
+    query = select(*index.columns, func.group_concat(table.c.id)).group_by(*index.columns).having(func.count() > 1)
+    return [f"{', '.join(f'{x.name}={y!r}' for x, y in zip(index.columns, row[:-1]))}: "
+            f"ids {', '.join(str(UUID(x)) for x in row[-1].split(','))}" for row in conn.execute(query)]
+
+
+def migrate_indexes(conn: Connection):
+    """Brings planes.db files created before the indexes were declared up to date.
+
+    Links to missing planes or flights, left behind by deletes of earlier versions, are removed.
+    Rows that break a unique index are not merged or renamed automatically: the migration stops
+    and names them, so that they can be fixed by hand.
+    """
+    conn.execute(text(
+        "DELETE FROM association_table WHERE plane_id NOT IN (SELECT id FROM planes) "
+        "OR flight_id NOT IN (SELECT id FROM flights)"))
+    association_columns = conn.execute(text("PRAGMA table_info(association_table)")).all()
+    if not any(column.pk for column in association_columns):
+        conn.execute(text(
+            "DELETE FROM association_table WHERE rowid NOT IN "
+            "(SELECT MIN(rowid) FROM association_table GROUP BY flight_id, plane_id)"))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_association_table_flight_plane "
+            "ON association_table (flight_id, plane_id)"))
+    for table in Base.metadata.sorted_tables:
+        existing = {x.name for x in conn.execute(text(f"PRAGMA index_list({table.name})"))}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            duplicates = find_duplicates(conn, table, index) if index.unique else []
+            if duplicates:
+                raise RuntimeError(f"Cannot create the unique index {index.name}: {table.name} has duplicate rows "
+                                   f"({'; '.join(duplicates)}). Rename or delete them and start again.")
+            index.create(conn)
 
 
 async def create_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(migrate_columns)
+        await conn.run_sync(migrate_indexes)
 
 
 async def delete_tables():
@@ -0,0 +1,32 @@
+from bisect import bisect_left, insort
+from uuid import UUID
+
+
+def plane_reach(max_distance: int, current_fuel: int, fuel_consumption: int) -> int:
+    return min(max_distance, current_fuel // fuel_consumption)
+
+
+def solve_assignment(flights: list[tuple[UUID, int, int]],
+                     planes: list[tuple[UUID, int, int]]) -> dict[UUID, UUID]:
+    """Maximum matching of flights (id, passengers, distance) to planes (id, max_capacity, reach).
+
+    A plane fits a flight when both its capacity and its reach dominate the flight, so the
+    graph has a nested structure and does not have to be built explicitly. Flights are taken
+    from the longest one; every plane that reaches it reaches all later flights too, and among
+    those the smallest sufficient capacity is used, which never hurts the remaining flights.
+    This gives a maximum matching with the least spare capacity in O((F + P) log P).
+    """
+    flights = sorted(flights, key=lambda x: x[2], reverse=True)
+    planes = sorted(planes, key=lambda x: x[2], reverse=True)
+    available: list[tuple[int, int]] = []
+    assignment = {}
+    next_plane = 0
+    for flight_id, passengers, distance in flights:
+        while next_plane < len(planes) and planes[next_plane][2] >= distance:
+            insort(available, (planes[next_plane][1], next_plane))
+            next_plane += 1
+        position = bisect_left(available, (passengers,))
+        if position < len(available):
+            _, plane_index = available.pop(position)
+            assignment[flight_id] = planes[plane_index][0]
+    return assignment
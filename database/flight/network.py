@@ -0,0 +1,177 @@
+import asyncio
+from heapq import heappop, heappush
+from typing import Iterable, NamedTuple
+from uuid import UUID
+from sqlalchemy import select
+from database.database import FlightSchema, new_session
+
+
+class Leg(NamedTuple):
+    flight_id: UUID
+    begin_airport: str
+    end_airport: str
+    distance: int
+    passengers: int
+
+
+class RouteNetwork:
+    """Flights as adjacency indexes of the legs departing from and arriving at each airport.
+
+    Writes update the indexes in place after their commit, so itinerary queries never read the
+    flights table. The version counter lets a concurrent load detect that it raced a write.
+    Both searches run from the two ends at once, which on a sparse network settles roughly the
+    square root of the airports a one-sided search would.
+    """
+
+    def __init__(self):
+        self.legs: dict[UUID, Leg] = {}
+        self.departures: dict[str, dict[UUID, Leg]] = {}
+        self.arrivals: dict[str, dict[UUID, Leg]] = {}
+        self.loaded = False
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.legs)
+
+    def _link(self, leg: Leg):
+        self.legs[leg.flight_id] = leg
+        self.departures.setdefault(leg.begin_airport, {})[leg.flight_id] = leg
+        self.arrivals.setdefault(leg.end_airport, {})[leg.flight_id] = leg
+
+    @staticmethod
+    def _unlink(index: dict[str, dict[UUID, Leg]], airport: str, flight_id: UUID):
+        legs = index[airport]
+        del legs[flight_id]
+        if not legs:
+            del index[airport]
+
+    def reset(self, legs: Iterable[Leg]):
+        self.legs = {}
+        self.departures = {}
+        self.arrivals = {}
+        for leg in legs:
+            self._link(leg)
+        self.loaded = True
+
+    def invalidate(self):
+        """Drops the indexes after another process changed the flights; the next query reloads them"""
+        self.version += 1
+        self.loaded = False
+
+    def put(self, leg: Leg):
+        self.remove(leg.flight_id)
+        self._link(leg)
+
+    def remove(self, flight_id: UUID):
+        self.version += 1
+        leg = self.legs.pop(flight_id, None)
+        if leg is not None:
+            self._unlink(self.departures, leg.begin_airport, flight_id)
+            self._unlink(self.arrivals, leg.end_airport, flight_id)
+
+    @staticmethod
+    def _usable(legs: dict[UUID, Leg], passengers: int | None) -> Iterable[Leg]:
+        if passengers is None:
+            return legs.values()
+        return (x for x in legs.values() if x.passengers >= passengers)
+
+    @staticmethod
+    def _join(meeting: str, forward: dict[str, Leg], backward: dict[str, Leg]) -> list[Leg]:
+        legs = []
+        airport = meeting
+        while airport in forward:
+            leg = forward[airport]
+            legs.append(leg)
+            airport = leg.begin_airport
+        legs.reverse()
+        airport = meeting
+        while airport in backward:
+            leg = backward[airport]
+            legs.append(leg)
+            airport = leg.end_airport
+        return legs
+
+    def shortest_distance(self, origin: str, destination: str, passengers: int | None = None) -> list[Leg] | None:
+        """Bidirectional Dijkstra over leg distances"""
+        sides = (
+            (self.departures, {origin: 0}, {}, [(0, origin)], lambda x: x.end_airport),
+            (self.arrivals, {destination: 0}, {}, [(0, destination)], lambda x: x.begin_airport),
+        )
+        best = None
+        meeting = None
+        while sides[0][3] and sides[1][3]:
+            if best is not None and sides[0][3][0][0] + sides[1][3][0][0] >= best:
+                break
+            side = 0 if len(sides[0][3]) <= len(sides[1][3]) else 1
+            index, distances, previous, queue, far_end = sides[side]
+            other_distances = sides[1 - side][1]
+            distance, airport = heappop(queue)
+            if distance > distances[airport]:
+                continue
+            for leg in self._usable(index.get(airport, {}), passengers):
+                neighbour = far_end(leg)
+                candidate = distance + leg.distance
+                if candidate >= distances.get(neighbour, candidate + 1):
+                    continue
+                distances[neighbour] = candidate
+                previous[neighbour] = leg
+                heappush(queue, (candidate, neighbour))
+                if neighbour in other_distances and (best is None or candidate + other_distances[neighbour] < best):
+                    best = candidate + other_distances[neighbour]
+                    meeting = neighbour
+        if meeting is None:
+            return None
+        return self._join(meeting, sides[0][2], sides[1][2])
+
+    def fewest_legs(self, origin: str, destination: str, passengers: int | None = None) -> list[Leg] | None:
+        """Bidirectional breadth-first search, expanding the smaller frontier a whole level at a time"""
+        sides = (
+            (self.departures, {origin: 0}, {}, [origin], lambda x: x.end_airport),
+            (self.arrivals, {destination: 0}, {}, [destination], lambda x: x.begin_airport),
+        )
+        while sides[0][3] and sides[1][3]:
+            side = 0 if len(sides[0][3]) <= len(sides[1][3]) else 1
+            index, depths, previous, frontier, far_end = sides[side]
+            other_depths = sides[1 - side][1]
+            best = None
+            meeting = None
+            next_frontier = []
+            for airport in frontier:
+                depth = depths[airport] + 1
+                for leg in self._usable(index.get(airport, {}), passengers):
+                    neighbour = far_end(leg)
+                    if neighbour in depths:
+                        continue
+                    depths[neighbour] = depth
+                    previous[neighbour] = leg
+                    next_frontier.append(neighbour)
+                    if neighbour in other_depths and (best is None or depth + other_depths[neighbour] < best):
+                        best = depth + other_depths[neighbour]
+                        meeting = neighbour
+            if meeting is not None:
+                return self._join(meeting, sides[0][2], sides[1][2])
+            sides[side][3][:] = next_frontier
+        return None
+
+
+route_network = RouteNetwork()
+load_lock = asyncio.Lock()
+
+
+def leg_of(flight: FlightSchema) -> Leg:
+    return Leg(flight.id, flight.begin_airport, flight.end_airport, flight.distance, flight.passengers)
+
+
+async def load_route_network() -> RouteNetwork:
+    """Builds the shared network from the flights table on first use"""
+    async with load_lock:
+        while not route_network.loaded:
+            version = route_network.version
+            async with new_session() as session:
+                query = select(FlightSchema.id, FlightSchema.begin_airport, FlightSchema.end_airport,
+                               FlightSchema.distance, FlightSchema.passengers)
+                result = await session.execute(query)
+                rows = result.all()
+            if route_network.version == version:
+                route_network.reset(Leg(*x) for x in rows)
+    return route_network
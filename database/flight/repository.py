@@ -1,158 +1,587 @@
+from functools import partial
+from time import perf_counter
+from typing import AsyncIterator, Iterator
 from uuid import UUID, uuid4
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload
-from database.database import FlightSchema, new_session, PlaneSchema
-from server.api.flight.schemas import FlightDto, Flight
-from server.api.plane.schemas import Plane
+from sqlalchemy import (Float, Select, String, bindparam, cast, delete, exists, insert, or_, select, tuple_,
+                        type_coerce, update)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
+from database.cache import ASSIGNMENTS, FLIGHT, FLIGHT_IDS, FLIGHTS, PLANE, PLANES, ROUTES, cached
+from database.changes import Transaction, change, commit, fields, run_write
+from database.compatibility import can_serve
+from database.concurrency import MAX_ATTEMPTS, Versioned, backoff, check_version, touch, touch_flights
+from database.database import (FlightSchema, new_session, PlaneSchema, association_table, begin_immediate, columns,
+                               records)
+from database.flight.assignment import plane_reach, solve_assignment
+from database.plane.repository import PLANE_COLUMNS
+from database.flight.network import Leg, leg_of, load_route_network, route_network
+from database.search import search_query
+from server.api.flight.schemas import (Assignment, AssignmentReport, CandidateOrder, ConductResult, ConductStatus,
+                                      FlightDto, Flight, FlightInclude, FlightSearch, Itinerary, ItineraryOrder)
+
+
+QUERY_CHUNK_SIZE = 5000
+
+
+def chunked(items: list, size: int = QUERY_CHUNK_SIZE) -> Iterator[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+FLIGHT_COLUMNS = (FlightSchema.id, FlightSchema.begin_airport, FlightSchema.end_airport,
+                  FlightSchema.distance, FlightSchema.passengers)
+FLIGHT_FIELDS = tuple(x.key for x in FLIGHT_COLUMNS[1:])
+
+
+def flight_search_query(search: FlightSearch) -> Select:
+    return search_query(FlightSchema, FLIGHT_COLUMNS, search, (FlightSchema.begin_airport, FlightSchema.end_airport),
+                        (FlightSchema.distance, FlightSchema.passengers))
+
+
+async def load_flight_views(session: AsyncSession, rows: list[Row], include_planes: bool = False) -> list[dict]:
+    """Builds flight records in the shape of FlightSummary, or of Flight with include_planes.
+
+    Plane ids come from the association table with one narrow IN query per chunk of flights,
+    read as their stored hex and parsed once per distinct plane; with include_planes every
+    referenced plane is loaded once, however many flights it serves. Links to planes that no
+    longer exist are left out, as the suitable_planes relationship leaves them out.
+    """
+    links = {x.id.hex: [] for x in rows}
+    plane_ids: dict[str, UUID] = {}
+    for ids in chunked([x.id for x in rows]):
+        query = select(type_coerce(association_table.c.flight_id, String),
+                       type_coerce(association_table.c.plane_id, String)).join(
+            PlaneSchema, PlaneSchema.id == association_table.c.plane_id).where(
+            association_table.c.flight_id.in_(ids)).order_by(
+            association_table.c.flight_id, association_table.c.plane_id)
+        result = await session.execute(query)
+        for flight_id, plane_id in result:
+            plane_id = plane_ids.get(plane_id) or plane_ids.setdefault(plane_id, UUID(plane_id))
+            links[flight_id].append(plane_id)
+    flights = records([x.key for x in FLIGHT_COLUMNS], rows)
+    if not include_planes:
+        for flight in flights:
+            flight['suitable_plane_ids'] = links[flight['id'].hex]
+        return flights
+    planes = {}
+    for ids in chunked(list(plane_ids.values())):
+        result = await session.execute(select(*PLANE_COLUMNS).where(PlaneSchema.id.in_(ids)))
+        planes.update((x['id'], x) for x in records(result.keys(), result))
+    for flight in flights:
+        flight['suitable_planes'] = [planes[x] for x in links[flight['id'].hex] if x in planes]
+    return flights
+
+
+def flight_view_tags(flights: list[dict]) -> Iterator[str]:
+    """FLIGHT for every flight record and PLANE for every plane embedded in them"""
+    for flight in flights:
+        yield FLIGHT.format(flight_id=flight['id'])
+        for plane in flight.get('suitable_planes', ()):
+            yield PLANE.format(plane_id=plane['id'])
 
 
 class FlightRepository:
     @staticmethod
     async def add_flight(flight: FlightDto) -> UUID:
+        return await run_write(FlightRepository.insert_flight, flight)
+
+    @staticmethod
+    async def insert_flight(session: AsyncSession, transaction: Transaction, flight: FlightDto) -> UUID:
+        data = flight.model_dump()
+        if data['begin_airport'] == data['end_airport']:
+            raise ValueError("Airports must be different")
+        new_flight = FlightSchema(**data)
+        new_flight.id = uuid4()
+        session.add(new_flight)
+        try:
+            await session.flush()
+        except IntegrityError:
+            raise ValueError("Flight already exist")
+        transaction.record(FLIGHTS, FLIGHT_IDS, ROUTES, changes=[change(
+            'created', 'flight', new_flight.id, **fields(new_flight, FLIGHT_FIELDS), suitable_plane_ids=[])],
+                           after=partial(route_network.put, leg_of(new_flight)))
+        return new_flight.id
+
+    @staticmethod
+    async def add_flights(flights: dict[UUID, tuple[FlightDto, list[UUID]]]) -> dict[UUID, str]:
         async with (new_session() as session):
-            data = flight.model_dump()
-            if data['begin_airport'] == data['end_airport']:
-                raise ValueError("Airports must be different")
-            query = select(FlightSchema).filter_by(
-                begin_airport=data['begin_airport']).filter_by(
-                end_airport=data['end_airport'])
+            errors = {}
+            rows = {}
+            for flight_id, (flight, plane_ids) in flights.items():
+                data = flight.model_dump()
+                if data['begin_airport'] == data['end_airport']:
+                    errors[flight_id] = 'Airports must be different'
+                    continue
+                rows[flight_id] = data
+            airports = [(x['begin_airport'], x['end_airport']) for x in rows.values()]
+            query = select(FlightSchema.id, FlightSchema.begin_airport, FlightSchema.end_airport).where(or_(
+                FlightSchema.id.in_(rows.keys()),
+                tuple_(FlightSchema.begin_airport, FlightSchema.end_airport).in_(airports)))
             result = await session.execute(query)
-            existing_flight = result.scalar_one_or_none()
-            if existing_flight is not None:
-                raise ValueError("Flight already exist")
-            new_flight = FlightSchema(**data)
-            new_flight.id = uuid4()
-            session.add(new_flight)
-            await session.commit()
-            return new_flight.id
+            existing_ids = set()
+            existing_airports = set()
+            for existing_id, begin_airport, end_airport in result:
+                existing_ids.add(existing_id)
+                existing_airports.add((begin_airport, end_airport))
+            referenced_planes = {plane_id for flight_id in rows for plane_id in flights[flight_id][1]}
+            result = await session.execute(select(PlaneSchema.id).where(PlaneSchema.id.in_(referenced_planes)))
+            existing_planes = set(result.scalars().all())
+            new_flights = []
+            new_links = []
+            for flight_id, data in rows.items():
+                pair = (data['begin_airport'], data['end_airport'])
+                if flight_id in existing_ids or pair in existing_airports:
+                    errors[flight_id] = 'Flight already exist'
+                    continue
+                plane_ids = list(dict.fromkeys(flights[flight_id][1]))
+                if not existing_planes.issuperset(plane_ids):
+                    errors[flight_id] = 'Plane is not found'
+                    continue
+                existing_airports.add(pair)
+                new_flights.append({'id': flight_id, **data})
+                new_links += [{'flight_id': flight_id, 'plane_id': x} for x in plane_ids]
+            if new_flights:
+                await session.execute(insert(FlightSchema), new_flights)
+            if new_links:
+                await session.execute(insert(association_table), new_links)
+            await commit(session, FLIGHTS, FLIGHT_IDS, ASSIGNMENTS, ROUTES, changes=[change(
+                'created', 'flight', x['id'], **fields(x, FLIGHT_FIELDS),
+                suitable_plane_ids=list(dict.fromkeys(flights[x['id']][1]))) for x in new_flights])
+            for x in new_flights:
+                route_network.put(Leg(x['id'], x['begin_airport'], x['end_airport'], x['distance'], x['passengers']))
+            return errors
+
+    @staticmethod
+    async def edit_flight(flight_id: UUID, flight: FlightDto,
+                          expected_versions: set[int] | None = None) -> Versioned[Flight]:
+        return await run_write(FlightRepository.update_flight, flight_id, flight, expected_versions)
+
+    @staticmethod
+    async def update_flight(session: AsyncSession, transaction: Transaction, flight_id: UUID, flight: FlightDto,
+                            expected_versions: set[int] | None = None) -> Versioned[Flight]:
+        data = flight.model_dump()
+        query = select(FlightSchema).options(
+            selectinload(FlightSchema.suitable_planes)).filter_by(id=flight_id)
+        result = await session.execute(query)
+        flight_to_change = result.scalar_one()
+        check_version(flight_to_change.version, expected_versions)
+        for key, value in data.items():
+            setattr(flight_to_change, key, value)
+        try:
+            await session.flush()
+        except IntegrityError:
+            raise ValueError("Flight already exist")
+        transaction.record(FLIGHTS, FLIGHT.format(flight_id=flight_id), ROUTES, changes=[
+            change('updated', 'flight', flight_id, **fields(flight_to_change, FLIGHT_FIELDS))],
+                           after=partial(route_network.put, leg_of(flight_to_change)))
+        return Versioned(Flight.model_validate(flight_to_change), flight_to_change.version)
+
+    @staticmethod
+    async def delete_flight(flight_id: UUID) -> Flight:
+        return await run_write(FlightRepository.remove_flight, flight_id)
 
     @staticmethod
-    async def edit_flight(flight_id: UUID, flight: FlightDto) -> Flight:
+    async def remove_flight(session: AsyncSession, transaction: Transaction, flight_id: UUID) -> Flight:
+        query = select(FlightSchema).options(
+            selectinload(FlightSchema.suitable_planes)).filter_by(id=flight_id)
+        result = await session.execute(query)
+        flight_to_delete = result.scalar_one()
+        await session.delete(flight_to_delete)
+        await session.flush()
+        transaction.record(FLIGHTS, FLIGHT.format(flight_id=flight_id), FLIGHT_IDS, ASSIGNMENTS, ROUTES,
+                           changes=[change('deleted', 'flight', flight_id)],
+                           after=partial(route_network.remove, flight_id))
+        return Flight.model_validate(flight_to_delete)
+
+    @staticmethod
+    @cached(FLIGHT, value_tags=lambda x: [PLANE.format(plane_id=y.id) for y in x.value.suitable_planes])
+    async def get_flight(flight_id: UUID) -> Versioned[Flight]:
         async with (new_session() as session):
-            data = flight.model_dump()
             query = select(FlightSchema).options(
-                joinedload(FlightSchema.suitable_planes)).filter_by(id=flight_id)
+                selectinload(FlightSchema.suitable_planes)).filter_by(id=flight_id)
             result = await session.execute(query)
-            flight_to_change = result.unique().scalar_one()
-            for key, value in data.items():
-                setattr(flight_to_change, key, value)
-            await session.commit()
-            return Flight.from_orm(flight_to_change)
+            flight = result.scalar_one()
+            return Versioned(Flight.model_validate(flight), flight.version)
 
     @staticmethod
-    async def delete_flight(flight_id: UUID) -> Flight:
+    @cached(FLIGHT_IDS, value_tags=flight_view_tags, skip=lambda x: x['limit'] is None)
+    async def get_flights(limit: int | None = None, after: UUID | None = None,
+                          include_planes: bool = False) -> list[dict]:
+        """Flight records from load_flight_views; only pages are cached"""
         async with (new_session() as session):
-            query = select(FlightSchema).filter_by(id=flight_id)
+            query = select(*FLIGHT_COLUMNS).order_by(FlightSchema.id)
+            if after is not None:
+                query = query.where(FlightSchema.id > after)
+            if limit is not None:
+                query = query.limit(limit)
             result = await session.execute(query)
-            flight_to_delete = result.scalar_one()
-            await session.delete(flight_to_delete)
-            await session.commit()
-            return Flight.from_orm(flight_to_delete)
+            return await load_flight_views(session, result.all(), include_planes)
+
+    @staticmethod
+    async def search_flights(search: FlightSearch) -> list[dict]:
+        async with new_session() as session:
+            result = await session.execute(flight_search_query(search))
+            return await load_flight_views(session, result.all(), search.include == FlightInclude.planes)
 
     @staticmethod
-    async def get_flights() -> list[Flight]:
+    async def stream_flights(batch_size: int = 1000,
+                             include_planes: bool = False) -> AsyncIterator[list[dict]]:
         async with (new_session() as session):
-            query = select(FlightSchema).options(joinedload(FlightSchema.suitable_planes))
-            result = await session.execute(query)
-            flight_models = result.scalars().unique().all()
-            return [Flight.from_orm(x) for x in flight_models]
+            query = select(*FLIGHT_COLUMNS).order_by(FlightSchema.id).execution_options(yield_per=batch_size)
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                yield await load_flight_views(session, rows, include_planes)
 
     @staticmethod
-    async def add_plane(flight_id: UUID, plane_id: UUID) -> Flight:
+    async def stream_flight_columns(batch_size: int = 10_000) -> AsyncIterator[dict[str, list]]:
+        """Flights without their planes as column lists with the ids in their stored hex"""
         async with (new_session() as session):
-            flight_query = select(FlightSchema).options(
-                joinedload(FlightSchema.suitable_planes)).filter_by(id=flight_id)
-            result = await session.execute(flight_query)
-            flight_to_change = result.unique().scalar_one_or_none()
-            if flight_to_change is None:
-                raise Exception('Flight is not found')
-            plane_query = select(PlaneSchema).filter_by(id=plane_id)
-            result = await session.execute(plane_query)
-            plane_to_add = result.scalar_one_or_none()
-            if plane_to_add is None:
-                raise Exception('Plane is not found')
-            if plane_to_add in flight_to_change.suitable_planes:
-                raise ValueError('Flight already contains this plane')
-            if plane_to_add.max_capacity < flight_to_change.passengers:
-                raise ValueError('Plane capacity is smaller than needed')
-            if plane_to_add.max_distance < flight_to_change.distance:
-                raise ValueError('Plane distance is smaller than needed')
-            if plane_to_add.current_fuel < plane_to_add.fuel_consumption * flight_to_change.distance:
-                raise ValueError('Current fuel is smaller than needed')
-            flight_to_change.suitable_planes.append(plane_to_add)
-            await session.commit()
-            return Flight.from_orm(flight_to_change)
-
-    @staticmethod
-    async def delete_plane(flight_id: UUID, plane_id: UUID) -> Flight:
+            query = select(type_coerce(FlightSchema.id, String).label('id'), *FLIGHT_COLUMNS[1:]).order_by(
+                FlightSchema.id).execution_options(yield_per=batch_size)
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                yield columns(result.keys(), rows)
+
+    @staticmethod
+    async def stream_link_columns(batch_size: int = 10_000) -> AsyncIterator[dict[str, list]]:
+        """The flight-plane association table as column lists of stored hex ids, without links to missing planes"""
         async with (new_session() as session):
-            flight_query = select(FlightSchema).options(
-                joinedload(FlightSchema.suitable_planes)).filter_by(
-                id=flight_id)
-            result = await session.execute(flight_query)
-            flight_to_change = result.unique().scalar_one_or_none()
-            if flight_to_change is None:
-                raise Exception('Flight is not found')
-            plane_query = select(PlaneSchema).filter_by(id=plane_id)
-            result = await session.execute(plane_query)
-            plane_to_delete = result.scalar_one_or_none()
-            if plane_to_delete is None:
-                raise Exception('Plane is not found')
-            if plane_to_delete not in flight_to_change.suitable_planes:
-                raise ValueError('Flight does not contain this plane')
-            flight_to_change.suitable_planes.remove(plane_to_delete)
-            await session.commit()
-            return Flight.from_orm(flight_to_change)
+            query = select(type_coerce(association_table.c.flight_id, String).label('flight_id'),
+                           type_coerce(association_table.c.plane_id, String).label('plane_id')).join(
+                PlaneSchema, PlaneSchema.id == association_table.c.plane_id).order_by(
+                association_table.c.flight_id).execution_options(yield_per=batch_size)
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                yield columns(result.keys(), rows)
+
+    @staticmethod
+    async def find_itinerary(origin: str, destination: str, order_by: ItineraryOrder = ItineraryOrder.distance,
+                             passengers: int | None = None) -> Itinerary | None:
+        if origin == destination:
+            raise ValueError("Airports must be different")
+        network = await load_route_network()
+        if order_by == ItineraryOrder.legs:
+            legs = network.fewest_legs(origin, destination, passengers)
+        else:
+            legs = network.shortest_distance(origin, destination, passengers)
+        if legs is None:
+            return None
+        return Itinerary(
+            flights=[Flight(id=x.flight_id, begin_airport=x.begin_airport, end_airport=x.end_airport,
+                            distance=x.distance, passengers=x.passengers) for x in legs],
+            distance=sum(x.distance for x in legs))
+
+    @staticmethod
+    async def add_plane(flight_id: UUID, plane_id: UUID,
+                        expected_versions: set[int] | None = None) -> Versioned[Flight]:
+        return await run_write(FlightRepository.attach_plane, flight_id, plane_id, expected_versions)
+
+    @staticmethod
+    async def attach_plane(session: AsyncSession, transaction: Transaction, flight_id: UUID, plane_id: UUID,
+                           expected_versions: set[int] | None = None) -> Versioned[Flight]:
+        flight_query = select(FlightSchema).options(
+            selectinload(FlightSchema.suitable_planes)).filter_by(id=flight_id)
+        result = await session.execute(flight_query)
+        flight_to_change = result.scalar_one_or_none()
+        if flight_to_change is None:
+            raise Exception('Flight is not found')
+        check_version(flight_to_change.version, expected_versions)
+        plane_query = select(PlaneSchema).filter_by(id=plane_id)
+        result = await session.execute(plane_query)
+        plane_to_add = result.scalar_one_or_none()
+        if plane_to_add is None:
+            raise Exception('Plane is not found')
+        if plane_to_add in flight_to_change.suitable_planes:
+            raise ValueError('Flight already contains this plane')
+        if plane_to_add.max_capacity < flight_to_change.passengers:
+            raise ValueError('Plane capacity is smaller than needed')
+        if plane_to_add.max_distance < flight_to_change.distance:
+            raise ValueError('Plane distance is smaller than needed')
+        if plane_to_add.current_fuel < plane_to_add.fuel_consumption * flight_to_change.distance:
+            raise ValueError('Current fuel is smaller than needed')
+        flight_to_change.suitable_planes.append(plane_to_add)
+        touch(flight_to_change)
+        await session.flush()
+        transaction.record(FLIGHTS, FLIGHT.format(flight_id=flight_id), ASSIGNMENTS, changes=[
+            change('attached', 'flight', flight_id, plane_id=plane_id)])
+        return Versioned(Flight.model_validate(flight_to_change), flight_to_change.version)
+
+    @staticmethod
+    async def delete_plane(flight_id: UUID, plane_id: UUID,
+                           expected_versions: set[int] | None = None) -> Versioned[Flight]:
+        return await run_write(FlightRepository.detach_plane, flight_id, plane_id, expected_versions)
+
+    @staticmethod
+    async def detach_plane(session: AsyncSession, transaction: Transaction, flight_id: UUID, plane_id: UUID,
+                           expected_versions: set[int] | None = None) -> Versioned[Flight]:
+        flight_query = select(FlightSchema).options(
+            selectinload(FlightSchema.suitable_planes)).filter_by(
+            id=flight_id)
+        result = await session.execute(flight_query)
+        flight_to_change = result.scalar_one_or_none()
+        if flight_to_change is None:
+            raise Exception('Flight is not found')
+        check_version(flight_to_change.version, expected_versions)
+        plane_query = select(PlaneSchema).filter_by(id=plane_id)
+        result = await session.execute(plane_query)
+        plane_to_delete = result.scalar_one_or_none()
+        if plane_to_delete is None:
+            raise Exception('Plane is not found')
+        if plane_to_delete not in flight_to_change.suitable_planes:
+            raise ValueError('Flight does not contain this plane')
+        flight_to_change.suitable_planes.remove(plane_to_delete)
+        touch(flight_to_change)
+        await session.flush()
+        transaction.record(FLIGHTS, FLIGHT.format(flight_id=flight_id), ASSIGNMENTS, changes=[
+            change('detached', 'flight', flight_id, plane_id=plane_id)])
+        return Versioned(Flight.model_validate(flight_to_change), flight_to_change.version)
 
     @staticmethod
-    async def get_available_planes_by_capacity(flight_id: UUID) -> list[Plane]:
+    @cached(PLANES, FLIGHT)
+    async def get_available_planes_by_capacity(flight_id: UUID) -> list[dict]:
         async with (new_session() as session):
             flight_query = select(FlightSchema).filter_by(id=flight_id)
             result = await session.execute(flight_query)
             flight_to_change = result.scalar_one()
-            plane_query = select(PlaneSchema).where(
+            plane_query = select(*PLANE_COLUMNS).where(
                 PlaneSchema.max_capacity >= flight_to_change.passengers)
             result = await session.execute(plane_query)
-            available_planes = [Plane.from_orm(x) for x in result.scalars().all()]
+            available_planes = records(result.keys(), result)
             return available_planes
 
     @staticmethod
-    async def get_available_planes_by_distance(flight_id: UUID) -> list[Plane]:
+    @cached(PLANES, FLIGHT)
+    async def get_available_planes_by_distance(flight_id: UUID) -> list[dict]:
         async with (new_session() as session):
             flight_query = select(FlightSchema).filter_by(id=flight_id)
             result = await session.execute(flight_query)
             flight_to_change = result.scalar_one()
-            plane_query = select(PlaneSchema).where(
+            plane_query = select(*PLANE_COLUMNS).where(
                 PlaneSchema.max_distance >= flight_to_change.distance)
             result = await session.execute(plane_query)
-            available_planes = [Plane.from_orm(x) for x in result.scalars().all()]
+            available_planes = records(result.keys(), result)
             return available_planes
 
     @staticmethod
-    async def conduct_flight(flight_id: UUID) -> Flight:
+    @cached(PLANES, FLIGHT, ASSIGNMENTS)
+    async def get_candidate_planes(flight_id: UUID, order_by: CandidateOrder = CandidateOrder.fuel_margin,
+                                   limit: int | None = None, exclude_assigned: bool = False) -> list[dict]:
         async with (new_session() as session):
-            flight_query = select(FlightSchema).options(
-                joinedload(FlightSchema.suitable_planes)).filter_by(
-                id=flight_id)
+            flight_query = select(FlightSchema).filter_by(id=flight_id)
             result = await session.execute(flight_query)
-            flight_to_change = result.unique().scalar_one_or_none()
-            if flight_to_change is None:
+            flight = result.scalar_one()
+            fuel_margin = PlaneSchema.current_fuel - PlaneSchema.fuel_consumption * flight.distance
+            plane_query = select(*PLANE_COLUMNS).where(can_serve(flight.passengers, flight.distance))
+            if exclude_assigned:
+                plane_query = plane_query.where(~exists().where(association_table.c.plane_id == PlaneSchema.id))
+            if order_by == CandidateOrder.efficiency:
+                plane_query = plane_query.order_by(
+                    (cast(PlaneSchema.max_distance, Float) / PlaneSchema.fuel_consumption).desc(), PlaneSchema.id)
+            else:
+                plane_query = plane_query.order_by(fuel_margin.desc(), PlaneSchema.id)
+            if limit is not None:
+                plane_query = plane_query.limit(limit)
+            result = await session.execute(plane_query)
+            return records(result.keys(), result)
+
+    @staticmethod
+    async def assign_planes(flight_ids: list[UUID] | None = None) -> AssignmentReport:
+        async with (new_session() as session):
+            flight_query = select(FlightSchema.id, FlightSchema.passengers, FlightSchema.distance)
+            if flight_ids is None:
+                result = await session.execute(flight_query.where(
+                    ~exists().where(association_table.c.flight_id == FlightSchema.id)))
+                flights = [tuple(x) for x in result]
+            else:
+                flights = []
+                for ids in chunked(list(set(flight_ids))):
+                    result = await session.execute(flight_query.where(FlightSchema.id.in_(ids)))
+                    flights += [tuple(x) for x in result]
+            if flight_ids is not None and len(flights) != len(set(flight_ids)):
                 raise Exception('Flight is not found')
-            if not flight_to_change.suitable_planes:
-                raise ValueError('Flight does not contain any planes')
-            delete_flag = 0
-            for plane in flight_to_change.suitable_planes:
-                new_fuel = plane.current_fuel - plane.fuel_consumption * flight_to_change.distance
-                if new_fuel < 0:
-                    flight_to_change.suitable_planes.remove(plane)
-                    delete_flag = 1
-            if delete_flag == 1:
-                await session.commit()
-                raise OSError('Flight contained unsuitable planes. Now they are deleted. '
-                              'You can try conducting this flight again :)')
-            for plane in flight_to_change.suitable_planes:
-                plane.current_fuel = plane.current_fuel - plane.fuel_consumption * flight_to_change.distance
-                if plane.current_fuel < plane.fuel_consumption * flight_to_change.distance:
-                    flight_to_change.suitable_planes.remove(plane)
-            await session.commit()
-            return Flight.from_orm(flight_to_change)
+            plane_query = select(
+                PlaneSchema.id, PlaneSchema.max_capacity, PlaneSchema.max_distance,
+                PlaneSchema.current_fuel, PlaneSchema.fuel_consumption).where(
+                ~exists().where(association_table.c.plane_id == PlaneSchema.id))
+            result = await session.execute(plane_query)
+            planes = [(x.id, x.max_capacity, plane_reach(x.max_distance, x.current_fuel, x.fuel_consumption))
+                      for x in result]
+            start = perf_counter()
+            assignment = solve_assignment(flights, planes)
+            solver_time = perf_counter() - start
+            if assignment:
+                await session.execute(insert(association_table), [
+                    {'flight_id': flight_id, 'plane_id': plane_id} for flight_id, plane_id in assignment.items()])
+                await touch_flights(session, list(assignment))
+            await commit(session, FLIGHTS, ASSIGNMENTS, *(FLIGHT.format(flight_id=x) for x in assignment), changes=[
+                change('attached', 'flight', flight_id, plane_id=plane_id)
+                for flight_id, plane_id in assignment.items()])
+            return AssignmentReport(
+                assignments=[Assignment(flight_id=k, plane_id=v) for k, v in assignment.items()],
+                unassigned_flights=[x[0] for x in flights if x[0] not in assignment],
+                solver_time=solver_time)
+
+    @staticmethod
+    async def conduct_flight(flight_id: UUID) -> Flight:
+        for attempt in range(MAX_ATTEMPTS):
+            if attempt:
+                await backoff(attempt)
+            async with (new_session() as session):
+                await begin_immediate(session)
+                conducted_flight = await FlightRepository._conduct_flight(session, flight_id)
+                if conducted_flight is not None:
+                    return conducted_flight
+        raise StaleDataError('Flight was modified concurrently, try again')
+
+    @staticmethod
+    async def _conduct_flight(session: AsyncSession, flight_id: UUID) -> Flight | None:
+        """One attempt of conduct_flight; None when a concurrent write got in between"""
+        flight_query = select(FlightSchema).options(
+            selectinload(FlightSchema.suitable_planes)).filter_by(
+            id=flight_id)
+        result = await session.execute(flight_query)
+        flight_to_change = result.scalar_one_or_none()
+        if flight_to_change is None:
+            raise Exception('Flight is not found')
+        if not flight_to_change.suitable_planes:
+            raise ValueError('Flight does not contain any planes')
+        distance = flight_to_change.distance
+        unsuitable = [x for x in flight_to_change.suitable_planes if x.current_fuel < x.fuel_consumption * distance]
+        if unsuitable:
+            for plane in unsuitable:
+                flight_to_change.suitable_planes.remove(plane)
+            touch(flight_to_change)
+            try:
+                await commit(session, FLIGHTS, FLIGHT.format(flight_id=flight_id), ASSIGNMENTS, changes=[
+                    change('detached', 'flight', flight_id, plane_id=x.id) for x in unsuitable])
+            except StaleDataError:
+                return None
+            raise OSError('Flight contained unsuitable planes. Now they are deleted. '
+                          'You can try conducting this flight again :)')
+        fuelled_planes = list(flight_to_change.suitable_planes)
+        # One compare-and-set for all the planes: the fuel is taken only where it is still there, so parallel
+        # flights never lose an update, and edits of the other fields in between do not force a retry
+        planes_table = PlaneSchema.__table__
+        burn = planes_table.c.fuel_consumption * distance
+        result = await session.execute(update(planes_table).where(
+            planes_table.c.id.in_([x.id for x in fuelled_planes]), planes_table.c.current_fuel >= burn).values(
+            current_fuel=planes_table.c.current_fuel - burn, version=planes_table.c.version + 1).returning(
+            planes_table.c.id, planes_table.c.current_fuel, planes_table.c.fuel_consumption, planes_table.c.version))
+        updated = {x.id: x for x in result}
+        if len(updated) != len(fuelled_planes):
+            await session.rollback()
+            return None
+        for plane in fuelled_planes:
+            for key in ('current_fuel', 'fuel_consumption', 'version'):
+                set_committed_value(plane, key, getattr(updated[plane.id], key))
+        drained = [x for x in fuelled_planes if x.current_fuel < x.fuel_consumption * distance]
+        for plane in drained:
+            flight_to_change.suitable_planes.remove(plane)
+        if drained:
+            touch(flight_to_change)
+        try:
+            await session.flush()
+        except StaleDataError:
+            await session.rollback()
+            return None
+        await commit(session, PLANES, *(PLANE.format(plane_id=x.id) for x in fuelled_planes), FLIGHTS,
+                     FLIGHT.format(flight_id=flight_id), ASSIGNMENTS, changes=[
+            *(change('updated', 'plane', x.id, current_fuel=x.current_fuel) for x in fuelled_planes),
+            *(change('detached', 'flight', flight_id, plane_id=x.id) for x in drained)])
+        return Flight.model_validate(flight_to_change)
+
+    @staticmethod
+    async def conduct_flights(flight_ids: list[UUID]) -> list[ConductResult]:
+        for attempt in range(MAX_ATTEMPTS):
+            if attempt:
+                await backoff(attempt)
+            async with (new_session() as session):
+                await begin_immediate(session)
+                results = await FlightRepository._conduct_flights(session, flight_ids)
+                if results is not None:
+                    return results
+        raise StaleDataError('Planes were modified concurrently, try again')
+
+    @staticmethod
+    async def _conduct_flights(session: AsyncSession, flight_ids: list[UUID]) -> list[ConductResult] | None:
+        """One attempt of conduct_flights; None when a concurrent write changed one of the planes"""
+        unique_ids = list(dict.fromkeys(flight_ids))
+        distances = {}
+        links: dict[UUID, list[UUID]] = {}
+        for ids in chunked(unique_ids):
+            result = await session.execute(
+                select(FlightSchema.id, FlightSchema.distance).where(FlightSchema.id.in_(ids)))
+            distances.update(result.all())
+            result = await session.execute(
+                select(association_table.c.flight_id, association_table.c.plane_id).where(
+                    association_table.c.flight_id.in_(ids)))
+            for flight_id, plane_id in result:
+                links.setdefault(flight_id, []).append(plane_id)
+        fuel = {}
+        consumption = {}
+        for ids in chunked(list({x for planes in links.values() for x in planes})):
+            result = await session.execute(
+                select(PlaneSchema.id, PlaneSchema.current_fuel, PlaneSchema.fuel_consumption).where(
+                    PlaneSchema.id.in_(ids)))
+            for plane_id, current_fuel, fuel_consumption in result:
+                fuel[plane_id] = current_fuel
+                consumption[plane_id] = fuel_consumption
+        read_fuel = dict(fuel)
+        # Links to planes that no longer exist are skipped, as the suitable_planes relationship skips them
+        links = {flight_id: [x for x in planes if x in fuel] for flight_id, planes in links.items()}
+        # Flights are replayed in the requested order, so a shared plane loses fuel flight by flight
+        results = []
+        changed_planes = set()
+        removed_links = set()
+        for flight_id in flight_ids:
+            if flight_id not in distances:
+                results.append(ConductResult(
+                    flight_id=flight_id, status=ConductStatus.not_found, detail='Flight is not found'))
+                continue
+            distance = distances[flight_id]
+            planes = links.get(flight_id, [])
+            if not planes:
+                results.append(ConductResult(
+                    flight_id=flight_id, status=ConductStatus.no_planes,
+                    detail='Flight does not contain any planes'))
+                continue
+            unsuitable = [x for x in planes if fuel[x] < consumption[x] * distance]
+            if not unsuitable:
+                for plane_id in planes:
+                    fuel[plane_id] -= consumption[plane_id] * distance
+                changed_planes.update(planes)
+                unsuitable = [x for x in planes if fuel[x] < consumption[x] * distance]
+                status = ConductStatus.conducted
+                detail = None
+            else:
+                status = ConductStatus.unsuitable_planes_removed
+                detail = 'Flight contained unsuitable planes. Now they are deleted.'
+            links[flight_id] = [x for x in planes if x not in unsuitable]
+            removed_links.update((flight_id, x) for x in unsuitable)
+            results.append(ConductResult(flight_id=flight_id, status=status, detail=detail))
+        if changed_planes:
+            # Compare-and-set on the fuel and consumption read above, the only fields the replay depends on:
+            # a concurrent burn or refuel invalidates it, a concurrent edit of the other fields does not
+            planes_table = PlaneSchema.__table__
+            result = await session.execute(update(planes_table).where(
+                planes_table.c.id == bindparam('plane_id'), planes_table.c.current_fuel == bindparam('read_fuel'),
+                planes_table.c.fuel_consumption == bindparam('read_consumption')).values(
+                current_fuel=bindparam('new_fuel'), version=planes_table.c.version + 1), [
+                {'plane_id': x, 'read_fuel': read_fuel[x], 'read_consumption': consumption[x], 'new_fuel': fuel[x]}
+                for x in changed_planes])
+            if result.rowcount != len(changed_planes):
+                await session.rollback()
+                return None
+        for pairs in chunked(list(removed_links)):
+            await session.execute(delete(association_table).where(
+                tuple_(association_table.c.flight_id, association_table.c.plane_id).in_(pairs)))
+        await touch_flights(session, list({flight_id for flight_id, _ in removed_links}))
+        await commit(session, PLANES, *(PLANE.format(plane_id=x) for x in changed_planes), FLIGHTS,
+                     *(FLIGHT.format(flight_id=x) for x, _ in removed_links), ASSIGNMENTS, changes=[
+            *(change('updated', 'plane', x, current_fuel=fuel[x]) for x in changed_planes),
+            *(change('detached', 'flight', flight_id, plane_id=plane_id) for flight_id, plane_id in removed_links)])
+        return results
@@ -0,0 +1,219 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from uuid import UUID
+import numpy as np
+from sqlalchemy import select
+from database.config import SIMULATION_PROCESSES
+from database.database import FlightSchema, PlaneSchema, association_table, new_session
+from database.flight.repository import chunked
+from server.api.flight.schemas import RefuelEvent, SimulationStatus
+
+CONDUCT, REFUEL = 0, 1
+FULL_TANK = -1
+STATUSES = list(SimulationStatus)
+CONDUCTED, UNSUITABLE_PLANES_REMOVED, NO_PLANES, NOT_FOUND, REFUELLED = (
+    STATUSES.index(x) for x in (SimulationStatus.conducted, SimulationStatus.unsuitable_planes_removed,
+                                SimulationStatus.no_planes, SimulationStatus.not_found, SimulationStatus.refuelled))
+
+_pool: ProcessPoolExecutor | None = None
+
+
+class SimulationSnapshot:
+    """Planes, flights and their links as NumPy arrays indexed by position instead of id.
+
+    The links of flight i are link_plane[link_start[i]:link_start[i + 1]], and link_burn holds the
+    fuel each of those planes spends on the flight. A tank holds fuel_consumption * max_distance.
+    """
+
+    def __init__(self, plane_ids: list[UUID], current_fuel: np.ndarray, fuel_consumption: np.ndarray,
+                 max_distance: np.ndarray, flight_ids: list[UUID], distance: np.ndarray,
+                 link_start: np.ndarray, link_plane: np.ndarray):
+        self.plane_ids = plane_ids
+        self.flight_ids = flight_ids
+        self.plane_index = {x: i for i, x in enumerate(plane_ids)}
+        self.flight_index = {x: i for i, x in enumerate(flight_ids)}
+        self.current_fuel = current_fuel
+        self.max_fuel = fuel_consumption * max_distance
+        self.link_start = link_start
+        self.link_plane = link_plane
+        self.link_burn = fuel_consumption[link_plane] * np.repeat(distance, np.diff(link_start))
+
+    def compile(self, schedule: list[UUID | RefuelEvent]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The schedule as (kind, target, amount) arrays; an unknown flight or plane has the target -1"""
+        kinds = []
+        targets = []
+        amounts = []
+        for event in schedule:
+            if isinstance(event, RefuelEvent):
+                kinds.append(REFUEL)
+                targets.append(self.plane_index.get(event.plane_id, -1))
+                amounts.append(FULL_TANK if event.fuel is None else event.fuel)
+            else:
+                kinds.append(CONDUCT)
+                targets.append(self.flight_index.get(event, -1))
+                amounts.append(FULL_TANK)
+        return np.array(kinds, dtype=np.int8), np.array(targets, dtype=np.int64), np.array(amounts, dtype=np.int64)
+
+    def arrays(self) -> tuple[np.ndarray, ...]:
+        return self.current_fuel, self.max_fuel, self.link_start, self.link_plane, self.link_burn
+
+
+def replay(current_fuel: np.ndarray, max_fuel: np.ndarray, link_start: np.ndarray, link_plane: np.ndarray,
+           link_burn: np.ndarray, kinds: np.ndarray, targets: np.ndarray, amounts: np.ndarray,
+           trajectories: bool) -> tuple[bytes, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Runs a compiled schedule with the rules of FlightRepository.conduct_flight.
+
+    A flight without planes is not conducted. If any of its planes cannot cover the distance,
+    those planes are removed from it and nothing else happens. Otherwise every plane spends
+    its fuel and the planes left unable to fly the same distance again are removed. Refuelling
+    sets the fuel level, at most a full tank.
+
+    Returns the status of each step, the final fuel of every plane, the trajectory points as
+    (step, plane, fuel) arrays and the positions of the removed links, in removal order.
+    Plain lists are faster than NumPy for this per-element loop, so the arrays are converted
+    once on entry.
+    """
+    fuel = current_fuel.tolist()
+    max_fuel = max_fuel.tolist()
+    link_start = link_start.tolist()
+    link_plane = link_plane.tolist()
+    link_burn = link_burn.tolist()
+    active = [True] * len(link_plane)
+    statuses = bytearray(len(kinds))
+    point_steps: list[int] = []
+    point_planes: list[int] = []
+    point_fuel: list[int] = []
+    removed: list[int] = []
+    for step, (kind, target, amount) in enumerate(zip(kinds.tolist(), targets.tolist(), amounts.tolist())):
+        if target < 0:
+            statuses[step] = NOT_FOUND
+            continue
+        if kind == REFUEL:
+            fuel[target] = max_fuel[target] if amount == FULL_TANK else min(amount, max_fuel[target])
+            statuses[step] = REFUELLED
+            if trajectories:
+                point_steps.append(step)
+                point_planes.append(target)
+                point_fuel.append(fuel[target])
+            continue
+        links = [x for x in range(link_start[target], link_start[target + 1]) if active[x]]
+        if not links:
+            statuses[step] = NO_PLANES
+            continue
+        unsuitable = [x for x in links if fuel[link_plane[x]] < link_burn[x]]
+        if unsuitable:
+            for x in unsuitable:
+                active[x] = False
+            removed += unsuitable
+            statuses[step] = UNSUITABLE_PLANES_REMOVED
+            continue
+        for x in links:
+            plane = link_plane[x]
+            burn = link_burn[x]
+            left = fuel[plane] = fuel[plane] - burn
+            if left < burn:
+                active[x] = False
+                removed.append(x)
+            if trajectories:
+                point_steps.append(step)
+                point_planes.append(plane)
+                point_fuel.append(left)
+    return (bytes(statuses), np.array(fuel, dtype=np.int64), np.array(point_steps, dtype=np.int64),
+            np.array(point_planes, dtype=np.int64), np.array(point_fuel, dtype=np.int64),
+            np.array(removed, dtype=np.int64))
+
+
+def simulation_pool() -> ProcessPoolExecutor:
+    """Worker processes for replay, started on first use; spawned rather than forked from the event loop"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=SIMULATION_PROCESSES, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def shutdown_simulation_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def scenario_result(snapshot: SimulationSnapshot, name: str | None, replayed: tuple, trajectories: bool,
+                    elapsed: float) -> dict:
+    statuses, fuel, point_steps, point_planes, point_fuel, removed = replayed
+    flight_of_link = np.repeat(np.arange(len(snapshot.flight_ids)), np.diff(snapshot.link_start))
+    result = {
+        'name': name,
+        'statuses': [STATUSES[x] for x in statuses],
+        'final_fuel': {str(snapshot.plane_ids[i]): x for i, x in enumerate(fuel.tolist())},
+        'removed': [{'flight_id': snapshot.flight_ids[f], 'plane_id': snapshot.plane_ids[p]} for f, p in zip(
+            flight_of_link[removed].tolist(), snapshot.link_plane[removed].tolist())],
+    }
+    if trajectories:
+        order = np.argsort(point_planes, kind='stable')
+        planes, starts = np.unique(point_planes[order], return_index=True)
+        steps = np.split(point_steps[order], starts[1:])
+        levels = np.split(point_fuel[order], starts[1:])
+        result['trajectories'] = {str(snapshot.plane_ids[p]): {'steps': s.tolist(), 'fuel': f.tolist()}
+                                  for p, s, f in zip(planes.tolist(), steps, levels)}
+    result['elapsed'] = elapsed
+    return result
+
+
+def timed_replay(*arguments) -> tuple[tuple, float]:
+    start = perf_counter()
+    replayed = replay(*arguments)
+    return replayed, perf_counter() - start
+
+
+async def simulate(snapshot: SimulationSnapshot, scenarios: list[tuple[str | None, list[UUID | RefuelEvent]]],
+                   trajectories: bool = True) -> list[dict]:
+    """Replays every scenario from the same snapshot, in parallel across the simulation pool"""
+    loop = asyncio.get_running_loop()
+    pool = simulation_pool()
+    compiled = [snapshot.compile(schedule) for _, schedule in scenarios]
+    replayed = await asyncio.gather(*(
+        loop.run_in_executor(pool, timed_replay, *snapshot.arrays(), *x, trajectories) for x in compiled))
+    return [scenario_result(snapshot, name, result, trajectories, elapsed)
+            for (name, _), (result, elapsed) in zip(scenarios, replayed)]
+
+
+async def load_simulation_snapshot(flight_ids: list[UUID], plane_ids: list[UUID]) -> SimulationSnapshot:
+    """The given flights with their planes, plus the given planes; ids that do not exist are left out"""
+    flight_ids = list(dict.fromkeys(flight_ids))
+    async with new_session() as session:
+        flights = []
+        links = []
+        for chunk in chunked(flight_ids):
+            result = await session.execute(select(FlightSchema.id, FlightSchema.distance).where(
+                FlightSchema.id.in_(chunk)))
+            flights += result.all()
+            result = await session.execute(select(association_table.c.flight_id, association_table.c.plane_id).where(
+                association_table.c.flight_id.in_(chunk)))
+            links += result.all()
+        wanted = list(dict.fromkeys([*plane_ids, *(x for _, x in links)]))
+        planes = []
+        for chunk in chunked(wanted):
+            result = await session.execute(select(
+                PlaneSchema.id, PlaneSchema.current_fuel, PlaneSchema.fuel_consumption,
+                PlaneSchema.max_distance).where(PlaneSchema.id.in_(chunk)))
+            planes += result.all()
+    plane_index = {x[0]: i for i, x in enumerate(planes)}
+    flight_index = {x[0]: i for i, x in enumerate(flights)}
+    # Links to planes that no longer exist are skipped, as conduct_flight skips them
+    links = [x for x in links if x[1] in plane_index]
+    links.sort(key=lambda x: flight_index[x[0]])
+    counts = np.bincount(np.array([flight_index[x] for x, _ in links], dtype=np.int64), minlength=len(flights))
+    link_start = np.zeros(len(flights) + 1, dtype=np.int64)
+    np.cumsum(counts, out=link_start[1:])
+    return SimulationSnapshot(
+        [x[0] for x in planes],
+        np.array([x[1] for x in planes], dtype=np.int64),
+        np.array([x[2] for x in planes], dtype=np.int64),
+        np.array([x[3] for x in planes], dtype=np.int64),
+        [x[0] for x in flights],
+        np.array([x[1] for x in flights], dtype=np.int64),
+        link_start,
+        np.array([plane_index[x] for _, x in links], dtype=np.int64))
@@ -0,0 +1,104 @@
+import re
+import numpy as np
+from sqlalchemy import select
+from database.cache import PLANES, cached
+from database.database import PlaneSchema, new_session
+from server.api.plane.schemas import AnalyticsColumn, FamilyStats, Histogram, Percentiles, Plane, RankedPlane
+
+FAMILY_SEPARATOR = re.compile(r'[-\s/]')
+
+
+def model_family(model: str) -> str:
+    return FAMILY_SEPARATOR.split(model, maxsplit=1)[0]
+
+
+class FleetSnapshot:
+    """Plane columns as NumPy arrays, so fleet-wide questions are answered without touching SQLite"""
+
+    def __init__(self, ids: list, models: list[str], max_capacity: np.ndarray, max_distance: np.ndarray,
+                 current_fuel: np.ndarray, fuel_consumption: np.ndarray):
+        self.ids = ids
+        self.models = models
+        self.columns = {
+            AnalyticsColumn.max_capacity: max_capacity,
+            AnalyticsColumn.max_distance: max_distance,
+            AnalyticsColumn.current_fuel: current_fuel,
+            AnalyticsColumn.fuel_consumption: fuel_consumption,
+            AnalyticsColumn.fuel_range: current_fuel / fuel_consumption,
+            AnalyticsColumn.efficiency: max_distance / fuel_consumption,
+        }
+        family_numbers: dict[str, int] = {}
+        self.family_index = np.array(
+            [family_numbers.setdefault(model_family(x), len(family_numbers)) for x in models], dtype=np.int64)
+        self.families = list(family_numbers)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def plane(self, index: int) -> Plane:
+        return Plane(
+            id=self.ids[index],
+            model=self.models[index],
+            max_capacity=int(self.columns[AnalyticsColumn.max_capacity][index]),
+            max_distance=int(self.columns[AnalyticsColumn.max_distance][index]),
+            current_fuel=int(self.columns[AnalyticsColumn.current_fuel][index]),
+            fuel_consumption=int(self.columns[AnalyticsColumn.fuel_consumption][index]))
+
+    def percentiles(self, column: AnalyticsColumn, quantiles: list[float]) -> Percentiles:
+        values = np.percentile(self.columns[column], quantiles)
+        return Percentiles(column=column, percentiles=dict(zip(quantiles, values.tolist())))
+
+    def histogram(self, column: AnalyticsColumn, bins: int) -> Histogram:
+        counts, edges = np.histogram(self.columns[column], bins=bins)
+        return Histogram(column=column, edges=edges.tolist(), counts=counts.tolist())
+
+    def families_stats(self) -> list[FamilyStats]:
+        counts = np.bincount(self.family_index, minlength=len(self.families))
+
+        def average(column: AnalyticsColumn) -> np.ndarray:
+            return np.bincount(self.family_index, weights=self.columns[column], minlength=len(self.families)) / counts
+
+        def maximum(column: AnalyticsColumn) -> np.ndarray:
+            result = np.zeros(len(self.families), dtype=np.int64)
+            np.maximum.at(result, self.family_index, self.columns[column])
+            return result
+
+        average_capacity = average(AnalyticsColumn.max_capacity)
+        average_distance = average(AnalyticsColumn.max_distance)
+        average_fuel_range = average(AnalyticsColumn.fuel_range)
+        max_capacity = maximum(AnalyticsColumn.max_capacity)
+        max_distance = maximum(AnalyticsColumn.max_distance)
+        return [FamilyStats(
+            family=family,
+            count=int(counts[i]),
+            average_capacity=float(average_capacity[i]),
+            max_capacity=int(max_capacity[i]),
+            average_distance=float(average_distance[i]),
+            max_distance=int(max_distance[i]),
+            average_fuel_range=float(average_fuel_range[i])) for i, family in sorted(
+            enumerate(self.families), key=lambda x: x[1])]
+
+    def top(self, column: AnalyticsColumn, k: int) -> list[RankedPlane]:
+        values = self.columns[column]
+        k = min(k, len(values))
+        best = np.argpartition(-values, k - 1)[:k]
+        best = best[np.argsort(-values[best], kind='stable')]
+        return [RankedPlane(plane=self.plane(i), score=float(values[i])) for i in best]
+
+
+@cached(PLANES, pinned=True)
+async def load_fleet_snapshot() -> FleetSnapshot:
+    async with new_session() as session:
+        query = select(
+            PlaneSchema.id, PlaneSchema.model, PlaneSchema.max_capacity, PlaneSchema.max_distance,
+            PlaneSchema.current_fuel, PlaneSchema.fuel_consumption)
+        result = await session.execute(query)
+        rows = result.all()
+    ids, models, max_capacity, max_distance, current_fuel, fuel_consumption = (
+        list(x) for x in zip(*rows)) if rows else ([], [], [], [], [], [])
+    return FleetSnapshot(
+        ids, models,
+        np.array(max_capacity, dtype=np.int64),
+        np.array(max_distance, dtype=np.int64),
+        np.array(current_fuel, dtype=np.int64),
+        np.array(fuel_consumption, dtype=np.int64))
@@ -1,97 +1,201 @@
+from typing import AsyncIterator
 from uuid import UUID, uuid4
-from sqlalchemy import select
-from database.database import PlaneSchema, new_session
-from server.api.plane.schemas import PlaneDto, Plane
+from sqlalchemy import Select, String, func, insert, or_, select, type_coerce
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from database.cache import ASSIGNMENTS, FLIGHT, FLIGHTS, PLANE, PLANE_IDS, PLANE_SHAPES, PLANES, cached
+from database.changes import Transaction, change, commit, fields, run_write
+from database.concurrency import Versioned, check_version, touch
+from database.database import FlightSchema, PlaneSchema, association_table, columns, new_session, records
+from database.search import search_query
+from server.api.plane.schemas import PlaneDto, Plane, PlaneSearch, PlaneStats
+
+
+PLANE_COLUMNS = (PlaneSchema.id, PlaneSchema.model, PlaneSchema.max_capacity, PlaneSchema.max_distance,
+                 PlaneSchema.current_fuel, PlaneSchema.fuel_consumption)
+PLANE_FIELDS = tuple(x.key for x in PLANE_COLUMNS[1:])
+
+
+def plane_search_query(search: PlaneSearch) -> Select:
+    return search_query(PlaneSchema, PLANE_COLUMNS, search, (PlaneSchema.model,), (
+        PlaneSchema.max_capacity, PlaneSchema.max_distance, PlaneSchema.current_fuel, PlaneSchema.fuel_consumption))
+
+
+def plane_tags(planes: list[dict]) -> list[str]:
+    return [PLANE.format(plane_id=x['id']) for x in planes]
+
+
+def check_fuel(data: dict):
+    if data['current_fuel'] > data['fuel_consumption'] * data['max_distance']:
+        raise ValueError('Current fuel must be less than or equal to (max distance * fuel consumption)')
 
 
 class PlaneRepository:
     @staticmethod
     async def add_plane(plane: PlaneDto) -> UUID:
+        return await run_write(PlaneRepository.insert_plane, plane)
+
+    @staticmethod
+    async def insert_plane(session: AsyncSession, transaction: Transaction, plane: PlaneDto) -> UUID:
+        data = plane.model_dump()
+        check_fuel(data)
+        new_plane = PlaneSchema(**data)
+        new_plane.id = uuid4()
+        session.add(new_plane)
+        try:
+            await session.flush()
+        except IntegrityError:
+            raise ValueError('Plane already exists')
+        transaction.record(PLANES, PLANE_IDS, PLANE_SHAPES, changes=[
+            change('created', 'plane', new_plane.id, **fields(new_plane, PLANE_FIELDS))])
+        return new_plane.id
+
+    @staticmethod
+    async def add_planes(planes: dict[UUID, PlaneDto]) -> dict[UUID, str]:
         async with new_session() as session:
-            data = plane.model_dump()
-            if data['current_fuel'] > data['fuel_consumption'] * data['max_distance']:
-                raise ValueError('Current fuel must be less than or equal to (max distance * fuel consumption)')
-            query = select(PlaneSchema).filter_by(model=data['model'])
+            errors = {}
+            rows = {}
+            for plane_id, plane in planes.items():
+                data = plane.model_dump()
+                try:
+                    check_fuel(data)
+                except ValueError as e:
+                    errors[plane_id] = e.args[0]
+                    continue
+                rows[plane_id] = data
+            query = select(PlaneSchema.id, PlaneSchema.model).where(or_(
+                PlaneSchema.id.in_(rows.keys()),
+                PlaneSchema.model.in_([x['model'] for x in rows.values()])))
             result = await session.execute(query)
-            existing_plane = result.scalar_one_or_none()
-            if existing_plane is not None:
-                raise ValueError('Plane already exists')
-            new_plane = PlaneSchema(**data)
-            new_plane.id = uuid4()
-            session.add(new_plane)
-            await session.commit()
-            return new_plane.id
+            existing_ids = set()
+            existing_models = set()
+            for existing_id, existing_model in result:
+                existing_ids.add(existing_id)
+                existing_models.add(existing_model)
+            new_planes = []
+            for plane_id, data in rows.items():
+                if plane_id in existing_ids or data['model'] in existing_models:
+                    errors[plane_id] = 'Plane already exists'
+                    continue
+                existing_models.add(data['model'])
+                new_planes.append({'id': plane_id, **data})
+            if new_planes:
+                await session.execute(insert(PlaneSchema), new_planes)
+            await commit(session, PLANES, PLANE_IDS, PLANE_SHAPES, changes=[
+                change('created', 'plane', x['id'], **fields(x, PLANE_FIELDS)) for x in new_planes])
+            return errors
 
     @staticmethod
-    async def edit_plane(plane_id: UUID, plane: PlaneDto) -> Plane:
-        async with (new_session() as session):
-            data = plane.model_dump()
-            query = select(PlaneSchema).filter_by(id=plane_id)
-            result = await session.execute(query)
-            plane_to_change = result.scalar_one()
-            for key, value in data.items():
-                setattr(plane_to_change, key, value)
-            await session.commit()
-            return Plane.from_orm(plane_to_change)
+    async def edit_plane(plane_id: UUID, plane: PlaneDto,
+                         expected_versions: set[int] | None = None) -> Versioned[Plane]:
+        return await run_write(PlaneRepository.update_plane, plane_id, plane, expected_versions)
+
+    @staticmethod
+    async def update_plane(session: AsyncSession, transaction: Transaction, plane_id: UUID, plane: PlaneDto,
+                           expected_versions: set[int] | None = None) -> Versioned[Plane]:
+        data = plane.model_dump()
+        query = select(PlaneSchema).filter_by(id=plane_id)
+        result = await session.execute(query)
+        plane_to_change = result.scalar_one()
+        check_version(plane_to_change.version, expected_versions)
+        for key, value in data.items():
+            setattr(plane_to_change, key, value)
+        try:
+            await session.flush()
+        except IntegrityError:
+            raise ValueError('Plane already exists')
+        transaction.record(PLANES, PLANE.format(plane_id=plane_id), PLANE_SHAPES, changes=[
+            change('updated', 'plane', plane_id, **fields(plane_to_change, PLANE_FIELDS))])
+        return Versioned(Plane.model_validate(plane_to_change), plane_to_change.version)
 
     @staticmethod
     async def delete_plane(plane_id: UUID) -> Plane:
-        async with (new_session() as session):
+        return await run_write(PlaneRepository.remove_plane, plane_id)
+
+    @staticmethod
+    async def remove_plane(session: AsyncSession, transaction: Transaction, plane_id: UUID) -> Plane:
+        query = select(PlaneSchema).filter_by(id=plane_id)
+        result = await session.execute(query)
+        plane_to_delete = result.scalar_one()
+        # The plane leaves every flight it serves first, so no link is left pointing to a missing plane
+        flights_query = select(FlightSchema).options(selectinload(FlightSchema.suitable_planes)).join(
+            association_table, association_table.c.flight_id == FlightSchema.id).where(
+            association_table.c.plane_id == plane_id)
+        result = await session.execute(flights_query)
+        served_flights = result.scalars().all()
+        for flight in served_flights:
+            flight.suitable_planes.remove(plane_to_delete)
+            touch(flight)
+        await session.delete(plane_to_delete)
+        await session.flush()
+        transaction.record(PLANES, PLANE.format(plane_id=plane_id), PLANE_IDS, PLANE_SHAPES, FLIGHTS, ASSIGNMENTS,
+                           *(FLIGHT.format(flight_id=x.id) for x in served_flights), changes=[
+            *(change('detached', 'flight', x.id, plane_id=plane_id) for x in served_flights),
+            change('deleted', 'plane', plane_id)])
+        return Plane.model_validate(plane_to_delete)
+
+    @staticmethod
+    @cached(PLANE)
+    async def get_plane(plane_id: UUID) -> Versioned[Plane]:
+        async with new_session() as session:
             query = select(PlaneSchema).filter_by(id=plane_id)
             result = await session.execute(query)
-            plane_to_delete = result.scalar_one()
-            await session.delete(plane_to_delete)
-            await session.commit()
-            return Plane.from_orm(plane_to_delete)
+            plane = result.scalar_one()
+            return Versioned(Plane.model_validate(plane), plane.version)
 
     @staticmethod
-    async def get_planes() -> list[Plane]:
+    @cached(PLANE_IDS, value_tags=plane_tags, skip=lambda x: x['limit'] is None)
+    async def get_planes(limit: int | None = None, after: UUID | None = None) -> list[dict]:
+        """Planes as plain records in the shape of Plane, ready for the JSON fast path; only pages are cached"""
         async with new_session() as session:
-            query = select(PlaneSchema)
+            query = select(*PLANE_COLUMNS).order_by(PlaneSchema.id)
+            if after is not None:
+                query = query.where(PlaneSchema.id > after)
+            if limit is not None:
+                query = query.limit(limit)
             result = await session.execute(query)
-            plane_models = result.scalars().all()
-            return [Plane.from_orm(x) for x in plane_models]
+            return records(result.keys(), result)
 
     @staticmethod
-    async def get_average_capacity() -> int:
+    async def search_planes(search: PlaneSearch) -> list[dict]:
         async with new_session() as session:
-            query = select(PlaneSchema.max_capacity)
-            result = await session.execute(query)
-            plane_capacities = [int(x) for x in result.scalars().all()]
-            if len(plane_capacities) == 0:
-                raise ZeroDivisionError('No planes available')
-            average = sum(plane_capacities) / len(plane_capacities)
-            return round(average)
+            result = await session.execute(plane_search_query(search))
+            return records(result.keys(), result)
 
     @staticmethod
-    async def get_average_distance() -> int:
+    async def stream_planes(batch_size: int = 1000) -> AsyncIterator[list[dict]]:
         async with new_session() as session:
-            query = select(PlaneSchema.max_distance)
-            result = await session.execute(query)
-            plane_distances = [int(x) for x in result.scalars().all()]
-            if len(plane_distances) == 0:
-                raise ZeroDivisionError('No planes available')
-            average = sum(plane_distances) / len(plane_distances)
-            return round(average)
+            query = select(*PLANE_COLUMNS).order_by(PlaneSchema.id).execution_options(yield_per=batch_size)
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                yield records(result.keys(), rows)
 
     @staticmethod
-    async def get_max_capacity() -> int:
+    async def stream_plane_columns(batch_size: int = 10_000) -> AsyncIterator[dict[str, list]]:
+        """Planes as column lists with the ids in their stored hex, for the columnar snapshot"""
         async with new_session() as session:
-            query = select(PlaneSchema.max_capacity)
-            result = await session.execute(query)
-            plane_capacities = [int(x) for x in result.scalars().all()]
-            if len(plane_capacities) == 0:
-                raise ValueError('No planes available')
-            max_capacity = max(plane_capacities)
-            return max_capacity
+            query = select(type_coerce(PlaneSchema.id, String).label('id'), *PLANE_COLUMNS[1:]).order_by(
+                PlaneSchema.id).execution_options(yield_per=batch_size)
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                yield columns(result.keys(), rows)
 
     @staticmethod
-    async def get_max_distance() -> int:
+    @cached(PLANE_SHAPES)
+    async def get_stats() -> PlaneStats:
         async with new_session() as session:
-            query = select(PlaneSchema.max_distance)
+            query = select(
+                func.count(PlaneSchema.id).label('count'),
+                func.avg(PlaneSchema.max_capacity).label('average_capacity'),
+                func.min(PlaneSchema.max_capacity).label('min_capacity'),
+                func.max(PlaneSchema.max_capacity).label('max_capacity'),
+                func.avg(PlaneSchema.max_distance).label('average_distance'),
+                func.min(PlaneSchema.max_distance).label('min_distance'),
+                func.max(PlaneSchema.max_distance).label('max_distance'))
             result = await session.execute(query)
-            plane_distances = [int(x) for x in result.scalars().all()]
-            if len(plane_distances) == 0:
-                raise ValueError('No planes available')
-            max_distance = max(plane_distances)
-            return max_distance
+            stats = result.one()._asdict()
+            if stats['count'] > 0:
+                stats['average_capacity'] = round(stats['average_capacity'])
+                stats['average_distance'] = round(stats['average_distance'])
+            return PlaneStats(**stats)
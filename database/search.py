@@ -0,0 +1,81 @@
+"""Filters of the /planes/search and /flights/search endpoints as index-friendly conditions.
+
+Every filterable column leads an index, so whichever filters are given SQLite can start from
+one of them instead of scanning the table. A prefix is matched as a half-open range of the
+column rather than with LIKE, which cannot use an ordinary index under the default
+case-insensitive LIKE.
+
+Left alone, SQLite often prefers walking the index of the sort column (or of the id) in order,
+reading the whole table to skip the sort, over searching the index of a filter whose
+selectivity it cannot estimate. A filtered search therefore sorts by +column, which no index
+can provide, unless the sort column is itself filtered. tests/test_search_plans.py checks the
+plans of all filter combinations.
+"""
+from sqlalchemy import ColumnElement, Select, select
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql.expression import UnaryExpression
+from sqlalchemy.sql.operators import custom_op
+from pydantic import BaseModel
+
+MAX_CHARACTER = 0x10FFFF
+
+
+def prefix_conditions(column: InstrumentedAttribute, prefix: str) -> list[ColumnElement[bool]]:
+    """column LIKE 'prefix%' as prefix <= column < the next string after all those starting with prefix"""
+    conditions = [column >= prefix]
+    stem = prefix.rstrip(chr(MAX_CHARACTER))
+    if stem:
+        conditions.append(column < stem[:-1] + chr(ord(stem[-1]) + 1))
+    return conditions
+
+
+def unindexed(column: InstrumentedAttribute) -> ColumnElement:
+    """+column: the same value, but not something SQLite will read in order from an index"""
+    return UnaryExpression(column, operator=custom_op('+'), type_=column.type)
+
+
+def is_filtered(search: BaseModel, key: str) -> bool:
+    values = [getattr(search, x, None) for x in (key, f'{key}_min', f'{key}_max')]
+    return any(x is not None for x in values) or bool(getattr(search, f'{key}_prefix', None))
+
+
+def search_conditions(search: BaseModel, text_columns: tuple[InstrumentedAttribute, ...],
+                      range_columns: tuple[InstrumentedAttribute, ...]) -> list[ColumnElement[bool]]:
+    """Conditions for the filters set in a search model.
+
+    A text column is matched by the fields <column> (equality) and <column>_prefix, a numeric
+    one by <column>_min and <column>_max, both inclusive.
+    """
+    conditions = []
+    for column in text_columns:
+        value = getattr(search, column.key)
+        if value is not None:
+            conditions.append(column == value)
+        prefix = getattr(search, f'{column.key}_prefix')
+        if prefix:
+            conditions += prefix_conditions(column, prefix)
+    for column in range_columns:
+        low = getattr(search, f'{column.key}_min')
+        if low is not None:
+            conditions.append(column >= low)
+        high = getattr(search, f'{column.key}_max')
+        if high is not None:
+            conditions.append(column <= high)
+    return conditions
+
+
+def search_query(entity: type, selected: tuple[InstrumentedAttribute, ...], search: BaseModel,
+                 text_columns: tuple[InstrumentedAttribute, ...],
+                 range_columns: tuple[InstrumentedAttribute, ...]) -> Select:
+    """The filtered query, sorted by search.order_by and then by id so that ties come in a stable order"""
+    conditions = search_conditions(search, text_columns, range_columns)
+    query = select(*selected).where(*conditions)
+    if search.order_by is not None:
+        column = getattr(entity, search.order_by.value)
+        if conditions and not is_filtered(search, column.key):
+            column = unindexed(column)
+        query = query.order_by(column.desc() if search.descending else column)
+    query = query.order_by(unindexed(entity.id) if conditions else entity.id)
+    if search.limit is not None:
+        query = query.limit(search.limit)
+    return query
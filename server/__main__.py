@@ -0,0 +1,33 @@
+"""Runs the API in several uvicorn worker processes.
+
+The schema is set up once here, before any worker starts, and the workers keep their caches
+coherent through the change log (see database.changes).
+
+Usage: python -m server [--host HOST] [--port PORT] [--workers N]
+"""
+import argparse
+import asyncio
+import os
+import uvicorn
+from database.database import create_tables, engine
+from server.app import SCHEMA_READY_ENV
+
+
+async def prepare():
+    await create_tables()
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.environ.get('PLANES_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PLANES_PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('PLANES_WORKERS', os.cpu_count() or 1)))
+    arguments = parser.parse_args()
+    asyncio.run(prepare())
+    os.environ[SCHEMA_READY_ENV] = '1'
+    uvicorn.run('server.app:app', host=arguments.host, port=arguments.port, workers=arguments.workers)
+
+
+if __name__ == '__main__':
+    main()
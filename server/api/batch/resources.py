@@ -0,0 +1,83 @@
+from functools import partial
+from http import HTTPStatus
+from fastapi import APIRouter
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm.exc import StaleDataError
+from database.batch import NotExecuted, Step, run_batch
+from database.concurrency import Versioned, VersionMismatch
+from database.flight.repository import FlightRepository
+from database.plane.repository import PlaneRepository
+from server.api.batch.schemas import (AddFlight, AddPlane, AddPlaneToFlight, BatchReport, BatchRequest, DeleteFlight,
+                                     DeletePlane, DeletePlaneFromFlight, EditFlight, EditPlane, Operation,
+                                     OperationResult)
+from server.api.versioning import make_etag, parse_if_match
+
+router = APIRouter(
+    prefix="/batch",
+    tags=["Пакетные операции"],
+)
+
+
+def versioned_step(step, if_match: str | None, *arguments) -> Step:
+    """The step with its If-Match header parsed inside it, so an invalid header fails only this operation"""
+    async def run(session, transaction):
+        return await step(session, transaction, *arguments, parse_if_match(if_match))
+    return run
+
+
+def make_step(operation: Operation) -> Step:
+    match operation:
+        case AddPlane():
+            return partial(PlaneRepository.insert_plane, plane=operation.plane)
+        case EditPlane():
+            return versioned_step(PlaneRepository.update_plane, operation.if_match, operation.plane_id, operation.plane)
+        case DeletePlane():
+            return partial(PlaneRepository.remove_plane, plane_id=operation.plane_id)
+        case AddFlight():
+            return partial(FlightRepository.insert_flight, flight=operation.flight)
+        case EditFlight():
+            return versioned_step(FlightRepository.update_flight, operation.if_match, operation.flight_id,
+                                  operation.flight)
+        case DeleteFlight():
+            return partial(FlightRepository.remove_flight, flight_id=operation.flight_id)
+        case AddPlaneToFlight():
+            return versioned_step(FlightRepository.attach_plane, operation.if_match, operation.flight_id,
+                                  operation.plane_id)
+        case DeletePlaneFromFlight():
+            return versioned_step(FlightRepository.detach_plane, operation.if_match, operation.flight_id,
+                                  operation.plane_id)
+
+
+def error_result(operation: Operation, error: Exception) -> OperationResult:
+    """The status and detail the operation's own route answers the error with"""
+    entity = 'Plane' if isinstance(operation, (AddPlane, EditPlane, DeletePlane)) else 'Flight'
+    if isinstance(error, NotExecuted):
+        return OperationResult(status=HTTPStatus.FAILED_DEPENDENCY, detail='An earlier operation failed')
+    if isinstance(error, NoResultFound):
+        return OperationResult(status=HTTPStatus.NOT_FOUND, detail=f'{entity} is not found')
+    if isinstance(error, VersionMismatch):
+        return OperationResult(status=HTTPStatus.PRECONDITION_FAILED, detail=f'{entity} version does not match')
+    if isinstance(error, StaleDataError):
+        return OperationResult(status=HTTPStatus.CONFLICT, detail=f'{entity} was modified concurrently')
+    if isinstance(error, ValueError):
+        return OperationResult(status=HTTPStatus.BAD_REQUEST, detail=error.args[0])
+    if isinstance(operation, (AddPlaneToFlight, DeletePlaneFromFlight)):
+        return OperationResult(status=HTTPStatus.NOT_FOUND, detail=error.args[0])
+    return OperationResult(status=HTTPStatus.INTERNAL_SERVER_ERROR, detail='Internal Server Error')
+
+
+def operation_result(operation: Operation, result: object) -> OperationResult:
+    if isinstance(result, Exception):
+        return error_result(operation, result)
+    if isinstance(result, Versioned):
+        return OperationResult(status=HTTPStatus.OK, body=result.value, etag=make_etag(result.version))
+    if isinstance(operation, (AddPlane, AddFlight)):
+        return OperationResult(status=HTTPStatus.OK, body={'id': result})
+    return OperationResult(status=HTTPStatus.OK, body=result)
+
+
+@router.post("")
+async def run_operations(request: BatchRequest) -> BatchReport:
+    committed, results = await run_batch([make_step(x) for x in request.operations], request.atomic)
+    return BatchReport(committed=committed,
+                       results=[operation_result(x, y) for x, y in zip(request.operations, results)])
@@ -0,0 +1,84 @@
+from typing import Annotated, Literal, Union
+from uuid import UUID
+from pydantic import BaseModel, Field
+from server.api.flight.schemas import Flight, FlightDto
+from server.api.plane.schemas import Plane, PlaneDto
+
+MAX_OPERATIONS = 10_000
+
+
+class AddPlane(BaseModel):
+    """POST /planes"""
+    op: Literal['add_plane']
+    plane: PlaneDto
+
+
+class EditPlane(BaseModel):
+    """PUT /planes/{plane_id}"""
+    op: Literal['edit_plane']
+    plane_id: UUID
+    plane: PlaneDto
+    if_match: str | None = None
+
+
+class DeletePlane(BaseModel):
+    """DELETE /planes/{plane_id}"""
+    op: Literal['delete_plane']
+    plane_id: UUID
+
+
+class AddFlight(BaseModel):
+    """POST /flights"""
+    op: Literal['add_flight']
+    flight: FlightDto
+
+
+class EditFlight(BaseModel):
+    """PUT /flights/{flight_id}"""
+    op: Literal['edit_flight']
+    flight_id: UUID
+    flight: FlightDto
+    if_match: str | None = None
+
+
+class DeleteFlight(BaseModel):
+    """DELETE /flights/{flight_id}"""
+    op: Literal['delete_flight']
+    flight_id: UUID
+
+
+class AddPlaneToFlight(BaseModel):
+    """PATCH /flights/{flight_id}/add"""
+    op: Literal['add_plane_to_flight']
+    flight_id: UUID
+    plane_id: UUID
+    if_match: str | None = None
+
+
+class DeletePlaneFromFlight(BaseModel):
+    """PATCH /flights/{flight_id}/delete"""
+    op: Literal['delete_plane_from_flight']
+    flight_id: UUID
+    plane_id: UUID
+    if_match: str | None = None
+
+
+Operation = Annotated[Union[AddPlane, EditPlane, DeletePlane, AddFlight, EditFlight, DeleteFlight,
+                            AddPlaneToFlight, DeletePlaneFromFlight], Field(discriminator='op')]
+
+
+class BatchRequest(BaseModel):
+    operations: list[Operation] = Field(max_length=MAX_OPERATIONS)
+    atomic: bool = False
+
+
+class OperationResult(BaseModel):
+    status: int
+    body: dict[str, UUID] | Plane | Flight | None = None
+    detail: str | None = None
+    etag: str | None = None
+
+
+class BatchReport(BaseModel):
+    committed: bool
+    results: list[OperationResult]
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from database.cache import repository_cache
+from server.api.cache.schemas import CacheStats
+
+router = APIRouter(
+    prefix="/cache",
+    tags=["Кэш"],
+)
+
+
+@router.get("/stats")
+async def get_cache_stats() -> CacheStats:
+    return CacheStats(**repository_cache.stats())
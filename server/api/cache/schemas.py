@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    bytes: int
+    maxbytes: int
+    pinned: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
@@ -0,0 +1,43 @@
+import asyncio
+import time
+from typing import AsyncIterator
+from database.changes import last_sequence, read_changes
+from database.config import CHANGE_POLL_INTERVAL
+
+SSE_MEDIA_TYPE = 'text/event-stream'
+KEEPALIVE_INTERVAL = 15
+BATCH_SIZE = 1000
+
+
+def sse_event(event: str, sequence: int, data: str) -> bytes:
+    return f'id: {sequence}\nevent: {event}\ndata: {data}\n\n'.encode()
+
+
+async def sse_changes(after: int | None, follow: bool) -> AsyncIterator[bytes]:
+    """Server-sent events with the change log entries past `after`, one event per committed write.
+
+    A reader that fell behind the retained log gets a reset event instead of the changes it missed
+    and continues from the current sequence number.
+    """
+    if after is None:
+        after = await last_sequence()
+    keepalive_at = time.monotonic() + KEEPALIVE_INTERVAL
+    while True:
+        rows, complete = await read_changes(after, BATCH_SIZE)
+        if not complete:
+            after = await last_sequence()
+            yield sse_event('reset', after, f'{{"sequence":{after}}}')
+            continue
+        for sequence, changes in rows:
+            yield sse_event('changes', sequence, f'{{"sequence":{sequence},"changes":{changes}}}')
+        if rows:
+            after = rows[-1][0]
+            keepalive_at = time.monotonic() + KEEPALIVE_INTERVAL
+        if len(rows) == BATCH_SIZE:
+            continue
+        if not follow:
+            return
+        if time.monotonic() >= keepalive_at:
+            yield b': keepalive\n\n'
+            keepalive_at = time.monotonic() + KEEPALIVE_INTERVAL
+        await asyncio.sleep(CHANGE_POLL_INTERVAL)
@@ -0,0 +1,29 @@
+from typing import Annotated
+from fastapi import APIRouter, Header, HTTPException, Query
+from starlette.responses import StreamingResponse
+from database.changes import last_sequence
+from server.api.changes.feed import SSE_MEDIA_TYPE, sse_changes
+from server.api.changes.schemas import ChangeSequence
+from http import HTTPStatus
+
+router = APIRouter(
+    prefix="/changes",
+    tags=["Изменения"],
+)
+
+
+@router.get("", response_class=StreamingResponse, responses={200: {'content': {SSE_MEDIA_TYPE: {}}}})
+async def stream_changes(after: Annotated[int | None, Query(ge=0)] = None, follow: bool = True,
+                         last_event_id: Annotated[str | None, Header()] = None) -> StreamingResponse:
+    if last_event_id is not None:
+        try:
+            after = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='Invalid Last-Event-ID header')
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return StreamingResponse(sse_changes(after, follow), headers=headers, media_type=SSE_MEDIA_TYPE)
+
+
+@router.get("/sequence")
+async def get_sequence() -> ChangeSequence:
+    return ChangeSequence(sequence=await last_sequence())
@@ -0,0 +1,150 @@
+import json
+import zlib
+from typing import AsyncIterator
+from uuid import UUID, uuid4
+from pydantic import ValidationError
+from database.plane.repository import PlaneRepository
+from database.flight.repository import FlightRepository
+from server.api.data_import.schemas import ImportReport, RecordError
+from server.api.flight.schemas import FlightDto
+from server.api.plane.schemas import PlaneDto
+
+CHUNK_SIZE = 1000
+GZIP_WBITS = 31
+
+
+async def gunzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+    try:
+        async for chunk in chunks:
+            decompressed = decompressor.decompress(chunk)
+            if decompressed:
+                yield decompressed
+        yield decompressor.flush()
+    except zlib.error:
+        raise ValueError('Invalid gzip stream')
+
+
+async def json_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[str, int, object]]:
+    body = b''.join([x async for x in chunks])
+    try:
+        document = json.loads(body)
+    except ValueError:
+        raise ValueError('Invalid JSON document')
+    if not isinstance(document, dict):
+        raise ValueError('Invalid JSON document')
+    for index, record in enumerate(document.get('planes', [])):
+        yield 'plane', index, record
+    for index, record in enumerate(document.get('flights', [])):
+        yield 'flight', index, record
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[str, int, object]]:
+    index = 0
+    tail = b''
+    async for chunk in chunks:
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield parse_ndjson_line(line, index)
+            index += 1
+    if tail.strip():
+        yield parse_ndjson_line(tail, index)
+
+
+def parse_ndjson_line(line: bytes, index: int) -> tuple[str, int, object]:
+    try:
+        record = json.loads(line)
+        return record['type'], index, record['data']
+    except (ValueError, TypeError, KeyError):
+        return 'unknown', index, None
+
+
+def parse_id(record: dict) -> UUID:
+    if record.get('id') is None:
+        return uuid4()
+    return UUID(str(record['id']))
+
+
+def parse_plane_reference(reference: object) -> UUID:
+    if isinstance(reference, dict):
+        return UUID(str(reference['id']))
+    return UUID(str(reference))
+
+
+class Importer:
+    def __init__(self):
+        self.report = ImportReport()
+        self.planes: dict[UUID, PlaneDto] = {}
+        self.plane_indexes: dict[UUID, int] = {}
+        self.flights: dict[UUID, tuple[FlightDto, list[UUID]]] = {}
+        self.flight_indexes: dict[UUID, int] = {}
+
+    def error(self, record_type: str, index: int, detail: str):
+        self.report.errors.append(RecordError(type=record_type, index=index, detail=detail))
+
+    async def add(self, record_type: str, index: int, record: object):
+        if record_type == 'link':
+            # Only columnar snapshots have links of their own; they reach here when their flight is missing
+            self.error(record_type, index, 'Flight is not found')
+            return
+        if record_type not in ('plane', 'flight') or not isinstance(record, dict):
+            self.error(record_type, index, 'Invalid record')
+            return
+        try:
+            record_id = parse_id(record)
+            if record_type == 'plane':
+                plane = PlaneDto.model_validate(record)
+            else:
+                flight = FlightDto.model_validate(record)
+                plane_ids = [parse_plane_reference(x) for x in record.get('suitable_planes') or []]
+        except ValidationError as e:
+            self.error(record_type, index, '; '.join(x['msg'] for x in e.errors()))
+            return
+        except (ValueError, TypeError, KeyError):
+            self.error(record_type, index, 'Invalid id')
+            return
+        if record_id in self.planes or record_id in self.flights:
+            self.error(record_type, index, 'Duplicate id')
+            return
+        if record_type == 'plane':
+            self.planes[record_id] = plane
+            self.plane_indexes[record_id] = index
+            if len(self.planes) >= CHUNK_SIZE:
+                await self.flush_planes()
+        else:
+            self.flights[record_id] = (flight, plane_ids)
+            self.flight_indexes[record_id] = index
+            if len(self.flights) >= CHUNK_SIZE:
+                await self.flush_flights()
+
+    async def flush_planes(self):
+        if not self.planes:
+            return
+        errors = await PlaneRepository.add_planes(self.planes)
+        for plane_id, detail in errors.items():
+            self.error('plane', self.plane_indexes[plane_id], detail)
+        self.report.planes += len(self.planes) - len(errors)
+        self.planes = {}
+        self.plane_indexes = {}
+
+    async def flush_flights(self):
+        if not self.flights:
+            return
+        # Flights may reference planes from the same file, so they have to be stored first
+        await self.flush_planes()
+        errors = await FlightRepository.add_flights(self.flights)
+        for flight_id, detail in errors.items():
+            self.error('flight', self.flight_indexes[flight_id], detail)
+        self.report.flights += len(self.flights) - len(errors)
+        self.flights = {}
+        self.flight_indexes = {}
+
+    async def run(self, records: AsyncIterator[tuple[str, int, object]]) -> ImportReport:
+        async for record_type, index, record in records:
+            await self.add(record_type, index, record)
+        await self.flush_planes()
+        await self.flush_flights()
+        self.report.errors.sort(key=lambda x: (x.type != 'plane', x.index))
+        return self.report
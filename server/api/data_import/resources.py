@@ -0,0 +1,40 @@
+from typing import Annotated
+from fastapi import APIRouter, Header, HTTPException, Request
+from server.api.data_import.pipeline import Importer, gunzip_chunks, json_records, ndjson_records
+from server.api.data_import.schemas import ImportReport
+from server.api.data_import.snapshot import arrow_records, msgpack_records
+from server.api.export.formats import check_available, content_format
+from server.api.export.schemas import ExportFormat
+from http import HTTPStatus
+
+router = APIRouter(
+    prefix="/import",
+    tags=["Загрузка из JSON"],
+)
+
+RECORDS = {
+    ExportFormat.json: json_records,
+    ExportFormat.ndjson: ndjson_records,
+    ExportFormat.arrow: arrow_records,
+    ExportFormat.msgpack: msgpack_records,
+}
+
+
+@router.post("")
+async def import_data(request: Request, format: ExportFormat | None = None, gzip: bool = False,
+                      content_type: Annotated[str | None, Header()] = None) -> ImportReport:
+    if format is None:
+        format = content_format(content_type)
+    try:
+        check_available(format)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTPStatus.UNSUPPORTED_MEDIA_TYPE, detail=e.args[0])
+    chunks = request.stream()
+    if gzip:
+        chunks = gunzip_chunks(chunks)
+    records = RECORDS[format](chunks)
+    try:
+        report = await Importer().run(records)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.args[0])
+    return report
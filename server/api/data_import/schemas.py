@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+
+
+class RecordError(BaseModel):
+    type: str
+    index: int
+    detail: str
+
+
+class ImportReport(BaseModel):
+    planes: int = 0
+    flights: int = 0
+    errors: list[RecordError] = []
@@ -0,0 +1,110 @@
+"""Reads the columnar snapshots written by server.api.export.snapshot back into import records.
+
+Planes are passed on as soon as they are read. Flights are held back until the links table has
+been read, then emitted with the ids of their planes, so the Importer validates and stores
+them exactly like the records of a JSON document. Ids are handed over as hex strings, which
+the Importer parses anyway, instead of building a UUID per value here.
+"""
+from typing import AsyncIterator
+from server.api.export.snapshot import ID_COLUMNS, msgpack, pyarrow
+
+
+class SnapshotRecords:
+    def __init__(self):
+        self.flights: list[dict] = []
+        self.links: dict[str, list[str]] = {}
+        self.link_indexes: dict[str, int] = {}
+        self.link_count = 0
+
+    def add_links(self, flight_ids: list[str], plane_ids: list[str]):
+        for index, (flight_id, plane_id) in enumerate(zip(flight_ids, plane_ids), self.link_count):
+            if flight_id not in self.links:
+                self.links[flight_id] = []
+                self.link_indexes[flight_id] = index
+            self.links[flight_id].append(plane_id)
+        self.link_count += len(flight_ids)
+
+    def flight_records(self) -> list[tuple[str, int, object]]:
+        records = []
+        for index, flight in enumerate(self.flights):
+            flight['suitable_planes'] = self.links.pop(flight['id'], [])
+            records.append(('flight', index, flight))
+        for flight_id in self.links:
+            records.append(('link', self.link_indexes[flight_id], {'flight_id': flight_id}))
+        return records
+
+
+def hex_ids(packed: bytes) -> list[str]:
+    """Concatenated 16-byte ids as hex strings"""
+    hexed = packed.hex()
+    return [hexed[x:x + 32] for x in range(0, len(hexed), 32)]
+
+
+def rows(columns: dict[str, list]) -> list[dict]:
+    names = list(columns)
+    return [dict(zip(names, x)) for x in zip(*columns.values())]
+
+
+def arrow_columns(table: 'pyarrow.Table') -> dict[str, list]:
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        column = column.combine_chunks()
+        if isinstance(column, pyarrow.ExtensionArray):
+            storage = column.storage
+            packed = storage.buffers()[1].to_pybytes()
+            columns[name] = hex_ids(packed[storage.offset * 16:(storage.offset + len(storage)) * 16])
+        else:
+            columns[name] = column.to_pylist()
+    return columns
+
+
+async def arrow_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[str, int, object]]:
+    body = b''.join([x async for x in chunks])
+    source = pyarrow.BufferReader(body)
+    snapshot = SnapshotRecords()
+    try:
+        while source.tell() < source.size():
+            reader = pyarrow.ipc.open_stream(source)
+            table = reader.read_all()
+            name = (reader.schema.metadata or {}).get(b'table', b'').decode()
+            if name == 'planes':
+                for index, record in enumerate(rows(arrow_columns(table))):
+                    yield 'plane', index, record
+            elif name == 'flights':
+                snapshot.flights += rows(arrow_columns(table))
+            elif name == 'links':
+                columns = arrow_columns(table)
+                snapshot.add_links(columns['flight_id'], columns['plane_id'])
+            else:
+                raise ValueError(f'Unknown table: {name}')
+    except pyarrow.ArrowInvalid:
+        raise ValueError('Invalid Arrow stream')
+    for record in snapshot.flight_records():
+        yield record
+
+
+async def msgpack_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[str, int, object]]:
+    unpacker = msgpack.Unpacker(raw=False)
+    snapshot = SnapshotRecords()
+    plane_index = 0
+    try:
+        async for chunk in chunks:
+            unpacker.feed(chunk)
+            for batch in unpacker:
+                name, columns = batch['table'], batch['columns']
+                for column in ID_COLUMNS.intersection(columns):
+                    columns[column] = hex_ids(b''.join(columns[column]))
+                if name == 'planes':
+                    for record in rows(columns):
+                        yield 'plane', plane_index, record
+                        plane_index += 1
+                elif name == 'flights':
+                    snapshot.flights += rows(columns)
+                elif name == 'links':
+                    snapshot.add_links(columns['flight_id'], columns['plane_id'])
+                else:
+                    raise ValueError(f'Unknown table: {name}')
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Invalid msgpack stream')
+    for record in snapshot.flight_records():
+        yield record
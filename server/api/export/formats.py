@@ -0,0 +1,77 @@
+from server.api.export.schemas import ExportFormat
+from server.api.export.snapshot import msgpack, pyarrow
+from server.api.streaming import NDJSON_MEDIA_TYPE
+
+JSON_MEDIA_TYPE = 'application/json'
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+MSGPACK_MEDIA_TYPE = 'application/vnd.msgpack'
+
+MEDIA_TYPES = {
+    ExportFormat.json: JSON_MEDIA_TYPE,
+    ExportFormat.ndjson: NDJSON_MEDIA_TYPE,
+    ExportFormat.arrow: ARROW_MEDIA_TYPE,
+    ExportFormat.msgpack: MSGPACK_MEDIA_TYPE,
+}
+FORMATS = {
+    JSON_MEDIA_TYPE: ExportFormat.json,
+    NDJSON_MEDIA_TYPE: ExportFormat.ndjson,
+    ARROW_MEDIA_TYPE: ExportFormat.arrow,
+    MSGPACK_MEDIA_TYPE: ExportFormat.msgpack,
+    'application/msgpack': ExportFormat.msgpack,
+    'application/x-msgpack': ExportFormat.msgpack,
+    '*/*': ExportFormat.json,
+    'application/*': ExportFormat.json,
+}
+FILE_EXTENSIONS = {
+    ExportFormat.json: 'json',
+    ExportFormat.ndjson: 'ndjson',
+    ExportFormat.arrow: 'arrows',
+    ExportFormat.msgpack: 'msgpack',
+}
+
+
+def check_available(export_format: ExportFormat):
+    if export_format == ExportFormat.arrow and pyarrow is None:
+        raise ValueError('The arrow format needs pyarrow to be installed')
+    if export_format == ExportFormat.msgpack and msgpack is None:
+        raise ValueError('The msgpack format needs msgpack to be installed')
+
+
+def media_ranges(header: str) -> list[str]:
+    """Media types of an Accept header, most preferred first; equal weights keep their order"""
+    ranges = []
+    for position, item in enumerate(header.split(',')):
+        media_type, *parameters = [x.strip() for x in item.split(';')]
+        weight = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition('=')
+            if name.strip() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if media_type and weight > 0:
+            ranges.append((-weight, position, media_type.lower()))
+    return [x for _, _, x in sorted(ranges)]
+
+
+def negotiate(accept: str | None) -> ExportFormat:
+    """The first format from the Accept header that is installed; JSON when the header is absent"""
+    if not accept:
+        return ExportFormat.json
+    for media_type in media_ranges(accept):
+        export_format = FORMATS.get(media_type)
+        if export_format is None:
+            continue
+        try:
+            check_available(export_format)
+        except ValueError:
+            continue
+        return export_format
+    raise ValueError('None of the accepted media types can be produced')
+
+
+def content_format(content_type: str | None) -> ExportFormat:
+    """The format of an uploaded document by its Content-Type; JSON for anything else"""
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    return FORMATS.get(media_type, ExportFormat.json)
@@ -0,0 +1,42 @@
+import zlib
+from typing import AsyncIterator
+import orjson
+from database.plane.repository import PlaneRepository
+from database.flight.repository import FlightRepository
+
+GZIP_WBITS = 31
+
+
+async def json_array(batches: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    separator = b''
+    async for batch in batches:
+        yield separator + b','.join(orjson.dumps(x) for x in batch)
+        separator = b','
+
+
+async def json_chunks() -> AsyncIterator[bytes]:
+    yield b'{"planes":['
+    async for chunk in json_array(PlaneRepository.stream_planes()):
+        yield chunk
+    yield b'],"flights":['
+    async for chunk in json_array(FlightRepository.stream_flights(include_planes=True)):
+        yield chunk
+    yield b']}'
+
+
+async def ndjson_chunks() -> AsyncIterator[bytes]:
+    async for planes in PlaneRepository.stream_planes():
+        yield b''.join(orjson.dumps({'type': 'plane', 'data': x}, option=orjson.OPT_APPEND_NEWLINE)
+                       for x in planes)
+    async for flights in FlightRepository.stream_flights(include_planes=True):
+        yield b''.join(orjson.dumps({'type': 'flight', 'data': x}, option=orjson.OPT_APPEND_NEWLINE)
+                       for x in flights)
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=GZIP_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
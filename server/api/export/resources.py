@@ -1,27 +1,43 @@
-from fastapi import APIRouter
-import json
-from io import BytesIO
+from typing import Annotated
+from fastapi import APIRouter, Header, HTTPException
 from starlette.responses import StreamingResponse
-from server.api.export.uuid_encoder import UUIDEncoder
-from server.api.plane.resources import get_all_planes
-from server.api.flight.resources import get_all_flights
+from server.api.export.formats import FILE_EXTENSIONS, MEDIA_TYPES, check_available, negotiate
+from server.api.export.pipeline import gzip_chunks, json_chunks, ndjson_chunks
+from server.api.export.schemas import ExportFormat
+from server.api.export.snapshot import arrow_chunks, msgpack_chunks
+from http import HTTPStatus
 
 router = APIRouter(
     prefix="/export",
     tags=["Запись в JSON"],
 )
 
+CHUNKS = {
+    ExportFormat.json: json_chunks,
+    ExportFormat.ndjson: ndjson_chunks,
+    ExportFormat.arrow: arrow_chunks,
+    ExportFormat.msgpack: msgpack_chunks,
+}
+
 
 @router.get("")
-async def export_data():
-    output = BytesIO()
-    planes = await get_all_planes()
-    flights = await get_all_flights()
-    result = {'planes': [x.dict() for x in planes], 'flights': [x.dict() for x in flights]}
-    print(json.dumps(result, cls=UUIDEncoder))
-    output.write(json.dumps(result, cls=UUIDEncoder).encode())
-    output.seek(0)
+async def export_data(format: ExportFormat | None = None, gzip: bool = False,
+                      accept: Annotated[str | None, Header()] = None):
+    try:
+        if format is None:
+            format = negotiate(accept)
+        check_available(format)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTPStatus.NOT_ACCEPTABLE, detail=e.args[0])
+    chunks = CHUNKS[format]()
+    filename = f'All_data.{FILE_EXTENSIONS[format]}'
+    media_type = MEDIA_TYPES[format]
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        media_type = 'application/gzip'
     headers = {
-        'Content-Disposition': 'attachment; filename="All_data.json"'
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Vary': 'Accept',
     }
-    return StreamingResponse(output, headers=headers)
+    return StreamingResponse(chunks, headers=headers, media_type=media_type)
@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class ExportFormat(str, Enum):
+    json = 'json'
+    ndjson = 'ndjson'
+    arrow = 'arrow'
+    msgpack = 'msgpack'
@@ -1,9 +1,20 @@
+from typing import Annotated
 from uuid import UUID
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Body, Header, HTTPException, Query, Response
+from starlette.responses import StreamingResponse
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm.exc import StaleDataError
+from database.concurrency import VersionMismatch
 from database.flight.repository import FlightRepository
-from server.api.flight.schemas import Flight, FlightDto
+from database.flight.simulation import load_simulation_snapshot, simulate
+from server.api.flight.schemas import (AssignmentReport, CandidateOrder, ConductResult, Flight, FlightDto,
+                                      FlightInclude, FlightSearch, FlightSummary, Itinerary, ItineraryOrder,
+                                      RefuelEvent, SimulationRequest, SimulationResult)
 from server.api.plane.schemas import Plane
+from server.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from server.api.rendering import OrjsonResponse
+from server.api.streaming import NDJSON_MEDIA_TYPE, ndjson_lines
+from server.api.versioning import ETAG_HEADER, make_etag, parse_if_match
 from http import HTTPStatus
 
 router = APIRouter(
@@ -22,33 +33,53 @@ async def add_flight(flight: FlightDto) -> dict[str, UUID]:
 
 
 @router.put("/{flight_id}")
-async def edit_flight(flight_id: UUID, flight: FlightDto) -> Flight:
+async def edit_flight(flight_id: UUID, flight: FlightDto, response: Response,
+                      if_match: Annotated[str | None, Header()] = None) -> Flight:
     try:
-        edited_flight = await FlightRepository.edit_flight(flight_id, flight)
+        edited_flight, version = await FlightRepository.edit_flight(flight_id, flight, parse_if_match(if_match))
     except NoResultFound:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Flight is not found")
+    except VersionMismatch:
+        raise HTTPException(status_code=HTTPStatus.PRECONDITION_FAILED, detail="Flight version does not match")
+    except StaleDataError:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Flight was modified concurrently")
+    except ValueError as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.args[0])
+    response.headers[ETAG_HEADER] = make_etag(version)
     return edited_flight
 
 
 @router.patch("/{flight_id}/add")
-async def add_plane_to_flight(flight_id: UUID, plane_id: UUID) -> Flight:
+async def add_plane_to_flight(flight_id: UUID, plane_id: UUID, response: Response,
+                              if_match: Annotated[str | None, Header()] = None) -> Flight:
     try:
-        edited_flight = await FlightRepository.add_plane(flight_id, plane_id)
+        edited_flight, version = await FlightRepository.add_plane(flight_id, plane_id, parse_if_match(if_match))
+    except VersionMismatch:
+        raise HTTPException(status_code=HTTPStatus.PRECONDITION_FAILED, detail="Flight version does not match")
+    except StaleDataError:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Flight was modified concurrently")
     except ValueError as e:
         raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.args[0])
     except Exception as e:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=e.args[0])
+    response.headers[ETAG_HEADER] = make_etag(version)
     return edited_flight
 
 
 @router.patch("/{flight_id}/delete")
-async def delete_plane_from_flight(flight_id: UUID, plane_id: UUID) -> Flight:
+async def delete_plane_from_flight(flight_id: UUID, plane_id: UUID, response: Response,
+                                   if_match: Annotated[str | None, Header()] = None) -> Flight:
     try:
-        edited_flight = await FlightRepository.delete_plane(flight_id, plane_id)
+        edited_flight, version = await FlightRepository.delete_plane(flight_id, plane_id, parse_if_match(if_match))
+    except VersionMismatch:
+        raise HTTPException(status_code=HTTPStatus.PRECONDITION_FAILED, detail="Flight version does not match")
+    except StaleDataError:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Flight was modified concurrently")
     except ValueError as e:
         raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.args[0])
     except Exception as e:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=e.args[0])
+    response.headers[ETAG_HEADER] = make_etag(version)
     return edited_flight
 
 
@@ -58,37 +89,123 @@ async def delete_flight(flight_id: UUID) -> Flight:
         deleted_flight = await FlightRepository.delete_flight(flight_id)
     except NoResultFound:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Flight is not found")
+    except StaleDataError:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Flight was modified concurrently")
     return deleted_flight
 
 
-@router.get("")
-async def get_all_flights() -> list[Flight]:
-    flights = await FlightRepository.get_flights()
-    return flights
+@router.get("", response_model=list[FlightSummary] | list[Flight])
+async def get_all_flights(limit: Annotated[int | None, Query(gt=0)] = None,
+                          after: str | None = None,
+                          include: FlightInclude | None = None) -> OrjsonResponse:
+    try:
+        after_id = decode_cursor(after) if after is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.args[0])
+    flights = await FlightRepository.get_flights(limit, after_id, include == FlightInclude.planes)
+    headers = {}
+    if limit is not None and len(flights) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(flights[-1]['id'])
+    return OrjsonResponse(flights, headers=headers)
+
+
+@router.get("/stream")
+async def stream_all_flights(include: FlightInclude | None = None) -> StreamingResponse:
+    batches = FlightRepository.stream_flights(include_planes=include == FlightInclude.planes)
+    return StreamingResponse(ndjson_lines(batches), media_type=NDJSON_MEDIA_TYPE)
+
+
+@router.get("/search", response_model=list[FlightSummary] | list[Flight])
+async def search_flights(search: Annotated[FlightSearch, Query()]) -> OrjsonResponse:
+    return OrjsonResponse(await FlightRepository.search_flights(search))
+
+
+@router.get("/itinerary")
+async def find_itinerary(origin: str, destination: str,
+                         order_by: ItineraryOrder = ItineraryOrder.distance,
+                         passengers: Annotated[int | None, Query(gt=0)] = None) -> Itinerary:
+    try:
+        itinerary = await FlightRepository.find_itinerary(origin, destination, order_by, passengers)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.args[0])
+    if itinerary is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Itinerary is not found")
+    return itinerary
+
+
+@router.get("/{flight_id}")
+async def get_flight(flight_id: UUID, response: Response) -> Flight:
+    try:
+        flight, version = await FlightRepository.get_flight(flight_id)
+    except NoResultFound:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Flight is not found")
+    response.headers[ETAG_HEADER] = make_etag(version)
+    return flight
 
 
-@router.get("/{flight_id}/capacity")
-async def get_available_planes_by_capacity(flight_id: UUID) -> list[Plane]:
+@router.get("/{flight_id}/capacity", response_model=list[Plane])
+async def get_available_planes_by_capacity(flight_id: UUID) -> OrjsonResponse:
     try:
         planes = await FlightRepository.get_available_planes_by_capacity(flight_id)
     except NoResultFound:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Flight is not found")
-    return planes
+    return OrjsonResponse(planes)
 
 
-@router.get("/{flight_id}/distance")
-async def get_available_planes_by_distance(flight_id: UUID) -> list[Plane]:
+@router.get("/{flight_id}/distance", response_model=list[Plane])
+async def get_available_planes_by_distance(flight_id: UUID) -> OrjsonResponse:
     try:
         planes = await FlightRepository.get_available_planes_by_distance(flight_id)
     except NoResultFound:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Flight is not found")
-    return planes
+    return OrjsonResponse(planes)
+
+
+@router.get("/{flight_id}/candidates", response_model=list[Plane])
+async def get_candidate_planes(flight_id: UUID,
+                               order_by: CandidateOrder = CandidateOrder.fuel_margin,
+                               limit: Annotated[int | None, Query(gt=0)] = None,
+                               exclude_assigned: bool = False) -> OrjsonResponse:
+    try:
+        planes = await FlightRepository.get_candidate_planes(flight_id, order_by, limit, exclude_assigned)
+    except NoResultFound:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Flight is not found")
+    return OrjsonResponse(planes)
+
+
+@router.post("/assign")
+async def assign_planes(flight_ids: Annotated[list[UUID] | None, Body()] = None) -> AssignmentReport:
+    try:
+        report = await FlightRepository.assign_planes(flight_ids)
+    except Exception as e:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=e.args[0])
+    return report
+
+
+@router.post("/conduct")
+async def conduct_flights(flight_ids: Annotated[list[UUID], Body()]) -> list[ConductResult]:
+    try:
+        results = await FlightRepository.conduct_flights(flight_ids)
+    except StaleDataError as e:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail=e.args[0])
+    return results
+
+
+@router.post("/simulate", response_model=list[SimulationResult])
+async def simulate_flights(request: SimulationRequest) -> OrjsonResponse:
+    events = [x for scenario in request.scenarios for x in scenario.schedule]
+    refuels = [x.plane_id for x in events if isinstance(x, RefuelEvent)]
+    snapshot = await load_simulation_snapshot([x for x in events if not isinstance(x, RefuelEvent)], refuels)
+    results = await simulate(snapshot, [(x.name, x.schedule) for x in request.scenarios], request.trajectories)
+    return OrjsonResponse(results)
 
 
 @router.post("/{flight_id}")
 async def conduct_flight(flight_id: UUID) -> Flight:
     try:
         conducted_flight = await FlightRepository.conduct_flight(flight_id)
+    except StaleDataError as e:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail=e.args[0])
     except OSError as e:
         raise HTTPException(status_code=HTTPStatus.IM_A_TEAPOT, detail=e.args[0])
     except ValueError as e:
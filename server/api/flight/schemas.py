@@ -1,5 +1,7 @@
+from enum import Enum
 from uuid import UUID
-from pydantic import BaseModel, ConfigDict, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from server.api.timed_model import TimedModel
 from server.api.plane.schemas import Plane
 
 
@@ -22,7 +24,7 @@ class FlightDto(BaseModel):
         return inpt
 
 
-class Flight(BaseModel):
+class Flight(TimedModel):
     id: UUID
     begin_airport: str
     end_airport: str
@@ -30,3 +32,115 @@ class Flight(BaseModel):
     passengers: int
     suitable_planes: list[Plane] | None = None
     model_config = ConfigDict(from_attributes=True)
+
+
+class FlightSummary(TimedModel):
+    id: UUID
+    begin_airport: str
+    end_airport: str
+    distance: int
+    passengers: int
+    suitable_plane_ids: list[UUID] = []
+
+
+class FlightInclude(str, Enum):
+    planes = 'planes'
+
+
+class FlightSortColumn(str, Enum):
+    begin_airport = 'begin_airport'
+    end_airport = 'end_airport'
+    distance = 'distance'
+    passengers = 'passengers'
+
+
+class FlightSearch(BaseModel):
+    """Query of GET /flights/search; bounds are inclusive and the filters are combined with AND"""
+    begin_airport: str | None = None
+    begin_airport_prefix: str | None = None
+    end_airport: str | None = None
+    end_airport_prefix: str | None = None
+    distance_min: int | None = None
+    distance_max: int | None = None
+    passengers_min: int | None = None
+    passengers_max: int | None = None
+    order_by: FlightSortColumn | None = None
+    descending: bool = False
+    limit: int | None = Field(default=None, gt=0)
+    include: FlightInclude | None = None
+
+
+class CandidateOrder(str, Enum):
+    fuel_margin = 'fuel_margin'
+    efficiency = 'efficiency'
+
+
+class ItineraryOrder(str, Enum):
+    distance = 'distance'
+    legs = 'legs'
+
+
+class Itinerary(BaseModel):
+    flights: list[Flight]
+    distance: int
+
+
+class Assignment(BaseModel):
+    flight_id: UUID
+    plane_id: UUID
+
+
+class AssignmentReport(BaseModel):
+    assignments: list[Assignment]
+    unassigned_flights: list[UUID]
+    solver_time: float
+
+
+class ConductStatus(str, Enum):
+    conducted = 'conducted'
+    unsuitable_planes_removed = 'unsuitable_planes_removed'
+    no_planes = 'no_planes'
+    not_found = 'not_found'
+
+
+class ConductResult(BaseModel):
+    flight_id: UUID
+    status: ConductStatus
+    detail: str | None = None
+
+
+class SimulationStatus(str, Enum):
+    conducted = 'conducted'
+    unsuitable_planes_removed = 'unsuitable_planes_removed'
+    no_planes = 'no_planes'
+    not_found = 'not_found'
+    refuelled = 'refuelled'
+
+
+class RefuelEvent(BaseModel):
+    plane_id: UUID
+    fuel: int | None = Field(default=None, ge=0, description='New fuel level; a full tank when omitted')
+
+
+class Scenario(BaseModel):
+    name: str | None = None
+    schedule: list[UUID | RefuelEvent]
+
+
+class SimulationRequest(BaseModel):
+    scenarios: list[Scenario]
+    trajectories: bool = True
+
+
+class FuelTrajectory(BaseModel):
+    steps: list[int]
+    fuel: list[int]
+
+
+class SimulationResult(BaseModel):
+    name: str | None = None
+    statuses: list[SimulationStatus]
+    final_fuel: dict[UUID, int]
+    removed: list[Assignment]
+    trajectories: dict[UUID, FuelTrajectory] | None = None
+    elapsed: float
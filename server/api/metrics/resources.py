@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from starlette.responses import PlainTextResponse
+from database.cache import repository_cache
+from server.metrics import render
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Метрики"],
+)
+
+PROMETHEUS_MEDIA_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    cache_stats = repository_cache.stats()
+    gauges = {f'planes_cache_{key}': cache_stats.pop(key) for key in ('size', 'maxsize', 'bytes', 'maxbytes', 'pinned')}
+    counters = {f'planes_cache_{key}_total': value for key, value in cache_stats.items()}
+    return PlainTextResponse(render(gauges, counters), media_type=PROMETHEUS_MEDIA_TYPE)
@@ -0,0 +1,16 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from uuid import UUID
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(last_id: UUID) -> str:
+    return urlsafe_b64encode(last_id.bytes).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> UUID:
+    try:
+        return UUID(bytes=urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (DecodeError, ValueError):
+        raise ValueError('Invalid cursor')
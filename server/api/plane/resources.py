@@ -1,10 +1,22 @@
+from typing import Annotated
 from uuid import UUID
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from starlette.responses import StreamingResponse
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm.exc import StaleDataError
+from database.concurrency import VersionMismatch
 from database.plane.repository import PlaneRepository
-from server.api.plane.schemas import Plane, PlaneDto
+from database.plane.analytics import FleetSnapshot, load_fleet_snapshot
+from server.api.plane.schemas import (AnalyticsColumn, FamilyStats, Histogram, Percentiles, Plane, PlaneDto,
+                                      PlaneSearch, PlaneStats, Quantile, RankedPlane)
+from server.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from server.api.rendering import OrjsonResponse
+from server.api.streaming import NDJSON_MEDIA_TYPE, ndjson_lines
+from server.api.versioning import ETAG_HEADER, make_etag, parse_if_match
 from http import HTTPStatus
 
+DEFAULT_PERCENTILES = [50, 90, 99]
+
 router = APIRouter(
     prefix="/planes",
     tags=["Самолеты"],
@@ -21,11 +33,19 @@ async def add_plane(plane: PlaneDto) -> dict[str, UUID]:
 
 
 @router.put("/{plane_id}")
-async def edit_plane(plane_id: UUID, plane: PlaneDto) -> Plane:
+async def edit_plane(plane_id: UUID, plane: PlaneDto, response: Response,
+                     if_match: Annotated[str | None, Header()] = None) -> Plane:
     try:
-        edited_plane = await PlaneRepository.edit_plane(plane_id, plane)
+        edited_plane, version = await PlaneRepository.edit_plane(plane_id, plane, parse_if_match(if_match))
     except NoResultFound:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Plane is not found")
+    except VersionMismatch:
+        raise HTTPException(status_code=HTTPStatus.PRECONDITION_FAILED, detail="Plane version does not match")
+    except StaleDataError:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Plane was modified concurrently")
+    except ValueError as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.args[0])
+    response.headers[ETAG_HEADER] = make_etag(version)
     return edited_plane
 
 
@@ -35,46 +55,111 @@ async def delete_plane(plane_id: UUID) -> Plane:
         deleted_plane = await PlaneRepository.delete_plane(plane_id)
     except NoResultFound:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Plane is not found")
+    except StaleDataError:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail="Plane was modified concurrently")
     return deleted_plane
 
 
-@router.get("")
-async def get_all_planes() -> list[Plane]:
-    planes = await PlaneRepository.get_planes()
-    return planes
+@router.get("", response_model=list[Plane])
+async def get_all_planes(limit: Annotated[int | None, Query(gt=0)] = None,
+                         after: str | None = None) -> OrjsonResponse:
+    try:
+        after_id = decode_cursor(after) if after is not None else None
+    except ValueError as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=e.args[0])
+    planes = await PlaneRepository.get_planes(limit, after_id)
+    headers = {}
+    if limit is not None and len(planes) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(planes[-1]['id'])
+    return OrjsonResponse(planes, headers=headers)
+
+
+@router.get("/stream")
+async def stream_all_planes() -> StreamingResponse:
+    return StreamingResponse(ndjson_lines(PlaneRepository.stream_planes()), media_type=NDJSON_MEDIA_TYPE)
+
+
+@router.get("/stats")
+async def get_plane_stats() -> PlaneStats:
+    stats = await PlaneRepository.get_stats()
+    return stats
+
+
+async def get_non_empty_plane_stats() -> PlaneStats:
+    stats = await get_plane_stats()
+    if stats.count == 0:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="No planes available")
+    return stats
 
 
 @router.get("/capacity/average")
 async def get_average_plane_capacity() -> int:
-    try:
-        average_capacity = await PlaneRepository.get_average_capacity()
-    except ZeroDivisionError as e:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=e.args[0])
-    return average_capacity
+    stats = await get_non_empty_plane_stats()
+    return stats.average_capacity
 
 
 @router.get("/distance/average")
 async def get_average_plane_distance() -> int:
-    try:
-        average_distance = await PlaneRepository.get_average_distance()
-    except ZeroDivisionError as e:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=e.args[0])
-    return average_distance
+    stats = await get_non_empty_plane_stats()
+    return stats.average_distance
 
 
 @router.get("/capacity/maximum")
 async def get_most_capacious_plane() -> int:
-    try:
-        max_capacity = await PlaneRepository.get_max_capacity()
-    except ValueError as e:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=e.args[0])
-    return max_capacity
+    stats = await get_non_empty_plane_stats()
+    return stats.max_capacity
 
 
 @router.get("/distance/maximum")
 async def get_most_beneficial_plane() -> int:
+    stats = await get_non_empty_plane_stats()
+    return stats.max_distance
+
+
+async def get_non_empty_fleet_snapshot() -> FleetSnapshot:
+    snapshot = await load_fleet_snapshot()
+    if len(snapshot) == 0:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="No planes available")
+    return snapshot
+
+
+@router.get("/analytics/percentiles")
+async def get_fleet_percentiles(column: AnalyticsColumn,
+                                q: Annotated[list[Quantile] | None, Query()] = None) -> Percentiles:
+    snapshot = await get_non_empty_fleet_snapshot()
+    return snapshot.percentiles(column, q or DEFAULT_PERCENTILES)
+
+
+@router.get("/analytics/histogram")
+async def get_fleet_histogram(column: AnalyticsColumn,
+                              bins: Annotated[int, Query(gt=0, le=1000)] = 20) -> Histogram:
+    snapshot = await get_non_empty_fleet_snapshot()
+    return snapshot.histogram(column, bins)
+
+
+@router.get("/analytics/families")
+async def get_fleet_families() -> list[FamilyStats]:
+    snapshot = await get_non_empty_fleet_snapshot()
+    return snapshot.families_stats()
+
+
+@router.get("/analytics/top")
+async def get_top_planes(by: AnalyticsColumn = AnalyticsColumn.efficiency,
+                         k: Annotated[int, Query(gt=0, le=1000)] = 10) -> list[RankedPlane]:
+    snapshot = await get_non_empty_fleet_snapshot()
+    return snapshot.top(by, k)
+
+
+@router.get("/search", response_model=list[Plane])
+async def search_planes(search: Annotated[PlaneSearch, Query()]) -> OrjsonResponse:
+    return OrjsonResponse(await PlaneRepository.search_planes(search))
+
+
+@router.get("/{plane_id}")
+async def get_plane(plane_id: UUID, response: Response) -> Plane:
     try:
-        max_distance = await PlaneRepository.get_max_distance()
-    except ValueError as e:
-        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=e.args[0])
-    return max_distance
+        plane, version = await PlaneRepository.get_plane(plane_id)
+    except NoResultFound:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Plane is not found")
+    response.headers[ETAG_HEADER] = make_etag(version)
+    return plane
@@ -1,5 +1,8 @@
+from enum import Enum
+from typing import Annotated
 from uuid import UUID
-from pydantic import BaseModel, ConfigDict, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from server.api.timed_model import TimedModel
 
 
 class PlaneDto(BaseModel):
@@ -34,7 +37,7 @@ class PlaneDto(BaseModel):
         return cons
 
 
-class Plane(BaseModel):
+class Plane(TimedModel):
     id: UUID
     model: str
     max_capacity: int
@@ -42,3 +45,76 @@ class Plane(BaseModel):
     current_fuel: int
     fuel_consumption: int
     model_config = ConfigDict(from_attributes=True)
+
+
+class PlaneStats(BaseModel):
+    count: int
+    average_capacity: int | None = None
+    min_capacity: int | None = None
+    max_capacity: int | None = None
+    average_distance: int | None = None
+    min_distance: int | None = None
+    max_distance: int | None = None
+
+
+class AnalyticsColumn(str, Enum):
+    max_capacity = 'max_capacity'
+    max_distance = 'max_distance'
+    current_fuel = 'current_fuel'
+    fuel_consumption = 'fuel_consumption'
+    fuel_range = 'fuel_range'
+    efficiency = 'efficiency'
+
+
+Quantile = Annotated[float, Field(ge=0, le=100)]
+
+
+class Percentiles(BaseModel):
+    column: AnalyticsColumn
+    percentiles: dict[float, float]
+
+
+class Histogram(BaseModel):
+    column: AnalyticsColumn
+    edges: list[float]
+    counts: list[int]
+
+
+class FamilyStats(BaseModel):
+    family: str
+    count: int
+    average_capacity: float
+    max_capacity: int
+    average_distance: float
+    max_distance: int
+    average_fuel_range: float
+
+
+class RankedPlane(BaseModel):
+    plane: Plane
+    score: float
+
+
+class PlaneSortColumn(str, Enum):
+    model = 'model'
+    max_capacity = 'max_capacity'
+    max_distance = 'max_distance'
+    current_fuel = 'current_fuel'
+    fuel_consumption = 'fuel_consumption'
+
+
+class PlaneSearch(BaseModel):
+    """Query of GET /planes/search; bounds are inclusive and the filters are combined with AND"""
+    model: str | None = None
+    model_prefix: str | None = None
+    max_capacity_min: int | None = None
+    max_capacity_max: int | None = None
+    max_distance_min: int | None = None
+    max_distance_max: int | None = None
+    current_fuel_min: int | None = None
+    current_fuel_max: int | None = None
+    fuel_consumption_min: int | None = None
+    fuel_consumption_max: int | None = None
+    order_by: PlaneSortColumn | None = None
+    descending: bool = False
+    limit: int | None = Field(default=None, gt=0)
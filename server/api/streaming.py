@@ -0,0 +1,9 @@
+from typing import AsyncIterator
+import orjson
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+
+async def ndjson_lines(batches: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield b''.join(orjson.dumps(x, option=orjson.OPT_APPEND_NEWLINE) for x in batch)
@@ -0,0 +1,15 @@
+from time import perf_counter
+from pydantic import BaseModel
+from server.metrics import record_conversion
+
+
+class TimedModel(BaseModel):
+    """Reports the time spent validating ORM objects into the model to the request metrics"""
+
+    @classmethod
+    def model_validate(cls, obj, **kwargs):
+        start = perf_counter()
+        try:
+            return super().model_validate(obj, **kwargs)
+        finally:
+            record_conversion(perf_counter() - start)
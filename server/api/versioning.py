@@ -0,0 +1,23 @@
+ETAG_HEADER = 'ETag'
+
+
+def make_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_if_match(value: str | None) -> set[int] | None:
+    """Versions an If-Match header accepts; None when it accepts any (absent or *).
+
+    Weak tags never match under If-Match, so they are skipped.
+    """
+    if value is None or value.strip() == '*':
+        return None
+    versions = set()
+    for tag in value.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            continue
+        if len(tag) < 3 or tag[0] != '"' or tag[-1] != '"' or not tag[1:-1].isdigit():
+            raise ValueError('Invalid If-Match header')
+        versions.add(int(tag[1:-1]))
+    return versions
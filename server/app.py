@@ -1,18 +1,49 @@
-from contextlib import asynccontextmanager
+import asyncio
+import os
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
-from database.database import create_tables
+from database.changes import ChangeListener
+from database.database import create_tables, engine
+from database.flight.simulation import shutdown_simulation_pool
+from server.metrics import METRICS_ENABLED, MetricsMiddleware, instrument_engine
 from server.api.plane.resources import router as planes_router
 from server.api.flight.resources import router as flights_router
 from server.api.export.resources import router as export_router
+from server.api.data_import.resources import router as import_router
+from server.api.cache.resources import router as cache_router
+from server.api.changes.resources import router as changes_router
+from server.api.batch.resources import router as batch_router
+from server.api.metrics.resources import router as metrics_router
+
+
+SCHEMA_READY_ENV = 'PLANES_SCHEMA_READY'
 
 
 @asynccontextmanager
 async def lifespan(application: FastAPI):
-    await create_tables()
+    # Workers started by `python -m server` find the schema already set up by the launcher
+    if os.environ.get(SCHEMA_READY_ENV) != '1':
+        await create_tables()
+    listener = ChangeListener()
+    await listener.start()
+    polling = asyncio.create_task(listener.run())
     yield
+    polling.cancel()
+    with suppress(asyncio.CancelledError):
+        await polling
+    shutdown_simulation_pool()
+    await engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
 app.include_router(planes_router)
 app.include_router(flights_router)
 app.include_router(export_router)
+app.include_router(import_router)
+app.include_router(cache_router)
+app.include_router(changes_router)
+app.include_router(batch_router)
+app.include_router(metrics_router)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
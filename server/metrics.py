@@ -0,0 +1,160 @@
+import logging
+import os
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+METRICS_ENABLED = os.environ.get('PLANES_METRICS', '1') != '0'
+SLOW_REQUEST_MS = float(os.environ['PLANES_SLOW_REQUEST_MS']) if os.environ.get('PLANES_SLOW_REQUEST_MS') else None
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNMATCHED_ROUTE = 'unmatched'
+
+slow_request_log = logging.getLogger('server.slow_requests')
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    query_time: float = 0.0
+    rows: int = 0
+    conversion_time: float = 0.0
+    statements: list[str] | None = None
+
+
+@dataclass
+class Histogram:
+    buckets: tuple[float, ...] = LATENCY_BUCKETS
+    counts: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    total: float = 0.0
+    count: int = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+@dataclass
+class RouteStats:
+    latency: Histogram = field(default_factory=Histogram)
+    statuses: dict[int, int] = field(default_factory=dict)
+    queries: int = 0
+    query_time: float = 0.0
+    rows: int = 0
+    conversion_time: float = 0.0
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar('current_request', default=None)
+routes: dict[tuple[str, str], RouteStats] = {}
+
+
+def record_conversion(elapsed: float):
+    stats = current_request.get()
+    if stats is not None:
+        stats.conversion_time += elapsed
+
+
+def instrument_engine(engine: AsyncEngine):
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_start'] = perf_counter()
+
+    @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def finish_query(conn, cursor, statement, parameters, context, executemany):
+        stats = current_request.get()
+        if stats is None:
+            return
+        stats.queries += 1
+        stats.query_time += perf_counter() - conn.info.pop('query_start')
+        # SQLite reports no rowcount for SELECT, but the aiosqlite adapter has already buffered the rows;
+        # streamed results are fetched later and are not counted
+        stats.rows += cursor.rowcount if cursor.rowcount >= 0 else len(getattr(cursor, '_rows', ()))
+        if stats.statements is not None:
+            stats.statements.append(statement)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(statements=[] if SLOW_REQUEST_MS is not None else None)
+        token = current_request.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = perf_counter() - start
+            current_request.reset(token)
+            route = scope.get('route')
+            self.record(scope['method'], route.path if route is not None else UNMATCHED_ROUTE,
+                        status, elapsed, stats)
+            if SLOW_REQUEST_MS is not None and elapsed * 1000 >= SLOW_REQUEST_MS:
+                slow_request_log.warning(
+                    '%s %s took %.1f ms (%d queries, %.1f ms in SQL, %.1f ms in conversion)\n%s',
+                    scope['method'], scope['path'], elapsed * 1000, stats.queries, stats.query_time * 1000,
+                    stats.conversion_time * 1000, '\n'.join(stats.statements))
+
+    @staticmethod
+    def record(method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        route_stats = routes.get((method, route))
+        if route_stats is None:
+            route_stats = routes[(method, route)] = RouteStats()
+        route_stats.latency.observe(elapsed)
+        route_stats.statuses[status] = route_stats.statuses.get(status, 0) + 1
+        route_stats.queries += stats.queries
+        route_stats.query_time += stats.query_time
+        route_stats.rows += stats.rows
+        route_stats.conversion_time += stats.conversion_time
+
+
+def render(gauges: dict[str, float], counters: dict[str, float]) -> str:
+    """Prometheus text exposition of the collected metrics"""
+    lines = [
+        '# HELP planes_http_requests_total Handled requests.',
+        '# TYPE planes_http_requests_total counter',
+    ]
+    for (method, route), stats in routes.items():
+        for status, count in stats.statuses.items():
+            lines.append(f'planes_http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+    lines += [
+        '# HELP planes_http_request_duration_seconds Request latency, including streamed bodies.',
+        '# TYPE planes_http_request_duration_seconds histogram',
+    ]
+    for (method, route), stats in routes.items():
+        labels = f'method="{method}",route="{route}"'
+        cumulative = 0
+        for bound, count in zip(stats.latency.buckets, stats.latency.counts):
+            cumulative += count
+            lines.append(f'planes_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'planes_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.latency.count}')
+        lines.append(f'planes_http_request_duration_seconds_sum{{{labels}}} {stats.latency.total}')
+        lines.append(f'planes_http_request_duration_seconds_count{{{labels}}} {stats.latency.count}')
+    for name, attribute, kind, description in (
+            ('planes_db_queries_total', 'queries', 'counter', 'SQL statements executed.'),
+            ('planes_db_query_seconds_total', 'query_time', 'counter', 'Time spent executing SQL.'),
+            ('planes_db_rows_total', 'rows', 'counter', 'Rows returned or affected by SQL.'),
+            ('planes_model_conversion_seconds_total', 'conversion_time', 'counter',
+             'Time spent building pydantic models from ORM objects.')):
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        for (method, route), stats in routes.items():
+            lines.append(f'{name}{{method="{method}",route="{route}"}} {getattr(stats, attribute)}')
+    for name, value in gauges.items():
+        lines += [f'# TYPE {name} gauge', f'{name} {value}']
+    for name, value in counters.items():
+        lines += [f'# TYPE {name} counter', f'{name} {value}']
+    return '\n'.join(lines) + '\n'
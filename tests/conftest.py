@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# The engine is created when the database package is imported, so the URL has to be set first
+os.environ['PLANES_DB_URL'] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/planes.db"
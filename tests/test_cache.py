@@ -0,0 +1,175 @@
+"""The repository cache: sizing, the pinned fleet snapshot and invalidation by entity."""
+import asyncio
+import random
+import sys
+from contextlib import suppress
+from typing import Awaitable, Callable
+from uuid import UUID, uuid4
+import numpy as np
+from database.cache import approximate_size, repository_cache
+from database.database import create_tables, delete_tables
+from database.flight.repository import FlightRepository
+from database.plane.analytics import load_fleet_snapshot
+from database.plane.repository import PlaneRepository
+from server.api.flight.schemas import FlightDto
+from server.api.plane.schemas import PlaneDto
+
+PLANES = 200
+FLIGHTS = 20
+WRITES = 150
+
+
+def plane_dto(i: int) -> PlaneDto:
+    return PlaneDto(model=f'M{i:04d}', max_capacity=100 + i, max_distance=1000 + i,
+                    current_fuel=(1000 + i) * (1 + i % 7) // 2, fuel_consumption=1 + i % 7)
+
+
+async def seed() -> list[UUID]:
+    await delete_tables()
+    await create_tables()
+    repository_cache.clear()
+    planes = {uuid4(): plane_dto(i) for i in range(PLANES)}
+    assert not await PlaneRepository.add_planes(planes)
+    return list(planes)
+
+
+async def seed_flights(plane_ids: list[UUID]) -> list[UUID]:
+    flights = {uuid4(): (FlightDto(begin_airport=f'A{i:03d}', end_airport=f'B{i:03d}', distance=100 + i, passengers=50),
+                         plane_ids[3 * i:3 * i + 3]) for i in range(FLIGHTS)}
+    assert not await FlightRepository.add_flights(flights)
+    repository_cache.clear()
+    return list(flights)
+
+
+async def is_cached(read: Callable[..., Awaitable], *args, **kwargs) -> bool:
+    """Whether the read is answered from the cache; a read that is not gets cached by the call"""
+    hits = repository_cache.hits
+    await read(*args, **kwargs)
+    return repository_cache.hits > hits
+
+
+def test_approximate_size_samples_long_containers():
+    values = [str(x) * 3 for x in range(100_000)]
+    exact = sys.getsizeof(values) + sum(sys.getsizeof(x) for x in values)
+    assert abs(approximate_size(values) - exact) < exact * 0.1
+    array = np.zeros(10 ** 6, dtype=np.int64)
+    assert approximate_size({'column': array}) >= array.nbytes
+
+
+def test_fleet_snapshot_stays_cached_beyond_the_byte_bound(monkeypatch):
+    async def run():
+        plane_ids = await seed()
+        monkeypatch.setattr(repository_cache, 'maxbytes', 1024)
+        snapshot = await load_fleet_snapshot()
+        assert approximate_size(snapshot) > repository_cache.maxbytes
+        assert await load_fleet_snapshot() is snapshot
+        assert repository_cache.stats()['pinned'] == 1
+        await PlaneRepository.delete_plane(plane_ids[0])
+        reloaded = await load_fleet_snapshot()
+        assert reloaded is not snapshot
+        assert len(reloaded) == PLANES - 1
+
+    asyncio.run(run())
+
+
+def test_only_pages_are_cached():
+    async def run():
+        await seed_flights(await seed())
+        await PlaneRepository.get_planes()
+        await FlightRepository.get_flights()
+        assert repository_cache.stats()['size'] == 0
+        first_page = await PlaneRepository.get_planes(limit=10)
+        assert await is_cached(PlaneRepository.get_planes, limit=10)
+        assert await is_cached(FlightRepository.get_flights, limit=10) is False
+        assert await is_cached(PlaneRepository.get_planes, limit=10, after=first_page[-1]['id']) is False
+        assert repository_cache.stats()['size'] == 3
+
+    asyncio.run(run())
+
+
+def test_writes_drop_only_the_entries_holding_what_they_change():
+    async def run():
+        plane_ids = await seed()
+        flight_ids = await seed_flights(plane_ids)
+        edited, other = plane_ids[0], plane_ids[-1]
+        page = await PlaneRepository.get_planes(limit=PLANES // 2)
+        page_holding = {x['id'] for x in page}
+        after = page[-1]['id']
+        reads = [
+            (PlaneRepository.get_plane, (edited,), {}),
+            (PlaneRepository.get_plane, (other,), {}),
+            (PlaneRepository.get_planes, (), {'limit': PLANES // 2}),
+            (PlaneRepository.get_planes, (), {'limit': PLANES // 2, 'after': after}),
+            (FlightRepository.get_flight, (flight_ids[0],), {}),
+            (FlightRepository.get_flight, (flight_ids[1],), {}),
+            (FlightRepository.get_flights, (), {'limit': FLIGHTS, 'include_planes': True}),
+            (FlightRepository.get_flights, (), {'limit': FLIGHTS}),
+        ]
+        for read, args, kwargs in reads:
+            await read(*args, **kwargs)
+        plane, version = await PlaneRepository.get_plane(edited)
+        change = PlaneDto(**plane.model_dump(exclude={'id'}))
+        change.max_capacity += 1
+        await PlaneRepository.edit_plane(edited, change, {version})
+        cached = [await is_cached(read, *args, **kwargs) for read, args, kwargs in reads]
+        # Flight 0 is served by the edited plane, and only the page with embedded planes shows it
+        assert cached == [False, True, edited not in page_holding, edited in page_holding,
+                          False, True, False, True]
+        plane_ids.append(await PlaneRepository.add_plane(plane_dto(PLANES)))
+        assert await is_cached(PlaneRepository.get_plane, other)
+        assert not await is_cached(PlaneRepository.get_planes, limit=PLANES // 2)
+        assert await is_cached(FlightRepository.get_flights, limit=FLIGHTS)
+
+    asyncio.run(run())
+
+
+def test_cached_reads_match_fresh_reads():
+    async def run():
+        rng = random.Random(1)
+        plane_ids = await seed()
+        flight_ids = await seed_flights(plane_ids)
+        reads = [
+            (PlaneRepository.get_planes, (), {'limit': 3}),
+            (PlaneRepository.get_planes, (), {'limit': PLANES}),
+            (PlaneRepository.get_stats, (), {}),
+            (FlightRepository.get_flights, (), {'limit': FLIGHTS}),
+            (FlightRepository.get_flights, (), {'limit': FLIGHTS, 'include_planes': True}),
+            *((FlightRepository.get_flight, (x,), {}) for x in flight_ids[:3]),
+            *((FlightRepository.get_candidate_planes, (x,), {}) for x in flight_ids[:3]),
+            *((PlaneRepository.get_plane, (x,), {}) for x in plane_ids[:5]),
+        ]
+        stale = []
+        writes = 0
+        for step in range(WRITES):
+            for read, args, kwargs in reads:
+                await read(*args, **kwargs)
+            plane_id, flight_id = rng.choice(plane_ids), rng.choice(flight_ids)
+            operation = rng.randrange(7)
+            # Writes that the repositories reject, such as attaching an unsuitable plane, are part of the mix
+            with suppress(Exception):
+                if operation == 0:
+                    plane, version = await PlaneRepository.get_plane(plane_id)
+                    change = PlaneDto(**plane.model_dump(exclude={'id'}))
+                    change.max_capacity += 1
+                    await PlaneRepository.edit_plane(plane_id, change, {version})
+                elif operation == 1:
+                    await FlightRepository.add_plane(flight_id, plane_id)
+                elif operation == 2:
+                    await FlightRepository.delete_plane(flight_id, plane_id)
+                elif operation == 3:
+                    plane_ids.append(await PlaneRepository.add_plane(plane_dto(PLANES + step)))
+                elif operation == 4 and plane_id not in plane_ids[:5]:
+                    await PlaneRepository.delete_plane(plane_id)
+                    plane_ids.remove(plane_id)
+                elif operation == 5:
+                    await FlightRepository.conduct_flight(flight_id)
+                else:
+                    await FlightRepository.conduct_flights(flight_ids)
+                writes += 1
+            for read, args, kwargs in reads:
+                if await read(*args, **kwargs) != await read.__wrapped__(*args, **kwargs):
+                    stale.append((step, operation, read.__qualname__, args, kwargs))
+        assert writes > WRITES // 2
+        assert not stale
+
+    asyncio.run(run())
@@ -0,0 +1,88 @@
+"""Candidates read from the compatibility index agree with the checks of add_plane after every kind of write."""
+import asyncio
+import random
+from contextlib import suppress
+from uuid import UUID, uuid4
+from sqlalchemy import select, text
+from sqlalchemy.dialects import sqlite
+from database.compatibility import can_serve, check, rebuild
+from database.database import FlightSchema, PlaneSchema, create_tables, delete_tables, new_session
+from database.flight.repository import FlightRepository
+from database.plane.repository import PlaneRepository
+from server.api.flight.schemas import FlightDto
+from server.api.plane.schemas import PlaneDto
+
+PLANES = 120
+FLIGHTS = 40
+
+
+def random_plane(rng: random.Random, number: int) -> PlaneDto:
+    max_distance = rng.randint(500, 5000)
+    fuel_consumption = rng.randint(1, 5)
+    return PlaneDto(model=f'M{number:04d}', max_capacity=rng.randint(50, 400), max_distance=max_distance,
+                    current_fuel=rng.randint(0, max_distance * fuel_consumption), fuel_consumption=fuel_consumption)
+
+
+async def expected_candidates() -> dict[UUID, set[UUID]]:
+    async with new_session() as session:
+        planes = (await session.execute(select(PlaneSchema))).scalars().all()
+        flights = (await session.execute(select(FlightSchema))).scalars().all()
+    return {flight.id: {plane.id for plane in planes if plane.max_capacity >= flight.passengers
+                        and plane.max_distance >= flight.distance
+                        and plane.current_fuel >= plane.fuel_consumption * flight.distance} for flight in flights}
+
+
+async def assert_consistent():
+    for flight_id, plane_ids in (await expected_candidates()).items():
+        candidates = await FlightRepository.get_candidate_planes.__wrapped__(flight_id)
+        assert {x['id'] for x in candidates} == plane_ids
+    async with new_session() as session:
+        assert await check(session) == ([], [])
+
+
+async def run(rng: random.Random):
+    await delete_tables()
+    await create_tables()
+    planes = {uuid4(): random_plane(rng, i) for i in range(PLANES)}
+    assert not await PlaneRepository.add_planes(planes)
+    flights = {uuid4(): (FlightDto(begin_airport=f'A{i:03d}', end_airport=f'B{i:03d}', distance=rng.randint(100, 1500),
+                                   passengers=rng.randint(10, 300)), rng.sample(list(planes), 3))
+               for i in range(FLIGHTS)}
+    assert not await FlightRepository.add_flights(flights)
+    await assert_consistent()
+
+    for number, plane_id in enumerate(rng.sample(list(planes), 20), start=PLANES):
+        await PlaneRepository.edit_plane(plane_id, random_plane(rng, number))
+    await FlightRepository.conduct_flights(rng.sample(list(flights), 10))
+    for flight_id in rng.sample(list(flights), 10):
+        # Unsuitable planes are detached and the flight is not conducted
+        with suppress(OSError):
+            await FlightRepository.conduct_flight(flight_id)
+    await assert_consistent()
+
+    for plane_id in rng.sample(list(planes), 10):
+        await PlaneRepository.delete_plane(plane_id)
+    for flight_id in rng.sample(list(flights), 5):
+        await FlightRepository.delete_flight(flight_id)
+    await PlaneRepository.add_plane(random_plane(rng, 2 * PLANES))
+    await FlightRepository.add_flight(FlightDto(begin_airport='SVO', end_airport='LED', distance=600, passengers=80))
+    async with new_session() as session:
+        await rebuild(session)
+        await session.commit()
+    await assert_consistent()
+
+
+def test_candidates_match_the_checks_of_add_plane():
+    asyncio.run(run(random.Random(0)))
+
+
+def test_candidates_are_read_from_the_index():
+    async def plan() -> str:
+        await create_tables()
+        query = select(PlaneSchema.id).where(can_serve(100, 1000)).compile(
+            dialect=sqlite.dialect(), compile_kwargs={'literal_binds': True})
+        async with new_session() as session:
+            result = await session.execute(text(f'EXPLAIN QUERY PLAN {query}'))
+            return ' '.join(x[-1] for x in result)
+
+    assert 'USING INDEX ix_planes_reach' in asyncio.run(plan())
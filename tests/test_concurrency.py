@@ -0,0 +1,90 @@
+"""No lost updates when flights are conducted while their planes are edited.
+
+Every flight is served by every plane, so each conduct burns fuel from all of them while the
+editors run read-modify-write cycles on max_capacity with the version they read, retrying on a
+version mismatch. Afterwards every plane must hold the initial fuel minus exactly the burns of
+the conducts that succeeded, and the initial capacity plus exactly the successful edits.
+"""
+import asyncio
+import random
+from collections import Counter
+from uuid import UUID, uuid4
+from sqlalchemy import select
+from sqlalchemy.orm.exc import StaleDataError
+from database.concurrency import VersionMismatch
+from database.database import PlaneSchema, create_tables, delete_tables, new_session
+from database.flight.repository import FlightRepository
+from database.plane.repository import PlaneRepository
+from server.api.flight.schemas import ConductStatus, FlightDto
+from server.api.plane.schemas import PlaneDto
+
+INITIAL_FUEL = 10 ** 9
+INITIAL_CAPACITY = 500
+PLANES = 4
+FLIGHTS = 8
+TASKS = 8
+OPERATIONS = 20
+
+
+async def seed() -> tuple[list[UUID], dict[UUID, int]]:
+    await delete_tables()
+    await create_tables()
+    planes = {uuid4(): PlaneDto(model=f'M{i:04d}', max_capacity=INITIAL_CAPACITY, max_distance=INITIAL_FUEL,
+                                current_fuel=INITIAL_FUEL, fuel_consumption=1) for i in range(PLANES)}
+    flights = {uuid4(): (FlightDto(begin_airport=f'A{i:03d}', end_airport=f'B{i:03d}', distance=100 + i,
+                                   passengers=10), list(planes)) for i in range(FLIGHTS)}
+    assert not await PlaneRepository.add_planes(planes)
+    assert not await FlightRepository.add_flights(flights)
+    return list(planes), {x: flight.distance for x, (flight, _) in flights.items()}
+
+
+async def conductor(rng: random.Random, flight_ids: list[UUID], conducted: Counter, stats: Counter):
+    for _ in range(OPERATIONS):
+        try:
+            if rng.random() < 0.5:
+                flight_id = rng.choice(flight_ids)
+                await FlightRepository.conduct_flight(flight_id)
+                conducted[flight_id] += 1
+            else:
+                for result in await FlightRepository.conduct_flights(rng.sample(flight_ids, 3)):
+                    if result.status == ConductStatus.conducted:
+                        conducted[result.flight_id] += 1
+        except StaleDataError:
+            stats['conducts given up'] += 1
+
+
+async def editor(rng: random.Random, plane_ids: list[UUID], stats: Counter):
+    for _ in range(OPERATIONS):
+        plane_id = rng.choice(plane_ids)
+        while True:
+            plane, version = await PlaneRepository.get_plane.__wrapped__(plane_id)
+            change = PlaneDto(**plane.model_dump(exclude={'id'}))
+            change.max_capacity += 1
+            try:
+                await PlaneRepository.edit_plane(plane_id, change, {version})
+            except (VersionMismatch, StaleDataError):
+                continue
+            stats['edits'] += 1
+            break
+
+
+async def run() -> tuple[dict[UUID, tuple[int, int]], int, Counter]:
+    plane_ids, distances = await seed()
+    conducted = Counter()
+    stats = Counter()
+    rngs = [random.Random(x) for x in range(TASKS)]
+    await asyncio.gather(*(conductor(x, list(distances), conducted, stats) if i % 2 == 0 else
+                           editor(x, plane_ids, stats) for i, x in enumerate(rngs)))
+    async with new_session() as session:
+        result = await session.execute(select(PlaneSchema.id, PlaneSchema.current_fuel, PlaneSchema.max_capacity))
+        state = {plane_id: (fuel, capacity) for plane_id, fuel, capacity in result}
+    burned = sum(distances[x] * count for x, count in conducted.items())
+    return state, burned, stats
+
+
+def test_no_lost_updates():
+    state, burned, stats = asyncio.run(run())
+    assert burned > 0
+    assert all(fuel == INITIAL_FUEL - burned for fuel, _ in state.values())
+    assert sum(capacity - INITIAL_CAPACITY for _, capacity in state.values()) == stats['edits']
+    assert stats['conducts given up'] == 0
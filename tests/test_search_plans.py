@@ -0,0 +1,97 @@
+"""No filter combination of /planes/search and /flights/search scans its table.
+
+Every combination of the filters (a text column: none, equality or prefix; a numeric column:
+none, a lower bound or both bounds), of the sort columns and of a limit is compiled by the
+repositories and run through EXPLAIN QUERY PLAN on a small seeded database, without statistics
+and after ANALYZE. A plan that reads the planes or flights table with SCAN, over the table or a
+whole index, fails. Searches without any filter are listings and are not checked.
+
+An upper bound alone is estimated like a lower bound alone, and a descending sort reads the
+same index backwards, so neither is run on its own; this keeps the test to a few thousand plans.
+"""
+import asyncio
+import itertools
+import sqlite3
+from typing import Iterator
+from uuid import UUID
+import pytest
+from pydantic import BaseModel
+from sqlalchemy import Select
+from sqlalchemy.dialects import sqlite
+from benchmarks.synthetic import fleet
+from database.database import create_tables, delete_tables, engine
+from database.flight.repository import FlightRepository, flight_search_query
+from database.plane.repository import PlaneRepository, plane_search_query
+from server.api.flight.schemas import FlightDto, FlightSearch, FlightSortColumn
+from server.api.plane.schemas import PlaneDto, PlaneSearch, PlaneSortColumn
+
+TEXT_STATES = ('', 'prefix')
+RANGE_STATES = ((), ('min',), ('min', 'max'))
+TEXT_VALUES = {'begin_airport': 'AAA', 'end_airport': 'AAA', 'model': 'M0000001'}
+
+SEARCHES = {
+    'planes': (PlaneSearch, plane_search_query, ('model',),
+               ('max_capacity', 'max_distance', 'current_fuel', 'fuel_consumption'), list(PlaneSortColumn)),
+    'flights': (FlightSearch, flight_search_query, ('begin_airport', 'end_airport'), ('distance', 'passengers'),
+                list(FlightSortColumn)),
+}
+
+
+def filter_combinations(text_columns: tuple[str, ...], range_columns: tuple[str, ...]) -> Iterator[dict]:
+    """Every filter combination as query values; the text columns may be None, equal or a prefix"""
+    for texts in itertools.product((None, *TEXT_STATES), repeat=len(text_columns)):
+        for ranges in itertools.product(RANGE_STATES, repeat=len(range_columns)):
+            values = {}
+            for column, state in zip(text_columns, texts):
+                if state is not None:
+                    key = f'{column}_{state}' if state else column
+                    values[key] = TEXT_VALUES[column][:2] if state else TEXT_VALUES[column]
+            for column, bounds in zip(range_columns, ranges):
+                for bound in bounds:
+                    values[f'{column}_{bound}'] = 100 if bound == 'min' else 5000
+            if values:
+                yield values
+
+
+def plan(connection: sqlite3.Connection, query: Select) -> list[str]:
+    compiled = query.compile(compile_kwargs={'render_postcompile': True}, dialect=sqlite.dialect(paramstyle='qmark'))
+    parameters = compiled.construct_params()
+    rows = connection.execute(f'EXPLAIN QUERY PLAN {compiled}', [parameters[x] for x in compiled.positiontup])
+    return [x[3] for x in rows]
+
+
+async def seed():
+    await delete_tables()
+    await create_tables()
+    document = fleet(500, 300, 200)
+    planes = {UUID(x['id']): PlaneDto(**{k: v for k, v in x.items() if k != 'id'}) for x in document['planes']}
+    flights = {UUID(x['id']): (FlightDto(**{k: v for k, v in x.items() if k not in ('id', 'suitable_planes')}),
+                               [UUID(y['id']) for y in x['suitable_planes']]) for x in document['flights']}
+    assert not await PlaneRepository.add_planes(planes)
+    assert not await FlightRepository.add_flights(flights)
+
+
+@pytest.fixture(scope='module')
+def connection() -> Iterator[sqlite3.Connection]:
+    asyncio.run(seed())
+    connection = sqlite3.connect(engine.url.database)
+    yield connection
+    connection.close()
+
+
+@pytest.mark.parametrize('analyze', (False, True), ids=('without ANALYZE', 'after ANALYZE'))
+@pytest.mark.parametrize('table', SEARCHES)
+def test_no_search_scans_the_table(connection: sqlite3.Connection, table: str, analyze: bool):
+    search_model, build_query, text_columns, range_columns, sort_columns = SEARCHES[table]
+    if analyze:
+        connection.execute('ANALYZE')
+    else:
+        connection.execute('DROP TABLE IF EXISTS sqlite_stat1')
+    scans = []
+    for values in filter_combinations(text_columns, range_columns):
+        for order_by, limit in itertools.product([None, *sort_columns], (None, 50)):
+            search: BaseModel = search_model(**values, order_by=order_by, limit=limit)
+            details = plan(connection, build_query(search))
+            if any(x.startswith(f'SCAN {table}') for x in details):
+                scans.append(f'{values} order_by={order_by} limit={limit}: {details}')
+    assert not scans, f'{len(scans)} searches scan {table}:\n' + '\n'.join(scans[:5])